@@ -0,0 +1,244 @@
+"""Offline benchmarks of `iterate_subprojects` and its parts, against the fake
+GitLab server of the tests serving synthetic projects.
+
+Requests and bytes are deterministic for given parameters, so they can be
+compared exactly between runs; wall times are the median of `--repeat` runs.
+
+    export PYTHONPATH=.:tests
+    python benchmarks/benchmark.py --submodules 50 --latency 5 \\
+        --output results.json
+    python benchmarks/benchmark.py --submodules 50 --latency 5 \\
+        --baseline results.json
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from fake_gitlab import FakeGitlab, FakeProject, Gitlink, commit_submodules
+
+from gitlab_submodule.gitlab_submodule import (iterate_nested_subprojects,
+                                               iterate_submodules,
+                                               iterate_subprojects)
+from gitlab_submodule.objects import LazyProject
+from gitlab_submodule.read_gitmodules import get_ref_commit_id
+from gitlab_submodule.resolution_plan import DIFF_STRATEGY, STRATEGIES
+from gitlab_submodule.submodule_commit import (_get_submodule_commit_id,
+                                               get_submodule_commit_ids)
+from gitlab_submodule.submodule_to_project import submodule_to_project
+
+PARENT = 'bench/parent'
+# metrics that must not change between two runs with the same parameters
+EXACT_METRICS = ('requests', 'bytes')
+
+
+def add_synthetic_projects(fake: FakeGitlab,
+                           n_submodules: int,
+                           depth: int,
+                           n_files: int) -> FakeProject:
+    """Adds a parent project with `n_submodules` submodules, which have the
+    same number of submodules each, etc. down to `depth` levels. The last
+    commit of the parent updates the first submodule and adds `n_files`
+    files next to the submodules, which sets the size of the diffs and
+    trees."""
+    children: List[FakeProject] = []
+    for level in range(depth, 0, -1):
+        projects = []
+        for i in range(n_submodules):
+            project = fake.add_project(f'bench/level-{level}/{i}')
+            project.commit({'README.md': f'level {level} project {i}'})
+            if children:
+                commit_submodules(project, {
+                    f'libs/{j}': child for j, child in enumerate(children)})
+            projects.append(project)
+        children = projects
+    parent = fake.add_project(PARENT)
+    parent.commit({'README.md': 'parent'})
+    commit_submodules(parent, {
+        f'libs/{i}': child for i, child in enumerate(children)})
+    files = {f'libs/file-{i}.txt': f'file {i}\n' * 10
+             for i in range(n_files)}
+    if children:
+        files['libs/0'] = Gitlink(children[0].commit({'README.md': 'v2'}))
+    parent.commit(files, message='update the first submodule')
+    return parent
+
+
+def measure(fake: FakeGitlab,
+            run: Callable[[], int],
+            repeat: int) -> Dict[str, float]:
+    """`run` returns the number of resolved items (subprojects, commit ids
+    etc.) the metrics are divided by."""
+    wall_times = []
+    for _ in range(repeat):
+        fake.reset_requests()
+        started = time.perf_counter()
+        count = run()
+        wall_times.append(time.perf_counter() - started)
+    wall_time = statistics.median(wall_times)
+    requests, n_bytes = fake.count_requests(), fake.bytes_sent
+    per_item = max(count, 1)
+    return {
+        'items': count,
+        'wall_time': wall_time,
+        'requests': requests,
+        'bytes': n_bytes,
+        'ms_per_item': 1000 * wall_time / per_item,
+        'requests_per_item': requests / per_item,
+        'bytes_per_item': n_bytes / per_item,
+    }
+
+
+def run_benchmarks(n_submodules: int,
+                   depth: int,
+                   n_files: int,
+                   latency: float,
+                   max_workers: int,
+                   repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    with FakeGitlab() as fake:
+        add_synthetic_projects(fake, n_submodules, depth, n_files)
+        fake.latency = latency
+
+        def client():
+            # new client each time: no connection reused between benchmarks
+            gl = fake.client()
+            return gl, LazyProject(gl.projects, {
+                'id': PARENT,
+                'path_with_namespace': PARENT,
+                'default_branch': 'main',
+            })
+
+        def bench(name: str, run: Callable[[], int]) -> None:
+            results[name] = measure(fake, run, repeat)
+
+        gl, project = client()
+        # the parts, at the same pinned commit as iterate_subprojects
+        fake.latency = 0.
+        commit_id = get_ref_commit_id(project)
+        submodules = list(iterate_submodules(project, commit_id))
+        paths = [submodule.path for submodule in submodules]
+        fake.latency = latency
+
+        bench('iterate_submodules',
+              lambda: len(list(iterate_submodules(client()[1], commit_id))))
+        # the diff strategy doesn't resolve anything in bulk: each submodule
+        # commit id is then read from the diff of its last update
+        bench('get_submodule_commit_id[diff]',
+              lambda: sum(_get_submodule_commit_id(client()[1], path,
+                                                   commit_id) is not None
+                          for path in paths))
+        for strategy in STRATEGIES:
+            if strategy == DIFF_STRATEGY:
+                continue
+            bench(f'get_submodule_commit_ids[{strategy}]',
+                  lambda strategy=strategy: len(get_submodule_commit_ids(
+                      client()[1], paths, commit_id, strategy)))
+        bench('submodule_to_project',
+              lambda: sum(submodule_to_project(submodule, client()[0])
+                          is not None for submodule in submodules))
+
+        def subprojects(**kwargs) -> Callable[[], int]:
+            def run() -> int:
+                gl, project = client()
+                return len(list(iterate_subprojects(project, gl, **kwargs)))
+            return run
+
+        bench('iterate_subprojects', subprojects())
+        bench('iterate_subprojects[lazy_commits]',
+              subprojects(lazy_commits=True))
+        bench(f'iterate_subprojects[max_workers={max_workers}]',
+              subprojects(max_workers=max_workers))
+        if depth > 1:
+            def nested() -> int:
+                gl, project = client()
+                return len(list(iterate_nested_subprojects(
+                    project, gl, max_workers=max_workers, lazy_commits=True)))
+            bench('iterate_nested_subprojects', nested)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]],
+            baseline: Dict[str, Dict[str, float]]) -> List[str]:
+    """Prints the changes from `baseline` and returns the regressions of
+    the exact metrics."""
+    regressions = []
+    for name, metrics in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        changes = []
+        for metric in ('wall_time',) + EXACT_METRICS:
+            if not previous[metric]:
+                continue
+            change = 100 * (metrics[metric] / previous[metric] - 1)
+            changes.append(f'{metric} {change:+.1f}%')
+            if metric in EXACT_METRICS and metrics[metric] > previous[metric]:
+                regressions.append(f'{name}: {metric} {previous[metric]} '
+                                   f'-> {metrics[metric]}')
+        print(f'{name:<45} {", ".join(changes)}')
+    return regressions
+
+
+def print_results(results: Dict[str, Dict[str, float]]) -> None:
+    print(f'{"benchmark":<45} {"items":>6} {"time (s)":>9} {"requests":>9} '
+          f'{"bytes":>9} {"ms/item":>8} {"req/item":>9} {"bytes/item":>11}')
+    for name, metrics in results.items():
+        print(f'{name:<45} {metrics["items"]:>6} '
+              f'{metrics["wall_time"]:>9.3f} {metrics["requests"]:>9} '
+              f'{metrics["bytes"]:>9} {metrics["ms_per_item"]:>8.2f} '
+              f'{metrics["requests_per_item"]:>9.2f} '
+              f'{metrics["bytes_per_item"]:>11.1f}')
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--submodules', type=int, default=20,
+                        help='number of submodules of each project')
+    parser.add_argument('--depth', type=int, default=1,
+                        help='nesting depth of the submodules')
+    parser.add_argument('--files', type=int, default=50,
+                        help='number of files changed next to the submodules')
+    parser.add_argument('--latency', type=float, default=0.,
+                        help='latency of each request, in milliseconds')
+    parser.add_argument('--max-workers', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--baseline',
+                        help='JSON file of previous results to compare to')
+    options = parser.parse_args(args)
+
+    parameters = {
+        'submodules': options.submodules,
+        'depth': options.depth,
+        'files': options.files,
+        'latency': options.latency,
+        'max_workers': options.max_workers,
+    }
+    results = run_benchmarks(options.submodules, options.depth,
+                             options.files, options.latency / 1000,
+                             options.max_workers, options.repeat)
+    print_results(results)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({'parameters': parameters, 'results': results}, f,
+                      indent=2)
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        if baseline['parameters'] != parameters:
+            print(f'Parameters differ from the baseline: '
+                  f'{baseline["parameters"]}')
+            return 2
+        print()
+        regressions = compare(results, baseline['results'])
+        if regressions:
+            print('\nRegressions:\n' + '\n'.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Memory and attribute access benchmarks of `Submodule` and `Subproject`,
+against their previous `__dict__`-based implementations.
+
+    python benchmarks/objects.py --subprojects 100000
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from typing import Callable, List, Optional
+
+from gitlab_submodule.objects import Commit, Submodule, Subproject
+from gitlab_submodule.string_utils import lstrip
+
+
+class DictSubmodule:
+    """Previous implementation of `Submodule`"""
+
+    def __init__(self, parent_project, parent_ref, name, path, url,
+                 branch=None, ignore=None, update=None, recurse=False,
+                 shallow=False, parent_commit_id=None):
+        self.parent_project = parent_project
+        self.parent_ref = parent_ref
+        self.parent_commit_id = parent_commit_id
+        self.name = name
+        self.path = path
+        self.url = url
+        self.branch = branch
+        self.ignore = ignore
+        self.update = update
+        self.recurse = recurse
+        self.shallow = shallow
+
+    def keys(self):
+        return {
+            'parent_project', 'parent_ref', 'parent_commit_id', 'name',
+            'path', 'url', 'update', 'branch', 'ignore', 'shallow', 'recurse'
+        }
+
+    def __getitem__(self, key):
+        if key in self.keys():
+            return getattr(self, key)
+        else:
+            raise KeyError(key)
+
+
+class DictSubproject:
+    """Previous implementation of `Subproject`"""
+
+    def __init__(self, submodule, project, commit):
+        self.submodule = submodule
+        self.project = project
+        self.commit = commit
+
+    def __getattribute__(self, item: str):
+        try:
+            return super().__getattribute__(item)
+        except AttributeError:
+            for attribute in {'submodule', 'project', 'commit'}:
+                if item.startswith(f'{attribute}_'):
+                    return getattr(super().__getattribute__(attribute),
+                                   lstrip(item, f'{attribute}_'))
+
+        raise AttributeError("'{} object has no attribute '{}'".format(
+            self.__class__.__name__, item))
+
+    def __setattr__(self, key, value):
+        for attribute in {'submodule', 'project', 'commit'}:
+            if key == attribute:
+                return super().__setattr__(key, value)
+            if key.startswith(f'{attribute}_'):
+                return setattr(getattr(self, attribute),
+                               lstrip(key, f'{attribute}_'),
+                               value)
+        super().__setattr__(key, value)
+
+
+def make_subprojects(submodule_class: type,
+                     subproject_class: type,
+                     n_subprojects: int) -> list:
+    # the parent project and the commits are shared, as in a group scan
+    parent_project = object()
+    commit = Commit('0' * 40)
+    return [subproject_class(
+        submodule_class(parent_project, 'main', f'libs/{i}', f'libs/{i}',
+                        f'../libs/{i}.git', parent_commit_id='1' * 40),
+        None, commit) for i in range(n_subprojects)]
+
+
+def measure_memory(make: Callable[[], list]) -> int:
+    """Bytes allocated by `make()` and still held by its result."""
+    gc.collect()
+    tracemalloc.start()
+    objects = make()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size
+
+
+def measure_access(subprojects: list,
+                   access: Callable[[object], object],
+                   repeat: int) -> float:
+    """Best time per access in nanoseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for subproject in subprojects:
+            access(subproject)
+        best = min(best, time.perf_counter() - start)
+    return 1e9 * best / len(subprojects)
+
+
+ACCESSES = {
+    'subproject.submodule': lambda s: s.submodule,
+    'subproject.submodule.path': lambda s: s.submodule.path,
+    'subproject.submodule_path': lambda s: s.submodule_path,
+    'subproject.commit_id': lambda s: s.commit_id,
+    'dict(subproject.submodule)': lambda s: dict(s.submodule),
+}
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subprojects', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(args)
+
+    implementations = (('__dict__', DictSubmodule, DictSubproject),
+                       ('__slots__', Submodule, Subproject))
+    print(f'{args.subprojects} subprojects')
+    print('{:<30} {:>12} {:>12}'.format(
+        'memory (MB)', *(name for name, _, _ in implementations)))
+    print('{:<30} {:>12.1f} {:>12.1f}'.format('', *(
+        measure_memory(lambda: make_subprojects(
+            submodule_class, subproject_class, args.subprojects)) / 1e6
+        for _, submodule_class, subproject_class in implementations)))
+
+    subprojects = [make_subprojects(submodule_class, subproject_class,
+                                    args.subprojects)
+                   for _, submodule_class, subproject_class in implementations]
+    print('{:<30} {:>12} {:>12}'.format(
+        'access (ns)', *(name for name, _, _ in implementations)))
+    for name, access in ACCESSES.items():
+        print('{:<30} {:>12.1f} {:>12.1f}'.format(name, *(
+            measure_access(objects, access, args.repeat)
+            for objects in subprojects)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Micro-benchmark of the .gitmodules parser against the previous
+configparser-based implementation, on a synthetic file.
+
+    python benchmarks/parse_gitmodules.py --submodules 5000
+"""
+import argparse
+import configparser
+import re
+import statistics
+import sys
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from gitlab_submodule.gitmodules_parser import parse_gitmodules
+
+
+def parse_gitmodules_with_configparser(
+    gitmodules_file_content: str
+) -> Iterable[Dict[str, Union[None, bool, str]]]:
+    """Previous implementation of `_read_gitmodules_file_content`"""
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config.read_string(gitmodules_file_content)
+    stropts = ('branch', 'ignore', 'update')
+    boolopts = ('recurse', 'shallow')
+    name_regex = r'submodule "([a-zA-Z0-9\.\-/_]+)"'
+    for section in config.sections():
+        try:
+            kwargs = {
+                'name': re.match(name_regex, section).group(1),
+                'path': config.get(section, 'path'),
+                'url': config.get(section, 'url')
+            }
+        except (AttributeError, KeyError):
+            raise RuntimeError('Failed parsing the .gitmodules contnet')
+        kwargs.update(
+            (opt, config.get(section, opt, fallback=None))
+            for opt in stropts
+        )
+        kwargs.update(
+            (opt, config.getboolean(section, opt, fallback=False))
+            for opt in boolopts
+        )
+        yield kwargs
+
+
+def make_gitmodules(n_submodules: int) -> str:
+    """A submodule out of 10 has a branch and is shallow."""
+    sections = []
+    for i in range(n_submodules):
+        section = (f'[submodule "group-{i % 100}/lib-{i}"]\n'
+                   f'\tpath = third_party/group-{i % 100}/lib-{i}\n'
+                   f'\turl = git@gitlab.example.com:group-{i % 100}/'
+                   f'lib-{i}.git\n')
+        if i % 10 == 0:
+            section += '\tbranch = main\n\tshallow = true\n'
+        sections.append(section)
+    return ''.join(sections)
+
+
+def measure(parse: Callable[[str], Iterable[dict]],
+            content: str,
+            repeat: int) -> float:
+    """Median wall time in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in parse(content):
+            pass
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--submodules', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args(args)
+
+    content = make_gitmodules(args.submodules)
+    if (list(parse_gitmodules(content))
+            != list(parse_gitmodules_with_configparser(content))):
+        print('The parsers disagree', file=sys.stderr)
+        return 1
+    print(f'{args.submodules} submodules, {len(content)} bytes')
+    baseline = None
+    for name, parse in (('configparser', parse_gitmodules_with_configparser),
+                        ('parse_gitmodules', parse_gitmodules)):
+        elapsed = measure(parse, content, args.repeat)
+        baseline = baseline or elapsed
+        print(f'{name:<20} {1000 * elapsed:>9.1f} ms  '
+              f'x{baseline / elapsed:.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
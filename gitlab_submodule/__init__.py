@@ -6,16 +6,56 @@ from gitlab_submodule.__version__ import __version__ as hardcoded_version
 __version__ = hardcoded_version
 
 __all__ = [
-    'Submodule', 'Subproject',
+    'Submodule', 'Subproject', 'SubmoduleCache', 'ProjectCache',
     'list_submodules', 'iterate_submodules',
     'submodule_to_subproject',
-    'iterate_subprojects', 'list_subprojects'
+    'iterate_subprojects', 'list_subprojects', 'hydrate_commits',
+    'NestedSubproject', 'iterate_nested_subprojects',
+    'list_nested_subprojects',
+    'iterate_group_subprojects', 'list_group_subprojects',
+    'ReverseIndex', 'update_subprojects',
+    'PushEventProcessor', 'SnapshotStore',
+    'RateLimiter', 'install_rate_limiter', 'TransportManager',
+    'ValidatorCache', 'install_validator_cache',
+    'StageStats', 'add_call_hook',
+    'RequestBudget', 'install_request_budget', 'until_budget_exceeded',
+    'async_until_budget_exceeded', 'estimate_subprojects',
+    'HostResolver', 'ResolutionPlan',
+    'get_lazy_project',
+    'async_iterate_submodules', 'async_get_submodule_commit',
+    'async_submodule_to_subproject', 'async_iterate_subprojects'
 ]
 
-from gitlab_submodule.gitlab_submodule import (iterate_submodules,
+from gitlab_submodule.async_gitlab_submodule import async_get_submodule_commit
+from gitlab_submodule.async_gitlab_submodule import \
+    async_iterate_project_submodules as async_iterate_submodules
+from gitlab_submodule.async_gitlab_submodule import (
+    async_iterate_subprojects, async_submodule_to_subproject)
+from gitlab_submodule.cache import ProjectCache, SubmoduleCache, ValidatorCache
+from gitlab_submodule.conditional_requests import install_validator_cache
+from gitlab_submodule.gitlab_submodule import (hydrate_commits,
+                                               iterate_nested_subprojects,
+                                               iterate_submodules,
                                                iterate_subprojects,
+                                               list_nested_subprojects,
                                                list_subprojects,
                                                submodule_to_subproject)
-from gitlab_submodule.objects import Submodule, Subproject
+from gitlab_submodule.group_subprojects import (iterate_group_subprojects,
+                                                list_group_subprojects)
+from gitlab_submodule.instrumentation import StageStats, add_call_hook
+from gitlab_submodule.objects import NestedSubproject, Submodule, Subproject
+from gitlab_submodule.project_manager_utils import get_lazy_project
+from gitlab_submodule.push_events import PushEventProcessor, SnapshotStore
+from gitlab_submodule.rate_limit import RateLimiter, install_rate_limiter
 from gitlab_submodule.read_gitmodules import \
     list_project_submodules as list_submodules
+from gitlab_submodule.request_budget import (RequestBudget,
+                                             async_until_budget_exceeded,
+                                             install_request_budget,
+                                             until_budget_exceeded)
+from gitlab_submodule.resolution_plan import ResolutionPlan
+from gitlab_submodule.reverse_index import ReverseIndex
+from gitlab_submodule.scan_estimate import estimate_subprojects
+from gitlab_submodule.submodule_to_project import HostResolver
+from gitlab_submodule.subprojects_delta import update_subprojects
+from gitlab_submodule.transport import TransportManager
@@ -0,0 +1,70 @@
+"""Composes the requests adapters mounted for the host of a client in a fixed
+order, whatever the order they're installed in."""
+from typing import List
+
+from requests.adapters import BaseAdapter
+
+from gitlab_submodule.project_manager_utils import (Client, as_project_manager,
+                                                    get_host_url)
+
+
+class WrapperAdapter(BaseAdapter):
+    """Adapter that handles a request around the `adapter` it wraps.
+
+    The wrappers mounted for a host are ordered by `layer`: the higher ones
+    wrap the lower ones, and the lowest wraps the transport (the pooled or
+    rate limited `HTTPAdapter`)."""
+
+    layer = 0
+
+    def __init__(self, adapter: BaseAdapter):
+        super().__init__()
+        self.adapter = adapter
+
+    def send(self, request, **kwargs):
+        return self.adapter.send(request, **kwargs)
+
+    def close(self):
+        self.adapter.close()
+
+
+def get_wrappers(gl: Client) -> List[WrapperAdapter]:
+    """The wrappers mounted for the host of `gl`, from the outermost."""
+    wrappers = []
+    adapter = _get_mounted_adapter(gl)
+    while isinstance(adapter, WrapperAdapter):
+        wrappers.append(adapter)
+        adapter = adapter.adapter
+    return wrappers
+
+
+def mount_adapter(gl: Client, adapter: BaseAdapter) -> None:
+    """Mounts `adapter` for the host of `gl`, keeping the other adapters
+    already mounted.
+
+    A `WrapperAdapter` takes its place according to its layer, and replaces
+    the wrapper of the same class if any. Any other adapter replaces the
+    transport, under the wrappers."""
+    transport = _get_mounted_adapter(gl)
+    wrappers = []
+    while isinstance(transport, WrapperAdapter):
+        wrappers.append(transport)
+        transport = transport.adapter
+    if isinstance(adapter, WrapperAdapter):
+        wrappers = [wrapper for wrapper in wrappers
+                    if type(wrapper) is not type(adapter)] + [adapter]
+    else:
+        transport = adapter
+    adapter = transport
+    for wrapper in sorted(wrappers, key=lambda wrapper: wrapper.layer):
+        wrapper.adapter = adapter
+        adapter = wrapper
+    as_project_manager(gl).gitlab.session.mount(_get_prefix(gl), adapter)
+
+
+def _get_prefix(gl: Client) -> str:
+    return get_host_url(gl).rstrip('/') + '/'
+
+
+def _get_mounted_adapter(gl: Client) -> BaseAdapter:
+    return as_project_manager(gl).gitlab.session.get_adapter(_get_prefix(gl))
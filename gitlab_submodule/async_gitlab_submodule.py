@@ -0,0 +1,124 @@
+"""asyncio counterparts of the main functions of gitlab_submodule.
+
+python-gitlab only provides a blocking client, so the REST calls are run in
+a thread pool sized to the concurrency limit, which keeps the event loop free
+while the lookups are in flight.
+"""
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import (Any, AsyncGenerator, Callable, List, Optional, TypeVar,
+                    Union)
+
+from gitlab.v4.objects import Project, ProjectCommit
+
+from gitlab_submodule.cache import ProjectCache, SubmoduleCache
+from gitlab_submodule.gitlab_submodule import (
+    _submodule_to_subproject_or_none, submodule_to_subproject)
+from gitlab_submodule.objects import Commit, Submodule, Subproject
+from gitlab_submodule.project_manager_utils import OneOrManyClients
+from gitlab_submodule.read_gitmodules import (get_ref_commit_id,
+                                              list_project_submodules)
+from gitlab_submodule.resolution_plan import AUTO_STRATEGY, ResolutionPlan
+from gitlab_submodule.submodule_commit import (get_submodule_commit,
+                                               get_submodule_commit_ids)
+from gitlab_submodule.submodule_to_project import (get_host_resolver,
+                                                   get_projects_by_path)
+
+R = TypeVar('R')
+
+
+async def _run_blocking(
+        func: Callable[..., R],
+        *args: Any,
+        executor: Optional[Executor] = None,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        **kwargs: Any,
+) -> R:
+    call = partial(func, *args, **kwargs)
+    loop = asyncio.get_running_loop()
+    if semaphore is None:
+        return await loop.run_in_executor(executor, call)
+    async with semaphore:
+        return await loop.run_in_executor(executor, call)
+
+
+async def async_iterate_project_submodules(
+        project: Project,
+        ref: Optional[str] = None,
+) -> AsyncGenerator[Submodule, None]:
+    for submodule in await _run_blocking(
+            list_project_submodules, project, ref):
+        yield submodule
+
+
+async def async_get_submodule_commit(
+        submodule: Submodule,
+        submodule_project: Optional[Project] = None,
+        commit_id: Optional[str] = None,
+) -> Optional[Union[ProjectCommit, Commit]]:
+    return await _run_blocking(
+        get_submodule_commit, submodule, submodule_project, commit_id)
+
+
+async def async_submodule_to_subproject(
+        gitmodules_submodule: Submodule,
+        gls: OneOrManyClients,
+        commit_id: Optional[str] = None,
+) -> Subproject:
+    return await _run_blocking(
+        submodule_to_subproject, gitmodules_submodule, gls, commit_id)
+
+
+async def async_iterate_subprojects(
+        project: Project,
+        gls: OneOrManyClients,
+        ref: Optional[str] = None,
+        only_gitlab_subprojects: bool = False,
+        max_concurrency: int = 10,
+        ordered: bool = True,
+        strategy: str = AUTO_STRATEGY,
+        use_graphql: bool = False,
+        cache: Optional[SubmoduleCache] = None,
+        project_cache: Optional[ProjectCache] = None,
+        lazy_commits: bool = False,
+        pin_ref: bool = True,
+        on_plan: Optional[Callable[[ResolutionPlan], None]] = None,
+) -> AsyncGenerator[Subproject, None]:
+    gls = get_host_resolver(gls)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    # shut down without waiting for the calls in flight, which would block
+    # the event loop when the generator is closed early
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    run = partial(_run_blocking, executor=executor, semaphore=semaphore)
+    tasks: List[asyncio.Future] = []
+    try:
+        parent_commit_id = await run(
+            get_ref_commit_id, project, ref) if pin_ref else None
+        if pin_ref and parent_commit_id is None:
+            # empty repository or missing ref
+            return
+        submodules = await run(
+            list_project_submodules, project, ref, cache, parent_commit_id)
+        commit_ids = await run(
+            get_submodule_commit_ids, project,
+            [submodule.path for submodule in submodules],
+            parent_commit_id or ref, strategy, cache, on_plan)
+        projects = await run(
+            get_projects_by_path, submodules, gls) if use_graphql else None
+        tasks = [asyncio.ensure_future(run(
+            _submodule_to_subproject_or_none, submodule, commit_ids,
+            gls=gls, projects=projects, cache=cache,
+            project_cache=project_cache, lazy_commits=lazy_commits))
+            for submodule in submodules]
+        for task in (tasks if ordered else asyncio.as_completed(tasks)):
+            subproject = await task
+            if subproject is None:
+                continue
+            if not (only_gitlab_subprojects and not subproject.project):
+                yield subproject
+    finally:
+        # also cancels the calls that didn't start yet
+        for task in tasks:
+            task.cancel()
+        executor.shutdown(wait=False)
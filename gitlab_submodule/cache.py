@@ -0,0 +1,291 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Union
+
+from gitlab.v4.objects import Project
+
+from gitlab_submodule.project_manager_utils import get_project_key
+
+GitmodulesEntries = List[Dict[str, Union[None, bool, str]]]
+
+COMMIT_SHA_REGEX = re.compile(r'^([0-9a-f]{40}|[0-9a-f]{64})$')
+
+
+def is_commit_sha(ref: Optional[str]) -> bool:
+    """Only full commit shas are immutable, branches and tags can move."""
+    return ref is not None and COMMIT_SHA_REGEX.match(ref) is not None
+
+
+class SubmoduleCache:
+    """Persistent cache of what a parent project commit says about its
+    submodules: the parsed `.gitmodules` entries and the commit sha pinned
+    by each submodule path.
+
+    Both never change for a given parent commit sha, so entries are keyed by
+    `(parent project key, parent commit sha[, submodule path])` and never
+    expire. Lookups with a ref that isn't a full commit sha are skipped. The
+    project key is `get_project_key(project)`, which unlike the project id
+    doesn't change once a `LazyProject` is fetched.
+
+    Data is stored in a SQLite database at `path` (in memory by default) and
+    the cache can be shared between threads.
+    """
+
+    def __init__(self, path: str = ':memory:'):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS gitmodules ('
+                'project TEXT, commit_sha TEXT, entries TEXT, '
+                'PRIMARY KEY (project, commit_sha))')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS submodule_commits ('
+                'project TEXT, commit_sha TEXT, path TEXT, '
+                'submodule_commit_sha TEXT, '
+                'PRIMARY KEY (project, commit_sha, path))')
+
+    @staticmethod
+    def _key(project: Project, ref: str) -> tuple:
+        return get_project_key(project), ref
+
+    def _select(self, query: str, params: tuple) -> Optional[Any]:
+        with self._lock:
+            row = self._connection.execute(query, params).fetchone()
+        return row[0] if row else None
+
+    def _insert(self, query: str, params: tuple) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(query, params)
+
+    def get_gitmodules(self,
+                       project: Project,
+                       ref: Optional[str]) -> Optional[GitmodulesEntries]:
+        if not is_commit_sha(ref):
+            return None
+        entries = self._select(
+            'SELECT entries FROM gitmodules '
+            'WHERE project = ? AND commit_sha = ?',
+            self._key(project, ref))
+        return json.loads(entries) if entries is not None else None
+
+    def set_gitmodules(self,
+                       project: Project,
+                       ref: Optional[str],
+                       entries: GitmodulesEntries) -> None:
+        if not is_commit_sha(ref):
+            return
+        self._insert(
+            'INSERT OR REPLACE INTO gitmodules VALUES (?, ?, ?)',
+            self._key(project, ref) + (json.dumps(entries),))
+
+    def get_commit_id(self,
+                      project: Project,
+                      ref: Optional[str],
+                      submodule_path: str) -> Optional[str]:
+        if not is_commit_sha(ref):
+            return None
+        return self._select(
+            'SELECT submodule_commit_sha FROM submodule_commits '
+            'WHERE project = ? AND commit_sha = ? AND path = ?',
+            self._key(project, ref) + (submodule_path.strip('/'),))
+
+    def set_commit_id(self,
+                      project: Project,
+                      ref: Optional[str],
+                      submodule_path: str,
+                      commit_id: str) -> None:
+        if not is_commit_sha(ref):
+            return
+        self._insert(
+            'INSERT OR REPLACE INTO submodule_commits VALUES (?, ?, ?, ?)',
+            self._key(project, ref) + (submodule_path.strip('/'), commit_id))
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class _Sentinel:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+# Negative results stored in a ProjectCache
+NOT_FOUND = _Sentinel('NOT_FOUND')
+NOT_GITLAB = _Sentinel('NOT_GITLAB')
+
+
+class _LRUTable:
+    """LRU table with a time-to-live, not thread-safe."""
+
+    def __init__(self, maxsize: int, ttl: Optional[float]):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (value, time it was set)
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, touch: bool = True) -> Optional[tuple]:
+        """The `(value,)` of `key`, or None. With `touch=False` the entry
+        isn't marked as recently used."""
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl is not None \
+                and time.monotonic() - entry[1] > self.ttl:
+            del self._entries[key]
+            return None
+        if entry is None:
+            return None
+        if touch:
+            self._entries.move_to_end(key)
+        return entry[:1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class ProjectCache:
+    """Thread-safe in-memory LRU cache with a time-to-live, used in front of
+    the project lookups of `submodule_to_project`.
+
+    `(host, path_with_namespace)` keys hold `Project` objects. The negative
+    results are kept in separate tables of the same size, so that they
+    don't evict projects nor count in the stats: the repos that don't exist
+    (`set_not_found`), and the `(client, path_with_namespace)` match of
+    absolute submodule urls (`set_match`), or the `NOT_GITLAB` sentinel for
+    urls not hosted on any GitLab client.
+
+    `hits` and `misses` count the project lookups, to help sizing the cache.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 600.):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._projects = _LRUTable(maxsize, ttl)
+        self._not_found = _LRUTable(maxsize, ttl)
+        self._matches = _LRUTable(maxsize, ttl)
+
+    def __len__(self) -> int:
+        """Number of projects."""
+        return len(self._projects)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._projects.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Same as `get`, without counting the lookup nor marking the entry
+        as recently used, e.g. for estimates."""
+        with self._lock:
+            entry = self._projects.get(key, touch=False)
+            return default if entry is None else entry[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._projects.set(key, value)
+
+    def is_not_found(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._not_found.get(key) is not None
+
+    def set_not_found(self, key: Hashable) -> None:
+        with self._lock:
+            self._not_found.set(key, NOT_FOUND)
+
+    def get_match(self, url: str) -> Any:
+        """The `(client, path_with_namespace)` match of `url`, `NOT_GITLAB`
+        or None if it isn't cached."""
+        with self._lock:
+            entry = self._matches.get(url)
+            return None if entry is None else entry[0]
+
+    def set_match(self, url: str, match: Any) -> None:
+        with self._lock:
+            self._matches.set(url, match)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._projects.clear()
+            self._not_found.clear()
+            self._matches.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class ValidatorCache:
+    """Thread-safe in-memory LRU cache of HTTP responses and their `ETag`,
+    used by `ConditionalRequestAdapter` to revalidate them with
+    `If-None-Match` instead of downloading them again.
+
+    Entries don't expire: the server tells whether they're still valid.
+    `hits` counts the `304 Not Modified` responses replayed from the cache,
+    `misses` the lookups of responses that weren't cached, and
+    `bytes_saved` the size of the bodies that weren't downloaded again.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        # key -> (etag, headers, body)
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self,
+            key: Hashable,
+            etag: str,
+            headers: Dict[str, str],
+            body: bytes) -> None:
+        with self._lock:
+            self._entries[key] = (etag, headers, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def record_hit(self, body: bytes) -> None:
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += len(body)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.bytes_saved = 0
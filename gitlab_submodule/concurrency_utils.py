@@ -0,0 +1,28 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Generator, Iterable, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def map_concurrently(
+        func: Callable[[T], R],
+        items: Iterable[T],
+        max_workers: int,
+        ordered: bool = True,
+) -> Generator[R, None, None]:
+    """Applies `func` to `items` in a thread pool.
+
+    If `ordered` is True, results are yielded in the order of `items`,
+    otherwise as soon as they're ready. An exception raised by `func` is
+    re-raised when its result would have been yielded, and the pending calls
+    are cancelled when the generator is closed.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(func, item) for item in items]
+        try:
+            for future in (futures if ordered else as_completed(futures)):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
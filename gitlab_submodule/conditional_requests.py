@@ -0,0 +1,111 @@
+import hashlib
+import re
+from typing import List, Optional, Pattern
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from gitlab_submodule.adapters import WrapperAdapter, mount_adapter
+from gitlab_submodule.cache import ValidatorCache
+from gitlab_submodule.project_manager_utils import Client
+
+# responses that rarely change for a branch ref: the .gitmodules file, the
+# projects metadata and the repository trees
+DEFAULT_PATTERNS = [
+    re.compile(r'/projects/[^/]+$'),
+    re.compile(r'/repository/files/[^/]+(/raw)?$'),
+    re.compile(r'/repository/tree$'),
+]
+
+# headers of a 304 response that describe its (empty) body, not the cached one
+BODY_HEADERS = ('content-length', 'content-type', 'content-encoding',
+                'transfer-encoding')
+
+
+class ConditionalRequestAdapter(WrapperAdapter):
+    """Wraps the adapter of a host to revalidate the GET responses whose
+    path matches one of `patterns` with their `ETag`: a `304 Not Modified`
+    response is replaced by the cached one, so the body isn't downloaded
+    again.
+
+    It sits under the `RequestBudgetAdapter`, if any, and above the
+    transport, so that the revalidations are rate limited like any other
+    request."""
+
+    layer = 1
+
+    def __init__(self,
+                 adapter: BaseAdapter,
+                 cache: ValidatorCache,
+                 patterns: Optional[List[Pattern]] = None):
+        super().__init__(adapter)
+        self.cache = cache
+        self.patterns = DEFAULT_PATTERNS if patterns is None else patterns
+
+    def _matches(self, url: str) -> bool:
+        path = url.split('?', 1)[0]
+        return any(pattern.search(path) for pattern in self.patterns)
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET' or not self._matches(request.url):
+            return self.adapter.send(request, **kwargs)
+        key = _cache_key(request)
+        entry = self.cache.get(key)
+        if entry is not None:
+            request.headers['If-None-Match'] = entry[0]
+        response = self.adapter.send(request, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            # releases the connection
+            response.close()
+            self.cache.record_hit(entry[2])
+            return _replay(entry, request, response)
+        etag = response.headers.get('ETag')
+        if response.status_code == 200 and etag:
+            self.cache.set(key, etag, dict(response.headers),
+                           response.content)
+        return response
+
+
+def _cache_key(request) -> tuple:
+    # responses depend on the permissions of the token
+    credentials = request.headers.get('PRIVATE-TOKEN') \
+        or request.headers.get('JOB-TOKEN') \
+        or request.headers.get('Authorization') or ''
+    return (request.url,
+            hashlib.sha256(credentials.encode()).hexdigest())
+
+
+def _replay(entry: tuple, request, not_modified: Response) -> Response:
+    _, headers, body = entry
+    response = Response()
+    response.status_code = 200
+    response.reason = 'OK'
+    response.headers = CaseInsensitiveDict(headers)
+    response.headers.update(
+        (key, value) for key, value in not_modified.headers.items()
+        if key.lower() not in BODY_HEADERS)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = body
+    response._content_consumed = True
+    response.url = not_modified.url
+    response.request = request
+    response.connection = not_modified.connection
+    response.elapsed = not_modified.elapsed
+    response.cookies = not_modified.cookies
+    return response
+
+
+def install_validator_cache(
+        gl: Client,
+        cache: Optional[ValidatorCache] = None,
+        patterns: Optional[List[Pattern]] = None) -> ValidatorCache:
+    """Mounts a `ConditionalRequestAdapter` for the host of `gl` (see
+    `mount_adapter`: it can be installed before or after the other
+    adapters), and returns its cache."""
+    if cache is None:
+        cache = ValidatorCache()
+    mount_adapter(gl, ConditionalRequestAdapter(BaseAdapter(), cache,
+                                                patterns))
+    return cache
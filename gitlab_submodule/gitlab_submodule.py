@@ -1,27 +1,48 @@
-from typing import Generator, List, Optional
+from functools import partial
+from typing import Callable, Dict, Generator, Iterable, List, Optional, Tuple
 
 from gitlab.v4.objects import Project
 
-from gitlab_submodule.objects import Submodule, Subproject
-from gitlab_submodule.project_manager_utils import OneOrManyClients
+from gitlab_submodule.cache import ProjectCache, SubmoduleCache
+from gitlab_submodule.concurrency_utils import map_concurrently
+from gitlab_submodule.objects import (LazyCommit, NestedSubproject, Submodule,
+                                      Subproject)
+from gitlab_submodule.project_manager_utils import (OneOrManyClients,
+                                                    get_project_key)
+from gitlab_submodule.read_gitmodules import get_ref_commit_id
 from gitlab_submodule.read_gitmodules import \
     iterate_project_submodules as iterate_submodules
-from gitlab_submodule.submodule_commit import get_submodule_commit
-from gitlab_submodule.submodule_to_project import submodule_to_project
+from gitlab_submodule.resolution_plan import AUTO_STRATEGY, ResolutionPlan
+from gitlab_submodule.submodule_commit import (get_submodule_commit,
+                                               get_submodule_commit_ids)
+from gitlab_submodule.submodule_to_project import (ProjectsByPath,
+                                                   get_host_resolver,
+                                                   get_projects_by_path,
+                                                   submodule_to_project)
 
 
 def submodule_to_subproject(
         gitmodules_submodule: Submodule,
         gls: OneOrManyClients,
+        commit_id: Optional[str] = None,
+        projects: Optional[ProjectsByPath] = None,
+        cache: Optional[SubmoduleCache] = None,
+        project_cache: Optional[ProjectCache] = None,
+        lazy_commits: bool = False,
 ) -> Subproject:
     try:
         submodule_project = submodule_to_project(
             gitmodules_submodule,
             gls,
+            projects,
+            project_cache,
         )
         submodule_commit = get_submodule_commit(
             gitmodules_submodule,
             submodule_project,
+            commit_id,
+            cache,
+            lazy_commits,
         )
         return Subproject(
             gitmodules_submodule,
@@ -32,23 +53,161 @@ def submodule_to_subproject(
         raise
 
 
+def _submodule_to_subproject_or_none(
+        gitmodules_submodule: Submodule,
+        commit_ids: Dict[str, str],
+        **kwargs,
+) -> Optional[Subproject]:
+    try:
+        return submodule_to_subproject(
+            gitmodules_submodule,
+            commit_id=commit_ids.get(gitmodules_submodule.path.strip('/')),
+            **kwargs,
+        )
+    except FileNotFoundError:
+        return None
+
+
 def iterate_subprojects(
         project: Project,
         gls: OneOrManyClients,
         ref: Optional[str] = None,
         only_gitlab_subprojects: bool = False,
+        max_workers: Optional[int] = None,
+        ordered: bool = True,
+        strategy: str = AUTO_STRATEGY,
+        use_graphql: bool = False,
+        cache: Optional[SubmoduleCache] = None,
+        project_cache: Optional[ProjectCache] = None,
+        lazy_commits: bool = False,
+        pin_ref: bool = True,
+        on_plan: Optional[Callable[[ResolutionPlan], None]] = None,
 ) -> Generator[Subproject, None, None]:
-    for gitmodules_submodule in iterate_submodules(project, ref):
-        try:
-            subproject: Subproject = submodule_to_subproject(
-                gitmodules_submodule,
-                gls,
-            )
-            if not (only_gitlab_subprojects and not subproject.project):
-                yield subproject
-        except FileNotFoundError:
-            pass
+    gls = get_host_resolver(gls)
+    # resolve the ref once so that all the following requests see the same
+    # commit, even if the branch moves during the scan
+    parent_commit_id = get_ref_commit_id(project, ref) if pin_ref else None
+    if pin_ref and parent_commit_id is None:
+        # empty repository or missing ref
+        return
+    submodules = list(iterate_submodules(
+        project, ref, cache, parent_commit_id))
+    commit_ids = get_submodule_commit_ids(
+        project,
+        [submodule.path for submodule in submodules],
+        parent_commit_id or ref,
+        strategy,
+        cache,
+        on_plan,
+    )
+    projects = get_projects_by_path(submodules, gls) if use_graphql else None
+    to_subproject = partial(_submodule_to_subproject_or_none,
+                            gls=gls,
+                            commit_ids=commit_ids,
+                            projects=projects,
+                            cache=cache,
+                            project_cache=project_cache,
+                            lazy_commits=lazy_commits)
+    if max_workers is None:
+        subprojects = map(to_subproject, submodules)
+    else:
+        subprojects = map_concurrently(
+            to_subproject, submodules, max_workers, ordered)
+    for subproject in subprojects:
+        if subproject is None:
+            continue
+        if not (only_gitlab_subprojects and not subproject.project):
+            yield subproject
 
 
 def list_subprojects(*args, **kwargs) -> List[Subproject]:
     return list(iterate_subprojects(*args, **kwargs))
+
+
+def _subproject_key(subproject: Subproject) -> Optional[Tuple[str, str]]:
+    if subproject.project is None or subproject.commit is None:
+        return None
+    return get_project_key(subproject.project), subproject.commit.id
+
+
+def iterate_nested_subprojects(
+        project: Project,
+        gls: OneOrManyClients,
+        ref: Optional[str] = None,
+        only_gitlab_subprojects: bool = False,
+        max_depth: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        **kwargs,
+) -> Generator[NestedSubproject, None, None]:
+    """Walks the submodules of the submodules etc. breadth-first, each one
+    at the commit pinned by its parent, and yields the whole tree level by
+    level. The other parameters are passed to `iterate_subprojects`.
+
+    The submodules of a given (project, commit) are only resolved once,
+    even if it appears several times in the tree. The subprojects of a
+    level are expanded in parallel if `max_workers` is set."""
+    gls = get_host_resolver(gls)
+    children: Dict[Tuple[str, str], List[Subproject]] = {}
+
+    def expand(subproject: Subproject, workers: Optional[int] = None):
+        return list(iterate_subprojects(
+            subproject.project, gls, subproject.commit.id,
+            max_workers=workers, **kwargs))
+
+    level = [NestedSubproject(subproject.submodule,
+                              subproject.project,
+                              subproject.commit)
+             for subproject in iterate_subprojects(
+                 project, gls, ref, max_workers=max_workers, **kwargs)]
+    depth = 1
+    while level:
+        for subproject in level:
+            if not (only_gitlab_subprojects and not subproject.project):
+                yield subproject
+        if max_depth is not None and depth >= max_depth:
+            return
+
+        to_expand: Dict[Tuple[str, str], Subproject] = {}
+        for subproject in level:
+            key = _subproject_key(subproject)
+            if key is not None and key not in children:
+                to_expand.setdefault(key, subproject)
+        if max_workers is None:
+            expanded = map(expand, to_expand.values())
+        elif len(to_expand) == 1:
+            # a single project: parallelize its own submodules instead
+            expanded = map(partial(expand, workers=max_workers),
+                           to_expand.values())
+        else:
+            expanded = map_concurrently(
+                expand, list(to_expand.values()), max_workers)
+        children.update(zip(to_expand, expanded))
+
+        depth += 1
+        level = [
+            NestedSubproject(child.submodule, child.project, child.commit,
+                             depth, subproject.parents + (subproject,))
+            for subproject in level
+            for child in children.get(_subproject_key(subproject), [])]
+
+
+def list_nested_subprojects(*args, **kwargs) -> List[NestedSubproject]:
+    return list(iterate_nested_subprojects(*args, **kwargs))
+
+
+def hydrate_commits(
+        subprojects: Iterable[Subproject],
+        max_workers: Optional[int] = None,
+) -> None:
+    """Fetches the full commits of subprojects that were resolved with
+    `lazy_commits=True`, in a thread pool if `max_workers` is set."""
+    lazy_commits = [subproject.commit for subproject in subprojects
+                    if isinstance(subproject.commit, LazyCommit)
+                    and not subproject.commit.hydrated]
+    hydrate = LazyCommit.hydrate
+    if max_workers is None:
+        for commit in lazy_commits:
+            hydrate(commit)
+    else:
+        for _ in map_concurrently(hydrate, lazy_commits, max_workers):
+            pass
@@ -0,0 +1,166 @@
+"""Single-pass parser of .gitmodules files, following the git-config syntax:
+https://git-scm.com/docs/git-config#_syntax"""
+import re
+from typing import Dict, Iterable, Iterator, Optional, Set, Union
+
+STRING_OPTIONS = ('branch', 'ignore', 'update')
+BOOLEAN_OPTIONS = ('recurse', 'shallow')
+TRUE_VALUES = frozenset(('true', 'yes', 'on', '1'))
+FALSE_VALUES = frozenset(('false', 'no', 'off', '0', ''))
+
+_ESCAPES = {'"': '"', '\\': '\\', 'n': '\n', 't': '\t', 'b': '\b'}
+# `[section "subsection"]` or `[section.subsection]`, possibly followed by a
+# variable on the same line
+_SECTION_REGEX = re.compile(
+    r'\s*\[\s*([A-Za-z0-9.-]+)\s*(?:"((?:[^"\\\n]|\\.)*)")?\s*\](.*)')
+# `name = value`, or just `name` for a boolean set to true
+_VARIABLE_REGEX = re.compile(r'\s*([A-Za-z][A-Za-z0-9-]*)\s*(=.*|[#;].*)?')
+_SUBSECTION_ESCAPE_REGEX = re.compile(r'\\(.)')
+# values without these characters don't need the character by character
+# parsing
+_SPECIAL_VALUE_REGEX = re.compile(r'["\\#;\t\r\n\v\f]')
+
+
+def _parse_error(line_number: int, line: str) -> RuntimeError:
+    return RuntimeError(f'Failed parsing the .gitmodules content at line '
+                        f'{line_number}: {line!r}')
+
+
+def _parse_value(value: str, lines: Iterator[str], line_number: int) -> str:
+    """Strips the surrounding whitespace and the comment, replaces each
+    whitespace character outside quotes by a space, removes the quotes and
+    unescapes the value. A trailing backslash continues it on the next
+    line."""
+    stripped = value.strip()
+    if not _SPECIAL_VALUE_REGEX.search(stripped):
+        return stripped
+    chars = []
+    spaces = 0
+    quoted = False
+    i = 0
+    while True:
+        if i == len(value):
+            if quoted:
+                raise _parse_error(line_number, value)
+            return ''.join(chars)
+        char = value[i]
+        i += 1
+        if char == '\\' and i == len(value):
+            value = next(lines, '').rstrip('\r')
+            line_number += 1
+            i = 0
+            continue
+        if char.isspace() and not quoted:
+            spaces += bool(chars)
+            continue
+        if char in '#;' and not quoted:
+            i = len(value)
+            continue
+        if spaces:
+            chars.append(' ' * spaces)
+            spaces = 0
+        if char == '\\':
+            try:
+                chars.append(_ESCAPES[value[i]])
+            except KeyError:
+                raise _parse_error(line_number, value)
+            i += 1
+        elif char == '"':
+            quoted = not quoted
+        else:
+            chars.append(char)
+
+
+def _to_bool(value: Optional[str]) -> bool:
+    if value is None:
+        return True
+    if value.lower() in TRUE_VALUES:
+        return True
+    if value.lower() in FALSE_VALUES:
+        return False
+    raise ValueError(f'Not a boolean: {value}')
+
+
+def _to_submodule_kwargs(
+        name: str,
+        options: Dict[str, Optional[str]]
+) -> Dict[str, Union[None, bool, str]]:
+    if options.get('path') is None or options.get('url') is None:
+        raise RuntimeError(f'Failed parsing the .gitmodules content: '
+                           f'submodule "{name}" has no path or url')
+    kwargs: Dict[str, Union[None, bool, str]] = {
+        'name': name,
+        'path': options['path'],
+        'url': options['url'],
+    }
+    for option in STRING_OPTIONS:
+        kwargs[option] = options.get(option)
+    for option in BOOLEAN_OPTIONS:
+        kwargs[option] = (_to_bool(options[option]) if option in options
+                          else False)
+    return kwargs
+
+
+def parse_gitmodules(
+        content: Union[str, Iterable[str]]
+) -> Iterator[Dict[str, Union[None, bool, str]]]:
+    """Yields the keyword arguments of each `Submodule` (name, path, url,
+    branch, ignore, update, recurse, shallow) as soon as its section ends.
+
+    `content` is the text of the file, or its lines. Variable names are
+    case-insensitive and the last value of a variable wins, like in git.
+    The sections other than `[submodule "..."]` (or the deprecated
+    `[submodule.name]`) are ignored."""
+    lines = iter(content.split('\n') if isinstance(content, str)
+                 else content)
+    seen_names: Set[str] = set()
+    name: Optional[str] = None
+    options: Dict[str, Optional[str]] = {}
+    line_number = 0
+    for line in lines:
+        line_number += 1
+        line = line.rstrip('\r\n')
+        stripped = line.lstrip()
+        if not stripped or stripped[0] in '#;':
+            continue
+        if stripped[0] == '[':
+            match = _SECTION_REGEX.match(line)
+            if match is None:
+                raise _parse_error(line_number, line)
+            section, subsection, line = match.groups()
+            if subsection is None and '.' in section:
+                # deprecated `[section.subsection]` syntax, where git
+                # lowercases the subsection
+                section, subsection = section.split('.', 1)
+                subsection = subsection.lower()
+            if subsection is not None and section.lower() == 'submodule':
+                subsection = _SUBSECTION_ESCAPE_REGEX.sub(r'\1', subsection)
+            else:
+                subsection = None
+            if subsection != name:
+                if name is not None:
+                    yield _to_submodule_kwargs(name, options)
+                if subsection in seen_names:
+                    raise RuntimeError(
+                        f'Failed parsing the .gitmodules content: '
+                        f'submodule "{subsection}" is defined twice')
+                if subsection is not None:
+                    seen_names.add(subsection)
+                name, options = subsection, {}
+            stripped = line.lstrip()
+            if not stripped or stripped[0] in '#;':
+                continue
+        match = _VARIABLE_REGEX.fullmatch(line)
+        if match is None:
+            raise _parse_error(line_number, line)
+        variable, value = match.groups()
+        if value is not None and value[0] == '=':
+            # parsed even outside submodule sections, as it can continue
+            # on the next lines
+            value = _parse_value(value[1:], lines, line_number)
+        else:
+            value = None
+        if name is not None:
+            options[variable.lower()] = value
+    if name is not None:
+        yield _to_submodule_kwargs(name, options)
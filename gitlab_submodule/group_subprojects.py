@@ -0,0 +1,137 @@
+from concurrent.futures import (FIRST_COMPLETED, Future, ThreadPoolExecutor,
+                                wait)
+from functools import partial
+from inspect import signature
+from typing import Callable, Generator, List, Optional, Set
+
+from gitlab.v4.objects import Group, Project
+
+from gitlab_submodule.cache import ProjectCache, SubmoduleCache
+from gitlab_submodule.gitlab_submodule import (
+    _submodule_to_subproject_or_none, iterate_submodules, iterate_subprojects)
+from gitlab_submodule.objects import LazyProject, Subproject
+from gitlab_submodule.project_manager_utils import OneOrManyClients
+from gitlab_submodule.read_gitmodules import get_gitmodules_commit_id
+from gitlab_submodule.resolution_plan import AUTO_STRATEGY, ResolutionPlan
+from gitlab_submodule.submodule_commit import get_submodule_commit_ids
+from gitlab_submodule.submodule_to_project import (get_host_resolver,
+                                                   get_projects_by_path)
+
+
+def _scan_project(
+        project: Project,
+        gls: OneOrManyClients,
+        ref: Optional[str] = None,
+        strategy: str = AUTO_STRATEGY,
+        use_graphql: bool = False,
+        cache: Optional[SubmoduleCache] = None,
+        project_cache: Optional[ProjectCache] = None,
+        lazy_commits: bool = False,
+        pin_ref: bool = True,
+        on_plan: Optional[Callable[[ResolutionPlan], None]] = None,
+        **kwargs,
+) -> List[Callable[[], Optional[Subproject]]]:
+    """Reads the submodules of `project` and returns one call per submodule
+    that resolves its `Subproject`.
+
+    Takes the parameters of `iterate_subprojects`. The others (`ordered`)
+    don't apply, as the calls are run in the thread pool of the group."""
+    unknown = set(kwargs) - set(signature(iterate_subprojects).parameters)
+    if unknown:
+        raise TypeError(f'Unexpected parameters: {sorted(unknown)}')
+    # also finds the commit sha where .gitmodules is read, to pin the ref
+    commit_id = get_gitmodules_commit_id(project, ref)
+    if commit_id is None:
+        return []
+    parent_commit_id = commit_id if pin_ref else None
+    submodules = list(iterate_submodules(
+        project, ref, cache, parent_commit_id))
+    commit_ids = get_submodule_commit_ids(
+        project,
+        [submodule.path for submodule in submodules],
+        parent_commit_id or ref,
+        strategy,
+        cache,
+        on_plan,
+    )
+    projects = get_projects_by_path(submodules, gls) if use_graphql else None
+    return [partial(_submodule_to_subproject_or_none,
+                    submodule,
+                    commit_ids,
+                    gls=gls,
+                    projects=projects,
+                    cache=cache,
+                    project_cache=project_cache,
+                    lazy_commits=lazy_commits)
+            for submodule in submodules]
+
+
+def iterate_group_subprojects(
+        group: Group,
+        gls: OneOrManyClients,
+        only_gitlab_subprojects: bool = False,
+        max_workers: int = 10,
+        include_subgroups: bool = True,
+        archived: Optional[bool] = None,
+        **kwargs,
+) -> Generator[Subproject, None, None]:
+    """Yields the subprojects of all the projects of `group` (at the head of
+    their default branch, or of `ref`), as soon as they're resolved.
+
+    The projects are listed page by page while the scan is running. Empty
+    repositories are skipped without any request, and the others with a
+    single HEAD request if they have no .gitmodules file. All the requests
+    run in one thread pool, so `max_workers` bounds the number of requests
+    in flight for the whole group. The other parameters are the ones of
+    `iterate_subprojects`, where `ordered` has no effect.
+    """
+    client = group.manager.gitlab.projects
+    list_filters = {'include_subgroups': include_subgroups}
+    if archived is not None:
+        list_filters['archived'] = archived
+    group_projects = iter(group.projects.list(
+        iterator=True, per_page=100, **list_filters))
+    scan = partial(_scan_project, gls=get_host_resolver(gls), **kwargs)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        scans: Set[Future] = set()
+        lookups: Set[Future] = set()
+
+        def submit_scans() -> None:
+            # only list the next projects once the queue gets short
+            while len(scans) < max_workers:
+                group_project = next(group_projects, None)
+                if group_project is None:
+                    return
+                attributes = group_project.attributes
+                if attributes.get('empty_repo') \
+                        or not attributes.get('default_branch'):
+                    continue
+                scans.add(executor.submit(
+                    scan, LazyProject(client, dict(attributes))))
+
+        try:
+            submit_scans()
+            while scans or lookups:
+                done, _ = wait(scans | lookups, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in scans:
+                        scans.remove(future)
+                        lookups.update(executor.submit(to_subproject)
+                                       for to_subproject in future.result())
+                        continue
+                    lookups.remove(future)
+                    subproject = future.result()
+                    if subproject is None:
+                        continue
+                    if not (only_gitlab_subprojects
+                            and not subproject.project):
+                        yield subproject
+                submit_scans()
+        finally:
+            for future in scans | lookups:
+                future.cancel()
+
+
+def list_group_subprojects(*args, **kwargs) -> List[Subproject]:
+    return list(iterate_group_subprojects(*args, **kwargs))
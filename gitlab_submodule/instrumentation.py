@@ -0,0 +1,199 @@
+import math
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+from requests import Response
+
+from gitlab_submodule.project_manager_utils import Client, as_project_manager
+
+# Stages of a scan, set around the GitLab calls of each function
+REF_STAGE = 'ref'
+GITMODULES_STAGE = 'gitmodules'
+PROJECT_LOOKUP_STAGE = 'project_lookup'
+COMMIT_IDS_STAGE = 'commit_ids'
+COMMIT_DIFF_STAGE = 'commit_diff'
+COMMIT_FETCH_STAGE = 'commit_fetch'
+COMPARE_STAGE = 'compare'
+# calls made outside of any stage, e.g. by the caller
+OTHER_STAGE = 'other'
+
+PERCENTILES = (50, 90, 99)
+
+_current_stage: 'ContextVar[Optional[str]]' = ContextVar(
+    'stage', default=None)
+
+# id and file path segments replaced by placeholders in endpoints
+_ENDPOINT_PATTERNS = [
+    (re.compile(r'^/api/v4'), ''),
+    (re.compile(r'/(projects|groups)/[^/]+'), r'/\1/:id'),
+    (re.compile(r'/repository/files/[^/]+'), '/repository/files/:file_path'),
+    (re.compile(r'/repository/commits/[^/]+'), '/repository/commits/:sha'),
+]
+
+
+def current_stage() -> Optional[str]:
+    return _current_stage.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Tags the GitLab calls made inside with the stage `name` (the
+    innermost stage wins). Also usable as a function decorator."""
+    token = _current_stage.set(name)
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+
+
+def get_endpoint(url: str) -> str:
+    """`https://host/api/v4/projects/a%2Fb/repository/tree` ->
+    `/projects/:id/repository/tree`"""
+    endpoint = urlsplit(url).path
+    for pattern, replacement in _ENDPOINT_PATTERNS:
+        endpoint = pattern.sub(replacement, endpoint)
+    return endpoint
+
+
+class CallEvent:
+    """One HTTP call to GitLab. `latency` is in seconds, until the response
+    headers were received. `page` and `total_pages` are only set for
+    paginated listings."""
+
+    def __init__(self,
+                 stage: str,
+                 method: str,
+                 endpoint: str,
+                 status: int,
+                 latency: float,
+                 bytes: Optional[int],
+                 page: Optional[int] = None,
+                 total_pages: Optional[int] = None):
+        self.stage = stage
+        self.method = method
+        self.endpoint = endpoint
+        self.status = status
+        self.latency = latency
+        self.bytes = bytes
+        self.page = page
+        self.total_pages = total_pages
+
+    def __repr__(self):
+        return '{} ({}, {} {}, {}, {:.1f}ms)'.format(
+            self.__class__.__name__,
+            self.stage,
+            self.method,
+            self.endpoint,
+            self.status,
+            1000 * self.latency)
+
+
+def _to_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def _to_event(response: Response, stream: bool) -> CallEvent:
+    n_bytes = _to_int(response.headers.get('Content-Length'))
+    if n_bytes is None and not stream:
+        # read anyway by requests right after the hooks
+        n_bytes = len(response.content)
+    return CallEvent(
+        stage=current_stage() or OTHER_STAGE,
+        method=response.request.method,
+        endpoint=get_endpoint(response.url),
+        status=response.status_code,
+        latency=response.elapsed.total_seconds(),
+        bytes=n_bytes,
+        page=_to_int(response.headers.get('X-Page')),
+        total_pages=_to_int(response.headers.get('X-Total-Pages')))
+
+
+def add_call_hook(gl: Client,
+                  callback: Callable[[CallEvent], None]
+                  ) -> Callable[[], None]:
+    """Calls `callback` with a `CallEvent` after each call made with `gl`,
+    from the thread that made it. Returns a function removing the hook."""
+    session = as_project_manager(gl).gitlab.session
+
+    def hook(response: Response, *_, stream: bool = False, **__):
+        callback(_to_event(response, stream))
+        return response
+
+    session.hooks['response'].append(hook)
+    return lambda: session.hooks['response'].remove(hook)
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    # nearest-rank method
+    rank = max(math.ceil(percentile / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class StageStats:
+    """Aggregates `CallEvent`s per stage, as callback of `add_call_hook`:
+
+        stats = StageStats()
+        remove_hook = add_call_hook(gl, stats)
+        subprojects = list_subprojects(project, gl)
+        print(stats)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events: Dict[str, List[CallEvent]] = {}
+
+    def __call__(self, event: CallEvent) -> None:
+        with self._lock:
+            self._events.setdefault(event.stage, []).append(event)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._events.clear()
+
+    def events(self, stage: Optional[str] = None) -> List[CallEvent]:
+        with self._lock:
+            if stage is not None:
+                return list(self._events.get(stage, []))
+            return [event for events in self._events.values()
+                    for event in events]
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """Per stage: number of calls, of errors (status >= 400) and of
+        pages, bytes received, total latency and its percentiles."""
+        report = {}
+        with self._lock:
+            events_by_stage = {stage: list(events)
+                               for stage, events in self._events.items()}
+        for stage_name, events in sorted(events_by_stage.items()):
+            latencies = sorted(event.latency for event in events)
+            stats = {
+                'calls': len(events),
+                'errors': sum(event.status >= 400 for event in events),
+                'pages': sum(event.page is not None for event in events),
+                'bytes': sum(event.bytes or 0 for event in events),
+                'latency': sum(latencies),
+            }
+            stats.update(
+                (f'p{percentile}', _percentile(latencies, percentile))
+                for percentile in PERCENTILES)
+            report[stage_name] = stats
+        return report
+
+    def __str__(self):
+        lines = ['{:<15} {:>6} {:>6} {:>6} {:>10} {:>9} {}'.format(
+            'stage', 'calls', 'errors', 'pages', 'bytes', 'total (s)',
+            ' '.join(f'{f"p{p} (ms)":>9}' for p in PERCENTILES))]
+        for stage_name, stats in self.report().items():
+            lines.append('{:<15} {:>6} {:>6} {:>6} {:>10} {:>9.3f} {}'.format(
+                stage_name, stats['calls'], stats['errors'], stats['pages'],
+                stats['bytes'], stats['latency'],
+                ' '.join(f'{1000 * stats[f"p{p}"]:>9.1f}'
+                         for p in PERCENTILES)))
+        return '\n'.join(lines)
@@ -1,11 +1,31 @@
-from typing import Optional, Union
+import importlib
+from operator import attrgetter
+from typing import Optional, Tuple, Union
 
 from gitlab.v4.objects import Project, ProjectCommit
 
-from gitlab_submodule.string_utils import lstrip
+SUBMODULE_KEYS = frozenset((
+    'parent_project', 'parent_ref', 'parent_commit_id', 'name', 'path',
+    'url', 'update', 'branch', 'ignore', 'shallow', 'recurse'
+))
+SUBPROJECT_ATTRIBUTES = ('submodule', 'project', 'commit')
+# `Subproject.<attribute>_<name>` aliases defined as properties, the other
+# ones are resolved by `Subproject.__getattr__`
+PROJECT_ALIASES = (
+    'id', 'name', 'path', 'path_with_namespace', 'namespace', 'description',
+    'default_branch', 'web_url', 'ssh_url_to_repo', 'http_url_to_repo'
+)
+COMMIT_ALIASES = (
+    'id', 'short_id', 'title', 'message', 'parent_ids', 'web_url',
+    'author_name', 'author_email', 'authored_date', 'committer_name',
+    'committer_email', 'committed_date', 'created_at'
+)
 
 
 class Submodule:
+    # '__dict__' keeps the other attributes settable, it's only allocated
+    # when one is set
+    __slots__ = tuple(sorted(SUBMODULE_KEYS)) + ('__dict__',)
 
     def __init__(self,
                  parent_project: Project,
@@ -17,10 +37,12 @@ class Submodule:
                  ignore: Optional[str] = None,
                  update: Optional[str] = None,
                  recurse: bool = False,
-                 shallow: bool = False):
+                 shallow: bool = False,
+                 parent_commit_id: Optional[str] = None):
 
         self.parent_project = parent_project
         self.parent_ref = parent_ref
+        self.parent_commit_id = parent_commit_id
         self.name = name
         self.path = path
         self.url = url
@@ -30,14 +52,17 @@ class Submodule:
         self.recurse = recurse
         self.shallow = shallow
 
+    @property
+    def parent_pinned_ref(self) -> str:
+        """The commit sha that `parent_ref` pointed to when the submodule
+        was read if known, else `parent_ref`."""
+        return self.parent_commit_id or self.parent_ref
+
     def keys(self):
-        return {
-            'parent_project', 'parent_ref', 'name', 'path', 'url',
-            'update', 'branch', 'ignore', 'shallow', 'recurse'
-        }
+        return SUBMODULE_KEYS
 
     def __getitem__(self, key):
-        if key in self.keys():
+        if key in SUBMODULE_KEYS:
             return getattr(self, key)
         else:
             raise KeyError(key)
@@ -69,16 +94,103 @@ class Submodule:
                 repr(self.update),
                 repr(self.recurse),
                 repr(self.shallow),
+                repr(self.parent_commit_id),
             ))
         )
 
 
+class LazyProject(Project):
+    """`Project` created from partial data (e.g. only its path) without
+    requesting the REST API. The missing attributes are fetched once, the
+    first time one of them is accessed."""
+
+    # python-gitlab creates the managers (commits, files...) of an object
+    # from the annotations of its class and the classes of its module
+    __annotations__ = Project.__annotations__
+
+    def _create_managers(self) -> None:
+        self.__dict__['_module'] = importlib.import_module(Project.__module__)
+        super()._create_managers()
+
+    @property
+    def loaded(self) -> bool:
+        return self.__dict__.get('_loaded', False)
+
+    def load(self) -> None:
+        project = self.manager.get(self.get_id())
+        self._update_attrs(project.attributes)
+        self.__dict__['_loaded'] = True
+
+    def __getattr__(self, name: str):
+        try:
+            return super().__getattr__(name)
+        except AttributeError:
+            if name.startswith('_') or self.loaded:
+                raise
+        self.load()
+        return super().__getattr__(name)
+
+
 class Commit:
     def __init__(self, _id) -> None:
-        self.id = id
+        self.id = _id
+
+
+class LazyCommit(Commit):
+    """Only holds the commit sha until any other attribute is accessed:
+    the full `ProjectCommit` is then fetched from `project` once."""
+
+    def __init__(self, project: Project, _id: str) -> None:
+        super().__init__(_id)
+        self._project = project
+        self._commit: Optional[ProjectCommit] = None
+
+    @property
+    def hydrated(self) -> bool:
+        return self._commit is not None
+
+    def hydrate(self) -> ProjectCommit:
+        if self._commit is None:
+            self._commit = self._project.commits.get(self.id)
+        return self._commit
+
+    def __getattr__(self, item: str):
+        # only called for attributes that are not set on the LazyCommit
+        if item.startswith('_'):
+            raise AttributeError(item)
+        return getattr(self.hydrate(), item)
+
+    def __eq__(self, other):
+        other_id = getattr(other, 'id', None)
+        if other_id is None:
+            return NotImplemented
+        return self.id == other_id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __str__(self):
+        if self._commit is not None:
+            return str(self._commit)
+        return f"<class '{self.__class__.__name__}'> => {{'id': '{self.id}'}}"
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} ({self.id!r})'
+
+
+def _alias(attribute: str, name: str) -> property:
+    def set_alias(self, value):
+        setattr(getattr(self, attribute), name, value)
+    return property(attrgetter(f'{attribute}.{name}'), set_alias,
+                    doc=f'`{attribute}.{name}`')
 
 
 class Subproject:
+    """Its `submodule_*`, `project_*` and `commit_*` attributes are aliases
+    of the attributes of `submodule`, `project` and `commit`, e.g.
+    `subproject.project_web_url` is `subproject.project.web_url`."""
+    __slots__ = SUBPROJECT_ATTRIBUTES + ('__dict__',)
+
     def __init__(self,
                  submodule: Submodule,
                  project: Optional[Project],
@@ -87,32 +199,22 @@ class Subproject:
         self.project = project
         self.commit = commit
 
-    def __getattribute__(self, item: str):
-        try:
-            return super().__getattribute__(item)
-        except AttributeError:
-            for attribute in {'submodule', 'project', 'commit'}:
-                if item.startswith(f'{attribute}_'):
-                    return getattr(super().__getattribute__(attribute),
-                                   lstrip(item, f'{attribute}_'))
-
+    def __getattr__(self, item: str):
+        # only called for the attributes that are not slots or properties
+        attribute, _, name = item.partition('_')
+        if attribute in SUBPROJECT_ATTRIBUTES and name:
+            return getattr(getattr(self, attribute), name)
         raise AttributeError("'{} object has no attribute '{}'".format(
             self.__class__.__name__, item))
 
     def __setattr__(self, key, value):
-        for attribute in {'submodule', 'project', 'commit'}:
-            if key == attribute:
-                return super().__setattr__(key, value)
-            if key.startswith(f'{attribute}_'):
-                return setattr(getattr(self, attribute),
-                               lstrip(key, f'{attribute}_'),
-                               value)
-
-        try:
-            super().__setattr__(key, value)
-        except AttributeError:
-            raise AttributeError("'{} object has no attribute '{}'".format(
-                self.__class__.__name__, key))
+        if hasattr(type(self), key):
+            # slot or alias property
+            return object.__setattr__(self, key, value)
+        attribute, _, name = key.partition('_')
+        if attribute in SUBPROJECT_ATTRIBUTES and name:
+            return setattr(getattr(self, attribute), name, value)
+        object.__setattr__(self, key, value)
 
     def __str__(self):
         class_part = f"<class '{self.__class__.__name__}'>"
@@ -127,3 +229,28 @@ class Subproject:
             repr(self.project),
             repr(self.commit),
         )
+
+
+for _name in sorted(SUBMODULE_KEYS) + ['parent_pinned_ref']:
+    setattr(Subproject, f'submodule_{_name}', _alias('submodule', _name))
+for _name in PROJECT_ALIASES:
+    setattr(Subproject, f'project_{_name}', _alias('project', _name))
+for _name in COMMIT_ALIASES:
+    setattr(Subproject, f'commit_{_name}', _alias('commit', _name))
+
+
+class NestedSubproject(Subproject):
+    """`Subproject` found while walking nested submodules. `depth` is 1 for
+    the submodules of the scanned project, and `parents` holds the chain of
+    subprojects leading to this one, starting from depth 1."""
+    __slots__ = ('depth', 'parents')
+
+    def __init__(self,
+                 submodule: Submodule,
+                 project: Optional[Project],
+                 commit: Optional[Union[ProjectCommit, Commit]],
+                 depth: int = 1,
+                 parents: Tuple['NestedSubproject', ...] = ()):
+        super().__init__(submodule, project, commit)
+        self.depth = depth
+        self.parents = parents
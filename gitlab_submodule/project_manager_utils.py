@@ -1,7 +1,10 @@
 from typing import Dict, List, Union
+from urllib.parse import quote
 
 from gitlab import Gitlab
-from gitlab.v4.objects import ProjectManager
+from gitlab.v4.objects import Project, ProjectManager
+
+from gitlab_submodule.objects import LazyProject
 
 # Some typing
 Client = Union[Gitlab, ProjectManager]
@@ -31,3 +34,30 @@ def map_domain_to_clients(gls: OneOrManyClients) -> ProjectManagerDicts:
     if not isinstance(gls, list):
         gls = [gls]
     return {get_host_url(gl): as_project_manager(gl) for gl in gls}
+
+
+def get_project_key(project: Project) -> str:
+    """Identifies a project across hosts: `<host url>/<path_with_namespace>`
+    (lowercase, as GitLab paths are case-insensitive)."""
+    return '{}/{}'.format(get_host_url(project.manager),
+                          project.path_with_namespace.lower())
+
+
+def get_lazy_project(gl: Client, path_with_namespace: str) -> LazyProject:
+    """Builds a project from its path without requesting the REST API, e.g.
+    to pass as parent project to `iterate_subprojects`."""
+    return LazyProject(as_project_manager(gl), {
+        'id': path_with_namespace,
+        'path_with_namespace': path_with_namespace,
+    })
+
+
+def get_file_headers(project: Project,
+                     file_path: str,
+                     ref: str) -> Dict[str, str]:
+    """HEAD request on a repository file: the `X-Gitlab-*` headers hold
+    the same metadata as `project.files.get()` (e.g. `X-Gitlab-Commit-Id`,
+    `X-Gitlab-Last-Commit-Id`) without downloading the file."""
+    return project.manager.gitlab.http_head(
+        f'{project.files.path}/{quote(file_path, safe="")}',
+        query_data={'ref': ref})
@@ -0,0 +1,151 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from gitlab_submodule.objects import LazyProject, Subproject
+from gitlab_submodule.project_manager_utils import (OneOrManyClients,
+                                                    get_project_key,
+                                                    map_domain_to_clients)
+from gitlab_submodule.subprojects_delta import (_move_to_commit,
+                                                update_subprojects)
+
+# `before` of a push creating a branch, `after` of a push deleting one
+NULL_SHA = '0' * 40
+BRANCH_PREFIX = 'refs/heads/'
+
+
+class Snapshot:
+    """The subprojects of a branch at a given commit of the parent project."""
+
+    def __init__(self, commit_id: str, subprojects: Iterable[Subproject]):
+        self.commit_id = commit_id
+        self.subprojects = list(subprojects)
+
+    def __repr__(self):
+        return '{} ({}, {} subprojects)'.format(
+            self.__class__.__name__,
+            repr(self.commit_id),
+            len(self.subprojects))
+
+
+class SnapshotStore:
+    """In-memory snapshots, keyed by (project key, branch)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots: Dict[Tuple[str, str], Snapshot] = {}
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def get(self, project: str, branch: str) -> Optional[Snapshot]:
+        with self._lock:
+            return self._snapshots.get((project, branch))
+
+    def set(self, project: str, branch: str, snapshot: Snapshot) -> None:
+        with self._lock:
+            self._snapshots[(project, branch)] = snapshot
+
+    def remove(self, project: str, branch: str) -> None:
+        with self._lock:
+            self._snapshots.pop((project, branch), None)
+
+
+def get_pushed_paths(payload: dict) -> Optional[Set[str]]:
+    """The files added, modified or removed by a push, or None if the
+    payload doesn't list all of them: GitLab only details the last 20
+    commits of a push, and a forced push can list no commit (e.g. back to
+    an older commit) or commits that don't lead to `after`."""
+    commits = payload.get('commits') or []
+    total_commits_count = payload.get('total_commits_count', len(commits))
+    commit_ids = {commit.get('id') for commit in commits}
+    if total_commits_count != len(commits) \
+            or payload.get('after') not in commit_ids:
+        return None
+    paths: Set[str] = set()
+    for commit in commits:
+        for key in ('added', 'modified', 'removed'):
+            paths.update(commit.get(key) or [])
+    return paths
+
+
+class PushEventProcessor:
+    """Keeps the snapshots of a `SnapshotStore` up to date from GitLab push
+    webhook payloads.
+
+    A push that lists all its commits and touches neither .gitmodules nor
+    a submodule path of the stored snapshot only moves the snapshot to the
+    pushed commit, without any request. Otherwise the snapshot is updated
+    with `update_subprojects` (a single compare request plus the
+    submodules that changed), and branches without snapshot yet are
+    scanned entirely. The other keyword arguments are passed to
+    `update_subprojects`.
+
+    The submodules keep the pushed branch as `parent_ref`, and the pushed
+    commit as `parent_commit_id`.
+    """
+
+    def __init__(self,
+                 gls: OneOrManyClients,
+                 store: Optional[SnapshotStore] = None,
+                 **kwargs):
+        self.gls = gls
+        self.clients = map_domain_to_clients(gls)
+        self.store = store if store is not None else SnapshotStore()
+        self.kwargs = kwargs
+
+    def _get_project(self, payload: dict) -> LazyProject:
+        attributes = payload['project']
+        for host_url, client in self.clients.items():
+            if attributes['web_url'].startswith(host_url.rstrip('/') + '/'):
+                return LazyProject(client, dict(attributes,
+                                                id=payload['project_id']))
+        raise ValueError(f'No client for {attributes["web_url"]}')
+
+    def process(self, payload: dict) -> Optional[Snapshot]:
+        """Returns the updated snapshot, or None if the event was ignored
+        (not a branch push) or deleted the branch."""
+        if payload.get('object_kind') != 'push' \
+                or not payload['ref'].startswith(BRANCH_PREFIX):
+            return None
+        branch = payload['ref'][len(BRANCH_PREFIX):]
+        project = self._get_project(payload)
+        key = get_project_key(project)
+        before, after = payload['before'], payload['after']
+        if after == NULL_SHA:
+            self.store.remove(key, branch)
+            return None
+
+        previous = self.store.get(key, branch)
+        if previous is not None and previous.commit_id == after:
+            return previous
+        if previous is not None and previous.commit_id == before:
+            pushed_paths = get_pushed_paths(payload)
+            if pushed_paths is not None \
+                    and not _touches_submodules(previous, pushed_paths):
+                snapshot = Snapshot(after, _move_to_commit(
+                    previous.subprojects, branch, after))
+                self.store.set(key, branch, snapshot)
+                return snapshot
+
+        subprojects: List[Subproject] = []
+        previous_commit_id = None
+        if previous is not None:
+            subprojects = previous.subprojects
+            previous_commit_id = previous.commit_id
+        snapshot = Snapshot(after, update_subprojects(
+            project,
+            self.gls,
+            subprojects,
+            branch,
+            previous_commit_id=previous_commit_id,
+            commit_id=after,
+            **self.kwargs))
+        self.store.set(key, branch, snapshot)
+        return snapshot
+
+
+def _touches_submodules(snapshot: Snapshot, paths: Set[str]) -> bool:
+    if '.gitmodules' in paths:
+        return True
+    return any(subproject.submodule.path.strip('/') in paths
+               for subproject in snapshot.subprojects)
@@ -0,0 +1,169 @@
+import email.utils
+import logging
+import threading
+import time
+from typing import Mapping, Optional
+
+from requests.adapters import HTTPAdapter
+
+from gitlab_submodule.adapters import mount_adapter
+from gitlab_submodule.project_manager_utils import Client
+
+logger = logging.getLogger(__name__)
+
+# waiting time when a 429 response has no usable Retry-After header
+DEFAULT_RETRY_AFTER = 1.
+
+
+class RateLimiter:
+    """Token bucket shared by all the threads (and asyncio tasks, which run
+    their requests in threads) making requests to one GitLab host.
+
+    It refills at `rate` requests per second if set, and adapts to the
+    `RateLimit-Remaining` / `RateLimit-Reset` headers of the responses: the
+    remaining requests are spread evenly until the reset, so that the limit
+    isn't reached at full throughput.
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: int = 10):
+        self.max_rate = rate
+        self.burst = burst
+        self.rate = rate
+        self.tokens = float(burst)
+        # metrics
+        self.requests = 0
+        self.throttled_requests = 0
+        self.throttled_seconds = 0.
+        self._blocked_until = 0.
+        self._updated_at = time.monotonic()
+        self._condition = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        if self.rate is not None:
+            self.tokens = min(
+                self.burst,
+                self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self) -> None:
+        """Blocks until a request can be made."""
+        started = time.monotonic()
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    self._condition.wait(self._blocked_until - now)
+                elif self.rate is None or self.tokens >= 1:
+                    break
+                else:
+                    self._condition.wait((1 - self.tokens) / self.rate)
+            if self.rate is not None:
+                self.tokens -= 1
+            self.requests += 1
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                self.throttled_requests += 1
+                self.throttled_seconds += waited
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        """Adapts the pace to the rate limit headers of a response."""
+        remaining = _parse_float(headers.get('RateLimit-Remaining'))
+        reset = _parse_float(headers.get('RateLimit-Reset'))
+        if remaining is None or reset is None:
+            return
+        window = reset - time.time()
+        with self._condition:
+            now = time.monotonic()
+            self._refill(now)
+            if remaining < 1:
+                self._block(now + max(window, 0.))
+                return
+            if window > 0:
+                rate = remaining / window
+                self.rate = rate if self.max_rate is None \
+                    else min(rate, self.max_rate)
+            self.tokens = min(self.tokens, remaining)
+
+    def block(self, seconds: float) -> None:
+        """Holds all the requests for `seconds`, e.g. after a 429."""
+        with self._condition:
+            self._block(time.monotonic() + seconds)
+
+    def _block(self, until: float) -> None:
+        if until > self._blocked_until:
+            self._blocked_until = until
+            self._condition.notify_all()
+
+    def __repr__(self):
+        return '{} (rate={}, requests={}, throttled_requests={}, ' \
+               'throttled_seconds={:.3f})'.format(
+                   self.__class__.__name__,
+                   self.rate,
+                   self.requests,
+                   self.throttled_requests,
+                   self.throttled_seconds)
+
+
+def _parse_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def get_retry_after(headers: Mapping[str, str]) -> float:
+    value = headers.get('Retry-After')
+    if value is None:
+        return DEFAULT_RETRY_AFTER
+    seconds = _parse_float(value)
+    if seconds is not None:
+        return max(seconds, 0.)
+    date = email.utils.parsedate_to_datetime(value)
+    if date is None:
+        return DEFAULT_RETRY_AFTER
+    return max(date.timestamp() - time.time(), 0.)
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """Sends every request through a `RateLimiter`. 429 responses are
+    retried here (up to `max_retries_on_429` times) once the limiter has
+    waited for their `Retry-After`, instead of sleeping in python-gitlab's
+    own retry loop."""
+
+    def __init__(self,
+                 limiter: RateLimiter,
+                 max_retries_on_429: int = 5,
+                 **kwargs):
+        self.limiter = limiter
+        self.max_retries_on_429 = max_retries_on_429
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        for retry in range(self.max_retries_on_429 + 1):
+            self.limiter.acquire()
+            response = super().send(request, **kwargs)
+            self.limiter.update(response.headers)
+            if response.status_code != 429 \
+                    or retry == self.max_retries_on_429:
+                return response
+            retry_after = get_retry_after(response.headers)
+            logger.info(f'429 response from {request.url}, retrying in '
+                        f'{retry_after:.2f}s')
+            self.limiter.block(retry_after)
+            response.close()
+        return response
+
+
+def install_rate_limiter(gl: Client,
+                         limiter: Optional[RateLimiter] = None,
+                         **kwargs) -> RateLimiter:
+    """Routes all the requests of `gl` to its host through `limiter`
+    (a new one by default), and returns it. Clients of the same host can
+    share a limiter by passing it. The other keyword arguments are passed
+    to `RateLimitedAdapter`, which replaces the transport of the host (e.g.
+    the pool of a `TransportManager`) under the other adapters."""
+    if limiter is None:
+        limiter = RateLimiter()
+    mount_adapter(gl, RateLimitedAdapter(limiter, **kwargs))
+    return limiter
@@ -1,68 +1,112 @@
-import configparser
-import re
-from typing import Iterable, List, Optional, Union
+from typing import Dict, Iterable, List, Optional, Union
 
+from gitlab.exceptions import GitlabGetError, GitlabHttpError
 from gitlab.v4.objects import Project
 
+from gitlab_submodule.cache import SubmoduleCache, is_commit_sha
+from gitlab_submodule.gitmodules_parser import parse_gitmodules
+from gitlab_submodule.instrumentation import GITMODULES_STAGE, REF_STAGE, stage
 from gitlab_submodule.objects import Submodule
+from gitlab_submodule.project_manager_utils import get_file_headers
+from gitlab_submodule.request_budget import RequestBudgetExceeded
 
 
 def list_project_submodules(
         project: Project,
-        ref: Optional[str] = None) -> List[Submodule]:
-    return list(iterate_project_submodules(project, ref))
+        ref: Optional[str] = None,
+        cache: Optional[SubmoduleCache] = None,
+        parent_commit_id: Optional[str] = None) -> List[Submodule]:
+    return list(iterate_project_submodules(
+        project, ref, cache, parent_commit_id))
 
 
 def iterate_project_submodules(
         project: Project,
-        ref: Optional[str] = None) -> Iterable[Submodule]:
-    gitmodules_file_content = _get_gitmodules_file_content(project, ref)
-    if not gitmodules_file_content:
-        raise StopIteration
-    for kwargs in _read_gitmodules_file_content(
-            gitmodules_file_content):
+        ref: Optional[str] = None,
+        cache: Optional[SubmoduleCache] = None,
+        parent_commit_id: Optional[str] = None) -> Iterable[Submodule]:
+    """If `parent_commit_id` is given (see `get_ref_commit_id`), the
+    .gitmodules file is read at this commit instead of `ref`."""
+    ref = ref if ref else project.default_branch
+    read_ref = parent_commit_id or ref
+    entries = cache.get_gitmodules(project, read_ref) if cache else None
+    if entries is None:
+        gitmodules_file_content = _get_gitmodules_file_content(
+            project, read_ref)
+        if not gitmodules_file_content:
+            return
+        entries = list(_read_gitmodules_file_content(
+            gitmodules_file_content))
+        if cache:
+            cache.set_gitmodules(project, read_ref, entries)
+    for kwargs in entries:
         yield Submodule(
             parent_project=project,
-            parent_ref=ref if ref else project.default_branch,
+            parent_ref=ref,
+            parent_commit_id=parent_commit_id,
             **kwargs)
 
 
+@stage(REF_STAGE)
+def get_ref_commit_id(project: Project,
+                      ref: Optional[str] = None) -> Optional[str]:
+    """Resolves a branch, tag etc. of the project (by default its default
+    branch) to the commit sha it currently points to, so that all the
+    following requests read the same state of the repository.
+
+    Returns None if the ref doesn't exist, or if the repository is empty
+    (no default branch)."""
+    ref = ref if ref else project.default_branch
+    if not ref:
+        return None
+    if is_commit_sha(ref):
+        return ref
+    try:
+        return project.commits.get(ref).id
+    except GitlabGetError as e:
+        if e.response_code == 404:
+            return None
+        raise
+
+
+@stage(GITMODULES_STAGE)
+def get_gitmodules_commit_id(project: Project,
+                             ref: Optional[str] = None) -> Optional[str]:
+    """Cheap check with a HEAD request: returns the commit sha that `ref`
+    points to if the project has a .gitmodules file there, else None (also
+    if the repository is disabled or can't be read with this token)."""
+    try:
+        return get_file_headers(
+            project,
+            '.gitmodules',
+            ref=ref if ref else project.default_branch,
+        )['X-Gitlab-Commit-Id']
+    except GitlabHttpError as e:
+        if e.response_code in (403, 404):
+            return None
+        raise
+
+
+@stage(GITMODULES_STAGE)
 def _get_gitmodules_file_content(project: Project,
                                  ref: Optional[str] = None) -> Optional[str]:
+    # the raw endpoint avoids the base64 JSON payload of `files.get()`
+    chunks = []
     try:
-        gitmodules = project.files.get(
+        project.files.raw(
             '.gitmodules',
-            ref=ref if ref else project.default_branch)
-        return gitmodules.decode().decode('utf-8')
+            ref=ref if ref else project.default_branch,
+            streamed=True,
+            action=chunks.append)
+        return b''.join(chunks).decode('utf-8')
+    except RequestBudgetExceeded:
+        raise
     except Exception:
         return None
 
 
 def _read_gitmodules_file_content(
     gitmodules_file_content: str
-) -> Iterable[dict[str, Union[None, bool, str]]]:
-    """Parses contents of .gitmodule file using configparser"""
-    config = configparser.ConfigParser()
-    config.optionxform = str
-    config.read_string(gitmodules_file_content)
-    stropts = ('branch', 'ignore', 'update')
-    boolopts = ('recurse', 'shallow')
-    name_regex = r'submodule "([a-zA-Z0-9\.\-/_]+)"'
-    for section in config.sections():
-        try:
-            kwargs = {
-                'name': re.match(name_regex, section).group(1),
-                'path': config.get(section, 'path'),
-                'url': config.get(section, 'url')
-            }
-        except (AttributeError, KeyError):
-            raise RuntimeError('Failed parsing the .gitmodules contnet')
-        kwargs.update(
-            (opt, config.get(section, opt, fallback=None))
-            for opt in stropts
-        )
-        kwargs.update(
-            (opt, config.getboolean(section, opt, fallback=False))
-            for opt in boolopts
-        )
-        yield kwargs
+) -> Iterable[Dict[str, Union[None, bool, str]]]:
+    """Parses contents of .gitmodule file (see `parse_gitmodules`)"""
+    return parse_gitmodules(gitmodules_file_content)
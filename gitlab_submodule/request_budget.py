@@ -0,0 +1,108 @@
+import logging
+import threading
+from typing import AsyncGenerator, AsyncIterable, Generator, Iterable, TypeVar
+
+from requests.adapters import BaseAdapter
+
+from gitlab_submodule.adapters import WrapperAdapter, mount_adapter
+from gitlab_submodule.project_manager_utils import Client
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class RequestBudgetExceeded(RuntimeError):
+    pass
+
+
+class RequestBudget:
+    """Maximum number of requests that the clients it's installed on (see
+    `install_request_budget`) can make, shared by all their threads."""
+
+    def __init__(self, max_requests: int):
+        self.max_requests = max_requests
+        self.spent = 0
+        self.refused = 0
+        self._lock = threading.Lock()
+
+    @property
+    def remaining(self) -> int:
+        return max(self.max_requests - self.spent, 0)
+
+    @property
+    def exhausted(self) -> bool:
+        """True once a request was refused."""
+        return self.refused > 0
+
+    def spend(self) -> None:
+        """Counts one request, or raises `RequestBudgetExceeded`."""
+        with self._lock:
+            if self.spent < self.max_requests:
+                self.spent += 1
+                return
+            self.refused += 1
+            first_refusal = self.refused == 1
+        if first_refusal:
+            logger.warning(f'Budget of {self.max_requests} requests spent, '
+                           f'refusing the next requests')
+        raise RequestBudgetExceeded(
+            f'Budget of {self.max_requests} requests spent')
+
+    def __repr__(self):
+        return '{} ({}/{} spent, {} refused)'.format(
+            self.__class__.__name__,
+            self.spent,
+            self.max_requests,
+            self.refused)
+
+
+class RequestBudgetAdapter(WrapperAdapter):
+    """Wraps the adapter of a host to spend one unit of `budget` per request
+    sent, and refuse to send it once the budget is spent.
+
+    It's the outermost adapter: a refused request doesn't wait for the rate
+    limiter, and the revalidations of the `ConditionalRequestAdapter` are
+    spent like any other request."""
+
+    layer = 2
+
+    def __init__(self, adapter: BaseAdapter, budget: RequestBudget):
+        super().__init__(adapter)
+        self.budget = budget
+
+    def send(self, request, **kwargs):
+        self.budget.spend()
+        return self.adapter.send(request, **kwargs)
+
+
+def install_request_budget(gl: Client,
+                           budget: RequestBudget) -> RequestBudget:
+    """Mounts a `RequestBudgetAdapter` for the host of `gl`, like
+    `install_validator_cache`. Several clients can share a budget."""
+    mount_adapter(gl, RequestBudgetAdapter(BaseAdapter(), budget))
+    return budget
+
+
+def until_budget_exceeded(
+        results: Iterable[T]) -> Generator[T, None, None]:
+    """Yields the results of a scan (e.g. `iterate_subprojects`) until the
+    request budget of its clients is spent, then stops instead of raising.
+    Check `RequestBudget.exhausted` to know if the results are partial.
+
+    Without it, `RequestBudgetExceeded` propagates, so that nothing is
+    stored from a partial scan (e.g. by `ReverseIndex.update_parent`)."""
+    try:
+        yield from results
+    except RequestBudgetExceeded:
+        return
+
+
+async def async_until_budget_exceeded(
+        results: AsyncIterable[T]) -> AsyncGenerator[T, None]:
+    """Same as `until_budget_exceeded` for `async_iterate_subprojects`."""
+    try:
+        async for result in results:
+            yield result
+    except RequestBudgetExceeded:
+        return
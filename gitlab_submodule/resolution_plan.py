@@ -0,0 +1,296 @@
+"""Chooses how to resolve the commit ids of a set of submodules with the
+fewest GitLab API requests, depending on how the submodules are laid out
+in the parent project."""
+import logging
+import threading
+from collections import defaultdict
+from math import ceil
+from posixpath import commonpath, dirname
+from typing import Dict, Iterable, List, Optional, Set
+
+from gitlab.client import Gitlab, GitlabList
+from gitlab.exceptions import GitlabGetError, GitlabHttpError
+from gitlab.v4.objects import Project
+
+logger = logging.getLogger(__name__)
+
+DIFF_STRATEGY = 'diff'
+TREE_STRATEGY = 'tree'
+RECURSIVE_TREE_STRATEGY = 'recursive_tree'
+AUTO_STRATEGY = 'auto'
+STRATEGIES = (DIFF_STRATEGY, TREE_STRATEGY, RECURSIVE_TREE_STRATEGY,
+              AUTO_STRATEGY)
+
+PER_PAGE = 100
+# HEAD request on the submodule path + last commit + first page of its diff
+# (the number of pages of the diff isn't known in advance)
+DIFF_REQUESTS_PER_PATH = 3
+# GitLab doesn't send the X-Total-Pages header beyond this number of records
+MAX_COUNTED_RECORDS = 10000
+
+
+class ResolutionPlan:
+    """Strategy chosen to resolve the commit ids of `paths`, with the
+    estimated number of requests of each strategy that was considered.
+
+    `execute()` resolves the commit ids and sets `actual_requests`, which
+    also counts the requests made while planning. With the `'diff'`
+    strategy nothing is resolved in advance: `get_submodule_commit` handles
+    each path later on, so `actual_requests` only counts the planning.
+    """
+
+    def __init__(self,
+                 project: Project,
+                 paths: List[str],
+                 ref: Optional[str],
+                 strategy: str,
+                 estimates: Dict[str, int]):
+        self.project = project
+        self.paths = paths
+        self.ref = ref
+        self.strategy = strategy
+        self.estimates = estimates
+        self.planning_requests = 0
+        self.actual_requests: Optional[int] = None
+        # first pages of the tree listings, fetched while planning (None
+        # if the directory doesn't exist)
+        self._trees: Dict[str, Optional[GitlabList]] = {}
+        self._recursive_tree: Optional[GitlabList] = None
+        # requests made while planning, per strategy
+        self._probe_requests: Dict[str, int] = {}
+
+    @property
+    def estimated_requests(self) -> int:
+        return self._estimate_with_probes(self.strategy)
+
+    def _estimate_with_probes(self, strategy: str) -> int:
+        """Requests of `strategy`, plus the ones made while planning to
+        estimate the other strategies."""
+        return self.estimates[strategy] + sum(
+            requests for probed, requests in self._probe_requests.items()
+            if probed != strategy)
+
+    def execute(self) -> Dict[str, str]:
+        with _RequestCounter(self.project.manager.gitlab) as counter:
+            if self.strategy == TREE_STRATEGY:
+                commit_ids = _get_submodule_commit_ids_from_tree(
+                    self.project, self.paths, self.ref, self._trees)
+            elif self.strategy == RECURSIVE_TREE_STRATEGY:
+                commit_ids = _get_submodule_commit_ids_from_recursive_tree(
+                    self.project, self.paths, self.ref, self._recursive_tree)
+            else:
+                commit_ids = {}
+        self.actual_requests = self.planning_requests + counter.count
+        logger.info(f'{self!r}: resolved {len(commit_ids)} of '
+                    f'{len(self.paths)} submodule commit ids')
+        return commit_ids
+
+    def __repr__(self):
+        return '{} ({}, estimated={}, actual={}, estimates={})'.format(
+            self.__class__.__name__,
+            repr(self.strategy),
+            self.estimated_requests,
+            self.actual_requests,
+            self.estimates)
+
+
+class _RequestCounter:
+    """Counts the responses received by the current thread through the
+    session of `gl`."""
+
+    def __init__(self, gl: Gitlab):
+        self.session = gl.session
+        self.count = 0
+        self._thread_id = threading.get_ident()
+
+    def _hook(self, response, *_, **__):
+        if threading.get_ident() == self._thread_id:
+            self.count += 1
+        return response
+
+    def __enter__(self) -> '_RequestCounter':
+        self.session.hooks['response'].append(self._hook)
+        return self
+
+    def __exit__(self, *_):
+        self.session.hooks['response'].remove(self._hook)
+
+
+def _group_by_directory(paths: Iterable[str]) -> Dict[str, Set[str]]:
+    paths_by_directory: Dict[str, Set[str]] = defaultdict(set)
+    for submodule_path in paths:
+        submodule_path = submodule_path.strip('/')
+        paths_by_directory[dirname(submodule_path)].add(submodule_path)
+    return paths_by_directory
+
+
+def plan_submodule_commit_ids(
+        project: Project,
+        submodule_paths: Iterable[str],
+        ref: Optional[str] = None,
+        strategy: str = AUTO_STRATEGY,
+) -> ResolutionPlan:
+    """Estimates the number of requests needed to resolve the commit ids of
+    `submodule_paths` with each strategy:
+    - `'diff'`: 3 requests per path, or more if the submodule isn't in the
+      first page of the diff of the last commit that updated it
+    - `'tree'`: the pages of the listing of each distinct parent directory
+    - `'recursive_tree'`: the pages of the recursive listing of the deepest
+      directory containing all the submodules
+
+    The number of pages of a listing is only known after fetching its first
+    page, which `execute()` then reuses. With the `'auto'` strategy, the
+    recursive listing is only probed if there are several directories, and
+    the directories are probed one by one until listing them is sure to
+    cost more than the other strategies. Then the cheapest one is chosen.
+
+    The listings stop as soon as all their submodules are found, so the
+    tree estimates are upper bounds, while the diff estimate counts a single
+    page per diff.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f'Unknown strategy "{strategy}", expected one of '
+                         f'{STRATEGIES}')
+    paths = [path.strip('/') for path in submodule_paths]
+    paths_by_directory = _group_by_directory(paths)
+    estimates = {DIFF_STRATEGY: DIFF_REQUESTS_PER_PATH * len(paths)}
+    plan = ResolutionPlan(project, paths, ref, strategy, estimates)
+    if not paths or strategy == DIFF_STRATEGY:
+        return plan
+
+    with _RequestCounter(project.manager.gitlab) as counter:
+        if strategy == RECURSIVE_TREE_STRATEGY or (
+                strategy == AUTO_STRATEGY and len(paths_by_directory) > 1):
+            try:
+                plan._recursive_tree = _list_recursive_tree(
+                    project, paths, ref)
+                estimates[RECURSIVE_TREE_STRATEGY] = _count_pages(
+                    plan._recursive_tree)
+            except (GitlabGetError, GitlabHttpError):
+                # the diff method handles all the paths
+                if strategy == RECURSIVE_TREE_STRATEGY:
+                    estimates[strategy] = 1
+            plan._probe_requests[RECURSIVE_TREE_STRATEGY] = 1
+        if strategy in (TREE_STRATEGY, AUTO_STRATEGY):
+            _probe_directories(plan, list(paths_by_directory))
+    plan.planning_requests = counter.count
+    if strategy == AUTO_STRATEGY:
+        plan.strategy = min(estimates, key=plan._estimate_with_probes)
+    return plan
+
+
+def _probe_directories(plan: ResolutionPlan, directories: List[str]) -> None:
+    """Fetches the first page of the listing of each directory to estimate
+    the `'tree'` strategy. With the `'auto'` strategy, stops as soon as it
+    costs more than another strategy, whatever the size of the remaining
+    directories."""
+    cheapest = min(plan.estimates.values())
+    pages = 0
+    for i, directory in enumerate(directories):
+        if plan.strategy == AUTO_STRATEGY \
+                and pages + len(directories) - i > cheapest:
+            break
+        try:
+            tree = _list_tree(plan.project, directory, plan.ref)
+            pages += _count_pages(tree)
+        except (GitlabGetError, GitlabHttpError):
+            # the directory doesn't exist: let the diff method handle it
+            tree = None
+            pages += 1
+        plan._trees[directory] = tree
+    else:
+        i = len(directories)
+    plan.estimates[TREE_STRATEGY] = pages + len(directories) - i
+    plan._probe_requests[TREE_STRATEGY] = len(plan._trees)
+
+
+def _list_tree(project: Project,
+               directory: str,
+               ref: Optional[str] = None) -> GitlabList:
+    """Lazy listing of `directory`; only the first page is fetched right
+    away."""
+    return project.repository_tree(
+        path=directory,
+        ref=ref if ref else project.default_branch,
+        iterator=True,
+        per_page=PER_PAGE)
+
+
+def _list_recursive_tree(project: Project,
+                         paths: List[str],
+                         ref: Optional[str] = None) -> GitlabList:
+    """Lazy listing of the deepest directory that contains all `paths`;
+    only the first page is fetched right away."""
+    root = commonpath([dirname(path) for path in paths])
+    return project.repository_tree(
+        path=root,
+        ref=ref if ref else project.default_branch,
+        recursive=True,
+        iterator=True,
+        per_page=PER_PAGE)
+
+
+def _count_pages(tree: GitlabList) -> int:
+    if tree.total_pages is not None:
+        return tree.total_pages
+    if tree.next_page is None:
+        return 1
+    return ceil(MAX_COUNTED_RECORDS / PER_PAGE) + 1
+
+
+def _get_submodule_commit_ids_from_tree(
+    project: Project,
+    submodule_paths: Iterable[str],
+    ref: Optional[str] = None,
+    trees: Optional[Dict[str, Optional[GitlabList]]] = None,
+) -> Dict[str, str]:
+    """The repository tree API lists submodules as gitlink entries
+    (`type: commit`) whose id is the commit sha the submodule points to.
+
+    Each directory listing stops as soon as all its paths are found.
+    `trees` are the listings already started while planning."""
+    trees = trees if trees is not None else {}
+    commit_ids = {}
+    for directory, paths in _group_by_directory(submodule_paths).items():
+        found = 0
+        try:
+            tree = trees[directory] if directory in trees \
+                else _list_tree(project, directory, ref)
+            if tree is None:
+                continue
+            for item in tree:
+                if item['type'] == 'commit' and item['path'] in paths:
+                    commit_ids[item['path']] = item['id']
+                    found += 1
+                    if found == len(paths):
+                        break
+        except (GitlabGetError, GitlabHttpError):
+            # the directory doesn't exist: let the diff method handle it
+            continue
+    return commit_ids
+
+
+def _get_submodule_commit_ids_from_recursive_tree(
+    project: Project,
+    submodule_paths: Iterable[str],
+    ref: Optional[str] = None,
+    tree: Optional[GitlabList] = None,
+) -> Dict[str, str]:
+    """Same as `_get_submodule_commit_ids_from_tree` with a single recursive
+    listing, which stops as soon as all the paths are found."""
+    paths = {path.strip('/') for path in submodule_paths}
+    commit_ids: Dict[str, str] = {}
+    if not paths:
+        return commit_ids
+    try:
+        if tree is None:
+            tree = _list_recursive_tree(project, list(paths), ref)
+        for item in tree:
+            if item['type'] == 'commit' and item['path'] in paths:
+                commit_ids[item['path']] = item['id']
+                if len(commit_ids) == len(paths):
+                    break
+    except (GitlabGetError, GitlabHttpError):
+        # let the diff method handle the paths not found so far
+        pass
+    return commit_ids
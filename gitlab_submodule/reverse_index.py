@@ -0,0 +1,200 @@
+import json
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from gitlab.v4.objects import Project
+
+from gitlab_submodule.concurrency_utils import map_concurrently
+from gitlab_submodule.gitlab_submodule import iterate_subprojects
+from gitlab_submodule.objects import Subproject
+from gitlab_submodule.project_manager_utils import (OneOrManyClients,
+                                                    get_project_key)
+from gitlab_submodule.read_gitmodules import get_ref_commit_id
+
+INDEX_FORMAT_VERSION = 1
+
+# (parent key, parent ref)
+ParentRef = Tuple[str, str]
+# (parent key, parent ref, submodule path)
+Pin = Tuple[str, str, str]
+
+
+def subproject_key(subproject: Subproject) -> str:
+    """Submodules not hosted on GitLab are identified by their url."""
+    if subproject.project is None:
+        return subproject.submodule.url
+    return get_project_key(subproject.project)
+
+
+class Dependent:
+    """A parent project that pins a subproject, at which path and commit."""
+
+    def __init__(self,
+                 parent: str,
+                 parent_ref: str,
+                 path: str,
+                 commit_id: Optional[str]):
+        self.parent = parent
+        self.parent_ref = parent_ref
+        self.path = path
+        self.commit_id = commit_id
+
+    def __eq__(self, other):
+        if not isinstance(other, Dependent):
+            return NotImplemented
+        return vars(self) == vars(other)
+
+    def __repr__(self):
+        return '{} ({}, {}, {}, {})'.format(
+            self.__class__.__name__,
+            repr(self.parent),
+            repr(self.parent_ref),
+            repr(self.path),
+            repr(self.commit_id))
+
+
+class ReverseIndex:
+    """Inverted index answering "which projects use this subproject, and at
+    which commit?" without any request.
+
+    It's filled by scanning parent projects with `iterate_subprojects`, and
+    each parent (at a given ref) can be re-scanned on its own. It can be
+    saved to and loaded from a JSON file.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # subproject key -> {(parent, parent ref, path): commit id}
+        self._dependents: Dict[str, Dict[Pin, Optional[str]]] = {}
+        # (parent, parent ref) -> parent commit id
+        self._parents: Dict[ParentRef, Optional[str]] = {}
+        # (parent, parent ref) -> {(subproject key, path)}
+        self._pins: Dict[ParentRef, Set[Tuple[str, str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._dependents)
+
+    @property
+    def parents(self) -> Dict[ParentRef, Optional[str]]:
+        """The indexed `(parent, ref)` and the parent commit they were read
+        at."""
+        with self._lock:
+            return dict(self._parents)
+
+    def dependents(self, subproject: Union[str, Project]) -> List[Dependent]:
+        key = subproject if isinstance(subproject, str) \
+            else get_project_key(subproject)
+        with self._lock:
+            pins = self._dependents.get(key) \
+                or self._dependents.get(key.lower(), {})
+            return [Dependent(parent, parent_ref, path, commit_id)
+                    for (parent, parent_ref, path), commit_id
+                    in pins.items()]
+
+    def set_parent(self,
+                   parent: str,
+                   parent_ref: str,
+                   subprojects: Iterable[Subproject],
+                   parent_commit_id: Optional[str] = None) -> None:
+        """Replaces the subprojects indexed for `parent` at `parent_ref`."""
+        subprojects = list(subprojects)
+        with self._lock:
+            self._remove_parent(parent, parent_ref)
+            self._parents[(parent, parent_ref)] = parent_commit_id
+            pins = self._pins[(parent, parent_ref)] = set()
+            for subproject in subprojects:
+                key = subproject_key(subproject)
+                path = subproject.submodule.path
+                commit_id = subproject.commit.id if subproject.commit \
+                    else None
+                self._dependents.setdefault(key, {})[
+                    (parent, parent_ref, path)] = commit_id
+                pins.add((key, path))
+
+    def remove_parent(self, parent: str, parent_ref: str) -> None:
+        with self._lock:
+            self._remove_parent(parent, parent_ref)
+
+    def _remove_parent(self, parent: str, parent_ref: str) -> None:
+        self._parents.pop((parent, parent_ref), None)
+        for key, path in self._pins.pop((parent, parent_ref), ()):
+            pins = self._dependents[key]
+            pins.pop((parent, parent_ref, path), None)
+            if not pins:
+                del self._dependents[key]
+
+    def update_parent(self,
+                      project: Project,
+                      gls: OneOrManyClients,
+                      ref: Optional[str] = None,
+                      **kwargs) -> None:
+        """(Re-)scans one parent project with `iterate_subprojects`, to which
+        `kwargs` are passed. Only commit ids are indexed, so `lazy_commits`
+        is enabled unless specified otherwise."""
+        kwargs.setdefault('lazy_commits', True)
+        kwargs.pop('pin_ref', None)
+        parent_ref = ref if ref else project.default_branch
+        parent_commit_id = get_ref_commit_id(project, ref)
+        if parent_commit_id is None:
+            # empty repository or missing ref: nothing to index
+            if parent_ref:
+                self.remove_parent(get_project_key(project), parent_ref)
+            return
+        subprojects = iterate_subprojects(
+            project, gls, parent_commit_id, **kwargs)
+        self.set_parent(get_project_key(project),
+                        parent_ref,
+                        subprojects,
+                        parent_commit_id)
+
+    def build(self,
+              projects: Iterable[Project],
+              gls: OneOrManyClients,
+              ref: Optional[str] = None,
+              max_workers: Optional[int] = None,
+              **kwargs) -> None:
+        """Scans several parent projects, in a thread pool if `max_workers`
+        is set."""
+        def update(project: Project) -> None:
+            self.update_parent(project, gls, ref, **kwargs)
+
+        if max_workers is None:
+            for project in projects:
+                update(project)
+        else:
+            for _ in map_concurrently(update, projects, max_workers):
+                pass
+
+    def save(self, path: str) -> None:
+        with self._lock:
+            data = {
+                'version': INDEX_FORMAT_VERSION,
+                'parents': [[parent, parent_ref, parent_commit_id]
+                            for (parent, parent_ref), parent_commit_id
+                            in self._parents.items()],
+                'dependents': {
+                    key: [[parent, parent_ref, path, commit_id]
+                          for (parent, parent_ref, path), commit_id
+                          in pins.items()]
+                    for key, pins in self._dependents.items()},
+            }
+        with open(path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: str) -> 'ReverseIndex':
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('version') != INDEX_FORMAT_VERSION:
+            raise ValueError(f'Unsupported index format version: '
+                             f'{data.get("version")}')
+        index = cls()
+        for parent, parent_ref, parent_commit_id in data['parents']:
+            index._parents[(parent, parent_ref)] = parent_commit_id
+            index._pins[(parent, parent_ref)] = set()
+        for key, pins in data['dependents'].items():
+            for parent, parent_ref, path, commit_id in pins:
+                index._dependents.setdefault(key, {})[
+                    (parent, parent_ref, path)] = commit_id
+                index._pins[(parent, parent_ref)].add((key, path))
+        return index
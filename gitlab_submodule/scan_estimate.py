@@ -0,0 +1,133 @@
+from math import ceil
+from typing import Dict, Optional, Set
+
+from gitlab.v4.objects import Project
+
+from gitlab_submodule.cache import ProjectCache, SubmoduleCache, is_commit_sha
+from gitlab_submodule.project_manager_utils import OneOrManyClients
+from gitlab_submodule.read_gitmodules import (get_ref_commit_id,
+                                              iterate_project_submodules)
+from gitlab_submodule.resolution_plan import (AUTO_STRATEGY,
+                                              DIFF_REQUESTS_PER_PATH,
+                                              DIFF_STRATEGY, STRATEGIES,
+                                              _RequestCounter,
+                                              plan_submodule_commit_ids)
+from gitlab_submodule.submodule_to_project import (
+    _project_key, get_host_resolver,
+    match_submodule_to_client_and_format_project_path)
+
+GRAPHQL_BATCH_SIZE = 50
+
+
+class ScanEstimate:
+    """Number of requests that `iterate_subprojects` should make with the
+    same parameters: `shared_requests` for the whole scan (ref, .gitmodules,
+    bulk commit ids, GraphQL batches) plus `submodule_requests` for each
+    submodule path. `spent_requests` were made by the estimate itself.
+
+    Submodules linking to repos that don't exist are counted as if they
+    did, but with the `'diff'` strategy (or its fallback) only the first
+    page of each diff is counted: a submodule last updated by a commit
+    touching many files costs more, so it's not an upper bound."""
+
+    def __init__(self,
+                 strategy: str,
+                 shared_requests: int,
+                 submodule_requests: Dict[str, int],
+                 spent_requests: int):
+        self.strategy = strategy
+        self.shared_requests = shared_requests
+        self.submodule_requests = submodule_requests
+        self.spent_requests = spent_requests
+
+    @property
+    def requests(self) -> int:
+        return self.shared_requests + sum(self.submodule_requests.values())
+
+    def __repr__(self):
+        return '{} ({}, {} requests, {} submodules)'.format(
+            self.__class__.__name__,
+            repr(self.strategy),
+            self.requests,
+            len(self.submodule_requests))
+
+
+def estimate_subprojects(
+        project: Project,
+        gls: OneOrManyClients,
+        ref: Optional[str] = None,
+        strategy: str = AUTO_STRATEGY,
+        use_graphql: bool = False,
+        cache: Optional[SubmoduleCache] = None,
+        project_cache: Optional[ProjectCache] = None,
+        lazy_commits: bool = False,
+        pin_ref: bool = True,
+) -> ScanEstimate:
+    """Dry run of `iterate_subprojects`: only reads .gitmodules (and the
+    first page of the tree listings needed to estimate the strategy, see
+    `plan_submodule_commit_ids`), then estimates the requests per
+    submodule without resolving any project or commit.
+
+    Pass the same `cache` to the scan to reuse the .gitmodules read here."""
+    if strategy not in STRATEGIES:
+        raise ValueError(f'Unknown strategy "{strategy}", expected one of '
+                         f'{STRATEGIES}')
+    gls = get_host_resolver(gls)
+    ref = ref if ref else project.default_branch
+    shared_requests = 0
+    with _RequestCounter(project.manager.gitlab) as counter:
+        parent_commit_id = None
+        if pin_ref:
+            parent_commit_id = get_ref_commit_id(project, ref)
+            shared_requests += bool(ref) and not is_commit_sha(ref)
+            if parent_commit_id is None:
+                # the scan stops there
+                return ScanEstimate(
+                    strategy, shared_requests, {}, counter.count)
+        read_ref = parent_commit_id or ref
+        if not cache or cache.get_gitmodules(project, read_ref) is None:
+            shared_requests += 1
+        submodules = list(iterate_project_submodules(
+            project, ref, cache, parent_commit_id))
+
+        paths = [submodule.path.strip('/') for submodule in submodules]
+        cached_paths = {
+            path for path in paths
+            if cache and cache.get_commit_id(project, read_ref, path)}
+        missing_paths = [path for path in paths if path not in cached_paths]
+        bulk_paths = set()
+        if missing_paths and strategy != DIFF_STRATEGY:
+            plan = plan_submodule_commit_ids(
+                project, missing_paths, read_ref, strategy)
+            strategy = plan.strategy
+            if strategy != DIFF_STRATEGY:
+                bulk_paths = set(missing_paths)
+            # the scan plans again the same way, and reuses the pages
+            # fetched while planning
+            shared_requests += plan.estimated_requests
+
+    graphql_paths: Dict[str, Set[str]] = {}
+    submodule_requests = {}
+    for submodule, path in zip(submodules, paths):
+        requests = 0
+        if path not in cached_paths and path not in bulk_paths:
+            requests += DIFF_REQUESTS_PER_PATH
+        match = match_submodule_to_client_and_format_project_path(
+            submodule=submodule,
+            gls=gls
+        )
+        if match:
+            key = _project_key(*match)
+            if use_graphql:
+                graphql_paths.setdefault(key[0], set()).add(key[1])
+            elif project_cache is None \
+                    or (project_cache.peek(key) is None
+                        and not project_cache.is_not_found(key)):
+                requests += 1
+            if not lazy_commits:
+                requests += 1
+        submodule_requests[path] = requests
+    shared_requests += sum(ceil(len(host_paths) / GRAPHQL_BATCH_SIZE)
+                           for host_paths in graphql_paths.values())
+    return ScanEstimate(
+        strategy, shared_requests, submodule_requests, counter.count)
@@ -1,35 +1,135 @@
 import logging
 import re
 from os import path
-from typing import Optional, Union
+from typing import Callable, Dict, Iterable, Optional, Union
 
 from gitlab.exceptions import GitlabGetError, GitlabHttpError
 from gitlab.v4.objects import Project, ProjectCommit
 
-from gitlab_submodule.objects import Commit, Submodule
+from gitlab_submodule.cache import SubmoduleCache
+from gitlab_submodule.instrumentation import (COMMIT_DIFF_STAGE,
+                                              COMMIT_FETCH_STAGE,
+                                              COMMIT_IDS_STAGE, stage)
+from gitlab_submodule.objects import Commit, LazyCommit, Submodule
+from gitlab_submodule.project_manager_utils import get_file_headers
+from gitlab_submodule.resolution_plan import (AUTO_STRATEGY, DIFF_STRATEGY,
+                                              STRATEGIES, ResolutionPlan,
+                                              plan_submodule_commit_ids)
 
 logger = logging.getLogger(__name__)
 
+SUBMODULE_COMMIT_REGEX = r'Subproject commit ([a-zA-Z0-9]+)\n'
 
+
+@stage(COMMIT_FETCH_STAGE)
 def get_submodule_commit(
         submodule: Submodule,
         submodule_project: Optional[Project] = None,
+        commit_id: Optional[str] = None,
+        cache: Optional[SubmoduleCache] = None,
+        lazy: bool = False,
  ) -> Optional[Union[ProjectCommit, Commit]]:
-    commit_id = _get_submodule_commit_id(
-        submodule.parent_project,
-        submodule.path,
-        submodule.parent_ref,
-    )
+    """`commit_id` can be passed if it was already found (e.g. with
+    `get_submodule_commit_ids`), otherwise it's read from the diff of the
+    last commit that updated the submodule.
+
+    If `lazy` is True, a `LazyCommit` is returned instead of fetching the
+    full `ProjectCommit` from `submodule_project`."""
+    if commit_id is None and cache:
+        commit_id = cache.get_commit_id(submodule.parent_project,
+                                        submodule.parent_pinned_ref,
+                                        submodule.path)
+    if commit_id is None:
+        commit_id = _get_submodule_commit_id(
+            submodule.parent_project,
+            submodule.path,
+            submodule.parent_pinned_ref,
+        )
+        if commit_id is not None and cache:
+            cache.set_commit_id(submodule.parent_project,
+                                submodule.parent_pinned_ref,
+                                submodule.path,
+                                commit_id)
     if commit_id is None:
         return None
 
-    if submodule_project is not None:
+    if submodule_project is not None and lazy:
+        commit = LazyCommit(submodule_project, commit_id)
+    elif submodule_project is not None:
         commit = submodule_project.commits.get(commit_id)
     else:
         commit = Commit(commit_id)
     return commit
 
 
+@stage(COMMIT_IDS_STAGE)
+def get_submodule_commit_ids(
+        project: Project,
+        submodule_paths: Iterable[str],
+        ref: Optional[str] = None,
+        strategy: str = AUTO_STRATEGY,
+        cache: Optional[SubmoduleCache] = None,
+        on_plan: Optional[Callable[[ResolutionPlan], None]] = None,
+) -> Dict[str, str]:
+    """Finds in bulk the commit ids of the submodules of `project`.
+
+    With the `'tree'` strategy, each distinct parent directory of the
+    submodules is listed once with the repository tree API, and with the
+    `'recursive_tree'` strategy the directory containing all of them is
+    listed recursively. With the `'diff'` strategy, nothing is resolved in
+    advance. The default `'auto'` strategy picks the one that should need
+    the fewest requests (see `plan_submodule_commit_ids`). In all cases the
+    commit ids found in `cache` are reused.
+
+    Paths that couldn't be resolved are missing from the returned dict:
+    `get_submodule_commit` then falls back to the diff parsing method.
+
+    `on_plan` is called with the executed `ResolutionPlan`, if any, e.g. to
+    compare its estimated and actual requests.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f'Unknown strategy "{strategy}", expected one of '
+                         f'{STRATEGIES}')
+    submodule_paths = [path.strip('/') for path in submodule_paths]
+    commit_ids = {}
+    if cache:
+        for submodule_path in submodule_paths:
+            commit_id = cache.get_commit_id(project, ref, submodule_path)
+            if commit_id is not None:
+                commit_ids[submodule_path] = commit_id
+    missing_paths = [path for path in submodule_paths
+                     if path not in commit_ids]
+    if strategy == DIFF_STRATEGY or not missing_paths:
+        return commit_ids
+
+    plan = plan_submodule_commit_ids(project, missing_paths, ref, strategy)
+    found_commit_ids = plan.execute()
+    if on_plan is not None:
+        on_plan(plan)
+    if cache:
+        for submodule_path, commit_id in found_commit_ids.items():
+            cache.set_commit_id(project, ref, submodule_path, commit_id)
+    commit_ids.update(found_commit_ids)
+    return commit_ids
+
+
+def parse_submodule_commit_id(diff: str) -> Optional[str]:
+    """Reads the commit sha that a submodule points to after a change, from
+    the diff of its path."""
+    # either the commit id was added for the first time,
+    # or it was updated -> we can find one or two matches
+    # (or 0 in these weird cases)
+    matches = re.findall(SUBMODULE_COMMIT_REGEX, diff)
+    # submodule commit id was updated
+    if len(matches) == 2:
+        return matches[1]
+    # submodule was added
+    if len(matches) == 1:
+        return matches[0]
+    return None
+
+
+@stage(COMMIT_DIFF_STAGE)
 def _get_submodule_commit_id(
     project: Project,
     submodule_path: str,
@@ -40,40 +140,34 @@ def _get_submodule_commit_id(
       submodules points to.
     - Accessing the `<submodule_path>` dir via the ProjectFileManager
       doesn't bring any useful info, EXCEPT: the id of the last commit that
-      modified the file (i.e. that updated the submodule commit sha)
+      modified the file (i.e. that updated the submodule commit sha), which
+      is also sent in the headers so a HEAD request is enough
 
     => We use that info to get the diff of the last commit that updated the
        submodule commit
     => We parse the diff to get the new submodule commit sha
     """
     try:
-        submodule_dir = project.files.get(
+        last_commit_id = get_file_headers(
+            project,
             submodule_path,
-            ref=ref if ref else project.default_branch)
+            ref=ref if ref else project.default_branch,
+        )['X-Gitlab-Last-Commit-Id']
     except (GitlabGetError, GitlabHttpError):
         raise FileNotFoundError(
            f'Local submodule path "{submodule_path}" was not found for '
            f'project at url "{project.web_url}" - check if your .gitmodules '
            f'file is up-to-date.')
 
-    last_commit_id = submodule_dir.last_commit_id
     update_submodule_commit = project.commits.get(last_commit_id)
 
-    submodule_commit_regex = r'Subproject commit ([a-zA-Z0-9]+)\n'
     n_files_in_diff = 0
     for diff_file in update_submodule_commit.diff(iterator=True):
         n_files_in_diff += 1
         if diff_file['new_path'] == submodule_path:
-            # either the commit id was added for the first time,
-            # or it was updated -> we can find one or two matches
-            # (or 0 in these weird cases)
-            matches = re.findall(submodule_commit_regex, diff_file['diff'])
-            # submodule commit id was updated
-            if len(matches) == 2:
-                return matches[1]
-            # submodule was added
-            if len(matches) == 1:
-                return matches[0]
+            commit_id = parse_submodule_commit_id(diff_file['diff'])
+            if commit_id is not None:
+                return commit_id
 
     logger.warning(
         f'Could not retrieve commit id for submodule at '
@@ -1,32 +1,157 @@
 import logging
 import re
 from posixpath import join, normpath
-from typing import Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
-from gitlab.exceptions import GitlabGetError, GitlabHttpError
+from gitlab.exceptions import GitlabError, GitlabGetError, GitlabHttpError
 from gitlab.v4.objects import Project, ProjectManager
 from giturlparse import GitUrlParsed, parse
 
-from gitlab_submodule.objects import Submodule
+from gitlab_submodule.cache import NOT_FOUND, NOT_GITLAB, ProjectCache
+from gitlab_submodule.instrumentation import PROJECT_LOOKUP_STAGE, stage
+from gitlab_submodule.objects import LazyProject, Submodule
 from gitlab_submodule.project_manager_utils import (OneOrManyClients,
+                                                    get_host_url,
                                                     map_domain_to_clients)
 from gitlab_submodule.string_utils import lstrip, rstrip
 
 logger = logging.getLogger(__name__)
 
+# (host url, lowercase path_with_namespace) -> Project
+ProjectsByPath = Dict[Tuple[str, str], Project]
+
+GRAPHQL_PROJECTS_QUERY = '''
+query($fullPaths: [String!], $after: String) {
+  projects(fullPaths: $fullPaths, first: 100, after: $after) {
+    pageInfo { hasNextPage endCursor }
+    nodes {
+      id fullPath name path webUrl sshUrlToRepo httpUrlToRepo
+      repository { rootRef }
+    }
+  }
+}
+'''
+
 
 def host_url_to_domain(url: str) -> str:
     return url.split("//")[1].rstrip("/")
 
 
+def _is_relative_url(url: str) -> bool:
+    return url.startswith('./') or url.startswith('../')
+
+
+# common url forms parsed without giturlparse: `git@host:path[.git]` and
+# `http[s]://host/path[.git]`, without port, user info or empty segment
+_PATH_REGEX = r'([\w-][\w.-]*(?:/[\w-][\w.-]*)*)'
+_SCP_URL_REGEX = re.compile(r'[\w.-]+@([\w.-]+):' + _PATH_REGEX)
+_HTTPS_URL_REGEX = re.compile(r'https?://([\w.-]+)/' + _PATH_REGEX)
+
+
+class HostResolver:
+    """Matches absolute submodule urls to the GitLab client of their host,
+    with a lookup table of the client domains built once, e.g. for a whole
+    scan. The common url forms are parsed without `giturlparse`, and the
+    result of each url is remembered."""
+
+    def __init__(self, gls: OneOrManyClients):
+        self.domain_to_client = {
+            host_url_to_domain(url): client
+            for url, client in map_domain_to_clients(gls).items()
+        }
+        # host -> domains (`host`, `host:port` or `host/relative_url_root`)
+        self._domains_by_host: Dict[str, List[str]] = {}
+        for domain in self.domain_to_client:
+            host = re.split('[:/]', domain, maxsplit=1)[0]
+            self._domains_by_host.setdefault(host, []).append(domain)
+        self._domain_patterns = [
+            (domain, re.compile('(^|[/@])' + domain))
+            for domain in self.domain_to_client]
+        self._matches: Dict[str, Optional[Tuple[ProjectManager, str]]] = {}
+
+    def resolve(self, url: str) -> Optional[Tuple[ProjectManager, str]]:
+        """(client, path_with_namespace) of an absolute url, or None if it's
+        not hosted on one of the GitLab clients or isn't valid."""
+        try:
+            return self._matches[url]
+        except KeyError:
+            pass
+        match = (_SCP_URL_REGEX.fullmatch(url)
+                 or _HTTPS_URL_REGEX.fullmatch(url))
+        path = match.group(2) if match else None
+        if path:
+            path = rstrip(path, '.git')
+        if path and not path.endswith('.git'):
+            result = self._resolve_host_and_path(url, match.group(1), path)
+        else:
+            result = self._resolve_with_giturlparse(url)
+        self._matches[url] = result
+        return result
+
+    def _resolve_host_and_path(
+            self,
+            url: str,
+            host: str,
+            path: str) -> Optional[Tuple[ProjectManager, str]]:
+        https_url = f'{host}/{path}'
+        matched_domains = [
+            domain for domain in self._domains_by_host.get(host, [])
+            if https_url.startswith(domain + '/')]
+        matched_domain = self._single_domain(url, matched_domains)
+        if matched_domain is None:
+            return None
+        return (self.domain_to_client[matched_domain],
+                https_url[len(matched_domain) + 1:])
+
+    def _resolve_with_giturlparse(
+            self, url: str) -> Optional[Tuple[ProjectManager, str]]:
+        parsed: GitUrlParsed = parse(url)
+        if not parsed.valid:
+            logger.warning(
+                f'submodule git url does not seem to be valid: {url}')
+            return None
+        matched_domain = self._single_domain(url, [
+            domain for domain, pattern in self._domain_patterns
+            if pattern.search(url)])
+        if matched_domain is None:
+            return None
+        # Format to python-gitlab path_with_namespace:
+        # rewrite to https format then split by host and keep & cut the right
+        # part. I find it more robust than trying to rebuild the path from the
+        # different attributes of giturlparse.GitUrlParsed objects
+        https_url = parsed.url2https
+        path_with_namespace = https_url.split(matched_domain)[1]
+        path_with_namespace = lstrip(path_with_namespace, '/')
+        path_with_namespace = rstrip(path_with_namespace, '.git')
+        return self.domain_to_client[matched_domain], path_with_namespace
+
+    @staticmethod
+    def _single_domain(url: str, matched_domains: List[str]) -> Optional[str]:
+        if len(matched_domains) == 0:
+            logger.warning(f'submodule git url is not hosted on gitlab: {url}')
+            return None
+        elif len(matched_domains) > 1:
+            raise ValueError(f"More than one of the provided Gitlab host "
+                             f"domains matches submodule url {url}")
+        return matched_domains[0]
+
+
+# clients, or a resolver built from them
+ClientsOrResolver = Union[OneOrManyClients, HostResolver]
+
+
+def get_host_resolver(gls: ClientsOrResolver) -> HostResolver:
+    return gls if isinstance(gls, HostResolver) else HostResolver(gls)
+
+
 def match_submodule_to_client_and_format_project_path(
         submodule: Submodule,
-        gls: OneOrManyClients
+        gls: ClientsOrResolver
 ) -> Optional[Tuple[ProjectManager, str]]:
     url = submodule.url
 
     # check if the submodule url is a relative path to the project path
-    if url.startswith('./') or url.startswith('../'):
+    if _is_relative_url(url):
         # we build the path of the submodule project using the path of
         # the current project
         url = rstrip(url, '.git')
@@ -37,57 +162,161 @@ def match_submodule_to_client_and_format_project_path(
         client: ProjectManager = submodule.parent_project.manager
         return client, path_with_namespace
 
-    # If URL is not relative: try parsing it
-    parsed: GitUrlParsed = parse(url)
-    if not parsed.valid:
-        logger.warning(f'submodule git url does not seem to be valid: {url}')
-        return None
+    return get_host_resolver(gls).resolve(url)
 
-    url_to_client = map_domain_to_clients(gls)
-    domain_to_client = {
-        host_url_to_domain(_url): client
-        for _url, client in url_to_client.items()
-    }
 
-    matched_domain = [
-        domain for domain in domain_to_client
-        if re.search("(^|[/@])" + domain, url)
-    ]
-    if len(matched_domain) == 0:
-        logger.warning(f'submodule git url is not hosted on gitlab: {url}')
-        return None
-    elif len(matched_domain) > 1:
-        raise ValueError(f"More than one of the provided Gitlab host domains "
-                         f"matches submodule url {url}")
-    else:
-        matched_domain = matched_domain[0]
-    client = domain_to_client[matched_domain]
-
-    # Format to python-gitlab path_with_namespace:
-    # rewrite to https format then split by host and keep & cut the right part.
-    # I find it more robust than trying to rebuild the path from the different
-    # attributes of giturlparse.GitUrlParsed objects
-    https_url = parsed.url2https
-    path_with_namespace = https_url.split(matched_domain)[1]
-    path_with_namespace = lstrip(path_with_namespace, '/')
-    path_with_namespace = rstrip(path_with_namespace, '.git')
-    return client, path_with_namespace
+def _project_key(client: ProjectManager,
+                 path_with_namespace: str) -> Tuple[str, str]:
+    # GitLab paths are case-insensitive
+    return get_host_url(client), path_with_namespace.lower()
+
+
+def _graphql_node_to_project(client: ProjectManager, node: dict) -> Project:
+    return LazyProject(client, {
+        'id': int(node['id'].split('/')[-1]),
+        'name': node['name'],
+        'path': node['path'],
+        'path_with_namespace': node['fullPath'],
+        'web_url': node['webUrl'],
+        'ssh_url_to_repo': node['sshUrlToRepo'],
+        'http_url_to_repo': node['httpUrlToRepo'],
+        'default_branch': (node.get('repository') or {}).get('rootRef'),
+    })
+
+
+@stage(PROJECT_LOOKUP_STAGE)
+def _get_projects_with_graphql(
+        client: ProjectManager,
+        paths_with_namespace: List[str],
+) -> List[Project]:
+    projects = []
+    after = None
+    while True:
+        result = client.gitlab.http_post(
+            f'{get_host_url(client)}/api/graphql',
+            post_data={'query': GRAPHQL_PROJECTS_QUERY,
+                       'variables': {'fullPaths': paths_with_namespace,
+                                     'after': after}})
+        if result.get('errors'):
+            raise GitlabError(result['errors'])
+        page = result['data']['projects']
+        projects += [_graphql_node_to_project(client, node)
+                     for node in page['nodes']]
+        if not page['pageInfo']['hasNextPage']:
+            return projects
+        after = page['pageInfo']['endCursor']
+
+
+def get_projects_by_path(
+        submodules: Iterable[Submodule],
+        gls: ClientsOrResolver,
+        batch_size: int = 50,
+) -> ProjectsByPath:
+    """Fetches the GitLab projects of several submodules at once, with one
+    GraphQL `projects(fullPaths: ...)` query per host and per batch of
+    `batch_size` paths.
+
+    The returned projects are `LazyProject` objects: they only have the
+    attributes requested in `GRAPHQL_PROJECTS_QUERY` until another one is
+    accessed, which fetches the full project. The paths that GraphQL
+    couldn't resolve are missing from the result: pass it to
+    `submodule_to_project` to fall back to the REST API for those.
+    """
+    gls = get_host_resolver(gls)
+    clients: Dict[str, ProjectManager] = {}
+    paths_by_host: Dict[str, List[str]] = {}
+    for submodule in submodules:
+        match = match_submodule_to_client_and_format_project_path(
+            submodule=submodule,
+            gls=gls
+        )
+        if not match:
+            continue
+        client, path_with_namespace = match
+        host, _ = _project_key(client, path_with_namespace)
+        clients.setdefault(host, client)
+        host_paths = paths_by_host.setdefault(host, [])
+        if path_with_namespace not in host_paths:
+            host_paths.append(path_with_namespace)
+
+    projects: ProjectsByPath = {}
+    for host, paths in paths_by_host.items():
+        client = clients[host]
+        for start in range(0, len(paths), batch_size):
+            batch = paths[start:start + batch_size]
+            try:
+                batch_projects = _get_projects_with_graphql(client, batch)
+            except GitlabError as e:
+                logger.warning(f'GraphQL projects lookup failed on {host}, '
+                               f'falling back to the REST API: {e}')
+                continue
+            projects.update(
+                (_project_key(client, project.path_with_namespace), project)
+                for project in batch_projects)
+    return projects
+
+
+def submodules_to_projects(
+        submodules: Iterable[Submodule],
+        gls: ClientsOrResolver,
+        batch_size: int = 50,
+) -> List[Optional[Project]]:
+    """Same as calling `submodule_to_project` on each submodule, but using
+    batched GraphQL lookups (see `get_projects_by_path`)."""
+    submodules = list(submodules)
+    gls = get_host_resolver(gls)
+    projects = get_projects_by_path(submodules, gls, batch_size)
+    return [submodule_to_project(submodule, gls, projects)
+            for submodule in submodules]
 
 
+@stage(PROJECT_LOOKUP_STAGE)
 def submodule_to_project(
         submodule: Submodule,
-        gls: OneOrManyClients,
+        gls: ClientsOrResolver,
+        projects: Optional[ProjectsByPath] = None,
+        project_cache: Optional[ProjectCache] = None,
 ) -> Optional[Project]:
-    match = match_submodule_to_client_and_format_project_path(
-        submodule=submodule,
-        gls=gls
-    )
-    if not match:
+    """`projects` can contain already fetched projects, e.g. with
+    `get_projects_by_path`. `project_cache` remembers the results between
+    calls, including repos that don't exist or are not hosted on GitLab. It
+    must always be used with the same GitLab clients."""
+    # matches of absolute urls don't depend on the parent project
+    cache_match = project_cache is not None \
+        and not _is_relative_url(submodule.url)
+    match = project_cache.get_match(submodule.url) if cache_match else None
+    if match is None:
+        match = match_submodule_to_client_and_format_project_path(
+            submodule=submodule,
+            gls=gls
+        ) or NOT_GITLAB
+        if cache_match:
+            project_cache.set_match(submodule.url, match)
+    if match is NOT_GITLAB:
         return None
-    try:
-        client, submodule_project_path_with_namespace = match
-        submodule_project = client.get(submodule_project_path_with_namespace)
-    except (GitlabGetError, GitlabHttpError):
+    client, submodule_project_path_with_namespace = match
+    key = _project_key(client, submodule_project_path_with_namespace)
+    submodule_project = projects.get(key) if projects else None
+    cached = False
+    if submodule_project is None and project_cache is not None:
+        if project_cache.is_not_found(key):
+            submodule_project = NOT_FOUND
+        else:
+            submodule_project = project_cache.get(key)
+        cached = submodule_project is not None
+    if submodule_project is None:
+        try:
+            submodule_project = client.get(
+                submodule_project_path_with_namespace)
+        except (GitlabGetError, GitlabHttpError):
+            submodule_project = NOT_FOUND
+    # storing a cached entry again would keep it from ever expiring
+    if project_cache is not None and not cached:
+        if submodule_project is NOT_FOUND:
+            project_cache.set_not_found(key)
+        else:
+            project_cache.set(key, submodule_project)
+    if submodule_project is NOT_FOUND:
         # Repo doesn't actually exist (possible because you can modify
         # .gitmodules without using `git submodule add`)
         raise FileNotFoundError(
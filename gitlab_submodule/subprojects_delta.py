@@ -0,0 +1,166 @@
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+
+from gitlab.v4.objects import Project
+
+from gitlab_submodule.cache import ProjectCache, SubmoduleCache
+from gitlab_submodule.gitlab_submodule import (
+    _submodule_to_subproject_or_none, iterate_submodules, iterate_subprojects)
+from gitlab_submodule.instrumentation import COMPARE_STAGE, stage
+from gitlab_submodule.objects import Submodule, Subproject
+from gitlab_submodule.project_manager_utils import OneOrManyClients
+from gitlab_submodule.read_gitmodules import get_ref_commit_id
+from gitlab_submodule.resolution_plan import AUTO_STRATEGY
+from gitlab_submodule.submodule_commit import (get_submodule_commit,
+                                               get_submodule_commit_ids,
+                                               parse_submodule_commit_id)
+from gitlab_submodule.submodule_to_project import get_host_resolver
+
+logger = logging.getLogger(__name__)
+
+# beyond this number of files, the compare diff may have been truncated
+MAX_COMPARE_DIFFS = 1000
+
+
+def update_subprojects(
+        project: Project,
+        gls: OneOrManyClients,
+        previous_subprojects: Iterable[Subproject],
+        ref: Optional[str] = None,
+        only_gitlab_subprojects: bool = False,
+        previous_commit_id: Optional[str] = None,
+        strategy: str = AUTO_STRATEGY,
+        cache: Optional[SubmoduleCache] = None,
+        project_cache: Optional[ProjectCache] = None,
+        lazy_commits: bool = False,
+        commit_id: Optional[str] = None,
+) -> List[Subproject]:
+    """Same result as `iterate_subprojects(project, gls, ref)`, computed from
+    the subprojects previously found at another commit of `project`.
+
+    The two commits are compared with a single request: the .gitmodules file
+    is only read again if it changed, and only the submodules whose path
+    changed are resolved again (their new commit sha is usually read from
+    the compare diff). The other subprojects are carried over.
+
+    `previous_commit_id` defaults to the `parent_commit_id` of the previous
+    subprojects. If it's unknown, or if the compare is too large to be
+    trusted, a full scan is made instead.
+
+    `commit_id` is the commit that `ref` points to, if it's already known
+    (e.g. from a push event): the subprojects are then read at this commit
+    even if the branch moved since, and keep `ref` as `parent_ref`.
+    """
+    gls = get_host_resolver(gls)
+    previous_subprojects = list(previous_subprojects)
+    if previous_commit_id is None and previous_subprojects:
+        previous_commit_id = \
+            previous_subprojects[0].submodule.parent_commit_id
+    kwargs = dict(only_gitlab_subprojects=only_gitlab_subprojects,
+                  strategy=strategy, cache=cache,
+                  project_cache=project_cache, lazy_commits=lazy_commits)
+    ref = ref if ref else project.default_branch
+
+    def scan() -> List[Subproject]:
+        if commit_id is None:
+            return list(iterate_subprojects(project, gls, ref, **kwargs))
+        return _move_to_commit(
+            iterate_subprojects(project, gls, commit_id, **kwargs),
+            ref,
+            commit_id)
+
+    if previous_commit_id is None:
+        return scan()
+
+    if commit_id is None:
+        commit_id = get_ref_commit_id(project, ref)
+    if commit_id is None:
+        # the branch was deleted, or the repository emptied
+        return []
+    if commit_id == previous_commit_id:
+        return previous_subprojects
+
+    with stage(COMPARE_STAGE):
+        compare = project.repository_compare(previous_commit_id, commit_id)
+    diffs = compare.get('diffs') or []
+    if compare.get('compare_timeout') or len(diffs) >= MAX_COMPARE_DIFFS:
+        logger.warning(f'Compare of {previous_commit_id}...{commit_id} may '
+                       f'be incomplete, scanning all the submodules again')
+        return scan()
+
+    changed_paths: Set[str] = set()
+    # new commit ids of the submodules updated between the 2 commits
+    changed_commit_ids: Dict[str, str] = {}
+    for diff_file in diffs:
+        changed_paths.update((diff_file['old_path'], diff_file['new_path']))
+        submodule_commit_id = None if diff_file.get('deleted_file') \
+            else parse_submodule_commit_id(diff_file['diff'])
+        if submodule_commit_id is not None:
+            changed_commit_ids[diff_file['new_path']] = submodule_commit_id
+
+    previous_by_path = {subproject.submodule.path.strip('/'): subproject
+                        for subproject in previous_subprojects}
+    if '.gitmodules' in changed_paths \
+            or not set(changed_commit_ids) <= set(previous_by_path):
+        submodules = list(iterate_submodules(project, ref, cache, commit_id))
+    else:
+        submodules = [_move_submodule_to_commit(subproject.submodule, ref,
+                                                commit_id)
+                      for subproject in previous_subprojects]
+
+    unknown_paths = [
+        submodule.path.strip('/') for submodule in submodules
+        if submodule.path.strip('/') not in changed_commit_ids
+        and (submodule.path.strip('/') in changed_paths
+             or submodule.path.strip('/') not in previous_by_path)]
+    commit_ids = dict(changed_commit_ids)
+    if unknown_paths:
+        commit_ids.update(get_submodule_commit_ids(
+            project, unknown_paths, commit_id, strategy, cache))
+
+    subprojects = []
+    for submodule in submodules:
+        path = submodule.path.strip('/')
+        previous = previous_by_path.get(path)
+        if previous is None or previous.submodule.url != submodule.url:
+            subproject = _submodule_to_subproject_or_none(
+                submodule, commit_ids, gls=gls, cache=cache,
+                project_cache=project_cache, lazy_commits=lazy_commits)
+        elif path in changed_paths:
+            try:
+                subproject = Subproject(
+                    submodule,
+                    previous.project,
+                    get_submodule_commit(submodule, previous.project,
+                                         commit_ids.get(path), cache,
+                                         lazy_commits))
+            except FileNotFoundError:
+                subproject = None
+        else:
+            subproject = Subproject(submodule,
+                                    previous.project,
+                                    previous.commit)
+        if subproject is None:
+            continue
+        if not (only_gitlab_subprojects and not subproject.project):
+            subprojects.append(subproject)
+    return subprojects
+
+
+def _move_submodule_to_commit(submodule: Submodule,
+                              ref: str,
+                              commit_id: str) -> Submodule:
+    return Submodule(**dict(dict(submodule),
+                            parent_ref=ref,
+                            parent_commit_id=commit_id))
+
+
+def _move_to_commit(subprojects: Iterable[Subproject],
+                    ref: str,
+                    commit_id: str) -> List[Subproject]:
+    """The same subprojects, read from `ref` at `commit_id`."""
+    return [Subproject(_move_submodule_to_commit(subproject.submodule, ref,
+                                                 commit_id),
+                       subproject.project,
+                       subproject.commit)
+            for subproject in subprojects]
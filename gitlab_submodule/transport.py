@@ -0,0 +1,71 @@
+import threading
+from typing import Dict, List, Optional
+
+from requests.adapters import HTTPAdapter
+
+from gitlab_submodule.adapters import mount_adapter
+from gitlab_submodule.project_manager_utils import (OneOrManyClients,
+                                                    get_host_url)
+from gitlab_submodule.rate_limit import RateLimitedAdapter, RateLimiter
+
+
+class TransportManager:
+    """One keep-alive connection pool per GitLab host, sized to the number of
+    threads scanning it.
+
+    The same pool is mounted on the sessions of all the clients of a host,
+    so `max_connections` bounds the connections opened to that host as a
+    whole: with `block=True` a thread waits for a free connection instead
+    of opening (and then discarding) an extra one. With `rate_limit=True`
+    the requests of each host also go through a shared `RateLimiter`.
+    """
+
+    def __init__(self,
+                 max_connections: int = 10,
+                 block: bool = True,
+                 rate_limit: bool = False):
+        self.max_connections = max_connections
+        self.block = block
+        self.rate_limit = rate_limit
+        self._lock = threading.Lock()
+        self._adapters: Dict[str, HTTPAdapter] = {}
+        self._limiters: Dict[str, RateLimiter] = {}
+
+    @property
+    def hosts(self) -> List[str]:
+        with self._lock:
+            return list(self._adapters)
+
+    def get_adapter(self, host_url: str) -> HTTPAdapter:
+        with self._lock:
+            adapter = self._adapters.get(host_url)
+            if adapter is None:
+                kwargs = dict(pool_connections=1,
+                              pool_maxsize=self.max_connections,
+                              pool_block=self.block)
+                if self.rate_limit:
+                    limiter = self._limiters[host_url] = RateLimiter()
+                    adapter = RateLimitedAdapter(limiter, **kwargs)
+                else:
+                    adapter = HTTPAdapter(**kwargs)
+                self._adapters[host_url] = adapter
+            return adapter
+
+    def get_limiter(self, host_url: str) -> Optional[RateLimiter]:
+        with self._lock:
+            return self._limiters.get(host_url)
+
+    def mount(self, gls: OneOrManyClients) -> None:
+        """Routes the requests of the clients through the pool of their
+        host, under the adapters already installed (see `mount_adapter`)."""
+        if not isinstance(gls, list):
+            gls = [gls]
+        for gl in gls:
+            mount_adapter(gl, self.get_adapter(get_host_url(gl)))
+
+    def close(self) -> None:
+        with self._lock:
+            for adapter in self._adapters.values():
+                adapter.close()
+            self._adapters.clear()
+            self._limiters.clear()
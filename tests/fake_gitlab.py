@@ -0,0 +1,637 @@
+"""Minimal in-process fake of the GitLab REST API v4, for offline tests.
+
+Only the endpoints used by gitlab_submodule are implemented. Repositories are
+modelled as a chain of commits holding full snapshots of their files, where
+a file is either a blob (`str` content) or a gitlink (`Gitlink(sha)`).
+"""
+import base64
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from posixpath import relpath
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from gitlab import Gitlab
+
+
+class Gitlink:
+    def __init__(self, sha: str):
+        self.sha = sha
+
+    def __eq__(self, other):
+        return isinstance(other, Gitlink) and other.sha == self.sha
+
+
+FileValue = Union[str, Gitlink]
+
+
+class FakeCommit:
+    def __init__(self,
+                 sha: str,
+                 parent: Optional['FakeCommit'],
+                 files: Dict[str, FileValue],
+                 message: str):
+        self.sha = sha
+        self.parent = parent
+        self.files = files
+        self.message = message
+
+    def changed_paths(self) -> List[str]:
+        parent_files = self.parent.files if self.parent else {}
+        return sorted(
+            path for path in set(parent_files) | set(self.files)
+            if parent_files.get(path) != self.files.get(path))
+
+    def as_json(self, project: 'FakeProject') -> dict:
+        return {
+            'id': self.sha,
+            'short_id': self.sha[:8],
+            'title': self.message,
+            'message': self.message,
+            'parent_ids': [self.parent.sha] if self.parent else [],
+            'project_id': project.id,
+            'web_url': f'{project.web_url}/-/commit/{self.sha}',
+        }
+
+
+class FakeProject:
+    def __init__(self,
+                 server: 'FakeGitlab',
+                 project_id: int,
+                 path_with_namespace: str,
+                 default_branch: str = 'main'):
+        self.server = server
+        self.id = project_id
+        self.path_with_namespace = path_with_namespace
+        self.default_branch = default_branch
+        self.commits: Dict[str, FakeCommit] = {}
+        self.branches: Dict[str, str] = {}
+        # the repository endpoints answer 403 when it's disabled
+        self.repository_enabled = True
+
+    @property
+    def web_url(self) -> str:
+        return f'{self.server.url}/{self.path_with_namespace}'
+
+    def as_json(self) -> dict:
+        name = self.path_with_namespace.split('/')[-1]
+        return {
+            'id': self.id,
+            'name': name,
+            'path': name,
+            'path_with_namespace': self.path_with_namespace,
+            'description': f'{name} description',
+            # like GitLab, empty repositories have no default branch
+            'default_branch': self.default_branch if self.branches else None,
+            'web_url': self.web_url,
+            'ssh_url_to_repo':
+                f'git@{self.server.domain}:{self.path_with_namespace}.git',
+            'http_url_to_repo': f'{self.web_url}.git',
+            'empty_repo': not self.branches,
+        }
+
+    def commit(self,
+               files: Dict[str, Optional[FileValue]],
+               branch: Optional[str] = None,
+               message: str = 'commit') -> str:
+        """Commits changes on top of `branch` and returns the new sha.
+        A `None` value deletes the file."""
+        branch = branch or self.default_branch
+        parent = self.commits.get(self.branches.get(branch, ''))
+        snapshot = dict(parent.files) if parent else {}
+        for path, value in files.items():
+            if value is None:
+                snapshot.pop(path, None)
+            else:
+                snapshot[path] = value
+        sha = hashlib.sha1('{}:{}:{}:{}'.format(
+            self.id, parent.sha if parent else '', message,
+            len(self.server.commit_counter)).encode()).hexdigest()
+        self.server.commit_counter.append(sha)
+        self.commits[sha] = FakeCommit(sha, parent, snapshot, message)
+        self.branches[branch] = sha
+        return sha
+
+    def resolve(self, ref: Optional[str]) -> Optional[FakeCommit]:
+        ref = ref or self.default_branch
+        if ref in self.branches:
+            return self.commits[self.branches[ref]]
+        return self.commits.get(ref)
+
+    def last_commit(self, commit: FakeCommit, path: str) -> FakeCommit:
+        while commit.parent is not None \
+                and commit.parent.files.get(path) == commit.files[path]:
+            commit = commit.parent
+        return commit
+
+
+def file_diff(path: str,
+              old: Optional[FileValue],
+              new: Optional[FileValue]) -> dict:
+    def lines(value: Optional[FileValue]) -> List[str]:
+        if value is None:
+            return []
+        if isinstance(value, Gitlink):
+            return [f'Subproject commit {value.sha}']
+        return value.splitlines()
+
+    old_lines, new_lines = lines(old), lines(new)
+    diff = '@@ -{} +{} @@\n'.format(
+        f'1,{len(old_lines)}' if old_lines else '0,0',
+        f'1,{len(new_lines)}' if new_lines else '0,0')
+    diff += ''.join(f'-{line}\n' for line in old_lines)
+    diff += ''.join(f'+{line}\n' for line in new_lines)
+    return {
+        'old_path': path,
+        'new_path': path,
+        'new_file': old is None,
+        'deleted_file': new is None,
+        'renamed_file': False,
+        'diff': diff,
+    }
+
+
+def tree_entries(commit: FakeCommit,
+                 path: str = '',
+                 recursive: bool = False) -> Optional[List[dict]]:
+    prefix = f'{path.strip("/")}/' if path.strip('/') else ''
+    entries = {}
+    for file_path, value in commit.files.items():
+        if not file_path.startswith(prefix):
+            continue
+        parts = file_path[len(prefix):].split('/')
+        for depth in range(1, len(parts)):
+            if depth > 1 and not recursive:
+                break
+            tree_path = prefix + '/'.join(parts[:depth])
+            entries[tree_path] = {
+                'id': hashlib.sha1(tree_path.encode()).hexdigest(),
+                'name': parts[depth - 1], 'type': 'tree', 'path': tree_path,
+                'mode': '040000'}
+        if len(parts) > 1 and not recursive:
+            continue
+        if isinstance(value, Gitlink):
+            entry_id, entry_type, mode = value.sha, 'commit', '160000'
+        else:
+            entry_id = hashlib.sha1(value.encode()).hexdigest()
+            entry_type, mode = 'blob', '100644'
+        entries[file_path] = {
+            'id': entry_id, 'name': parts[-1], 'type': entry_type,
+            'path': file_path, 'mode': mode}
+    if prefix and not entries:
+        return None
+    return [entries[key] for key in sorted(entries)]
+
+
+def commit_diff(old: Optional[FakeCommit], new: FakeCommit) -> List[dict]:
+    old_files = old.files if old else {}
+    return [
+        file_diff(path, old_files.get(path), new.files.get(path))
+        for path in sorted(set(old_files) | set(new.files))
+        if old_files.get(path) != new.files.get(path)
+    ]
+
+
+class FakeGitlab:
+    """Threaded HTTP server faking a GitLab instance on localhost.
+
+    Use as a context manager. Every request is appended to `requests` as a
+    `(method, path)` tuple so that tests can count API calls.
+    """
+
+    def __init__(self):
+        self.projects: Dict[int, FakeProject] = {}
+        # full path -> id, projects belong to the group of their namespace
+        self.groups: Dict[str, int] = {}
+        self.requests: List[Tuple[str, str]] = []
+        # number of TCP connections accepted
+        self.connections = 0
+        # GET responses replaced by a 304 thanks to their ETag
+        self.not_modified_responses = 0
+        # seconds waited before answering each request
+        self.latency = 0.
+        # size of the response bodies sent
+        self.bytes_sent = 0
+        self.commit_counter: List[str] = []
+        # requests allowed per window of `rate_limit_period` seconds
+        self.rate_limit: Optional[int] = None
+        self.rate_limit_period = 1
+        self.rate_limited_requests = 0
+        self._window: Tuple[float, int] = (0., 0)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+
+    @property
+    def url(self) -> str:
+        return 'http://{}:{}'.format(*self._server.server_address)
+
+    @property
+    def domain(self) -> str:
+        return self.url.split('//')[1]
+
+    def __enter__(self) -> 'FakeGitlab':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def client(self, **kwargs) -> Gitlab:
+        return Gitlab(self.url, **kwargs)
+
+    def add_project(self, path_with_namespace: str,
+                    default_branch: str = 'main') -> FakeProject:
+        project = FakeProject(self, len(self.projects) + 1,
+                              path_with_namespace, default_branch)
+        self.projects[project.id] = project
+        return project
+
+    def add_group(self, full_path: str) -> int:
+        return self.groups.setdefault(full_path, len(self.groups) + 1)
+
+    def find_group(self, id_or_path: str) -> Optional[str]:
+        for full_path, group_id in self.groups.items():
+            if id_or_path in (str(group_id), full_path):
+                return full_path
+        return None
+
+    def group_projects(self, full_path: str,
+                       include_subgroups: bool = False) -> List[FakeProject]:
+        return [project for project in self.projects.values()
+                if project.path_with_namespace.rsplit('/', 1)[0] == full_path
+                or (include_subgroups and project.path_with_namespace
+                    .startswith(f'{full_path}/'))]
+
+    def find_project(self, id_or_path: str) -> Optional[FakeProject]:
+        for project in self.projects.values():
+            if id_or_path in (str(project.id), project.path_with_namespace):
+                return project
+        return None
+
+    def reset_requests(self):
+        with self._lock:
+            self.requests.clear()
+            self.bytes_sent = 0
+
+    def count_requests(self, pattern: str = '') -> int:
+        with self._lock:
+            return sum(1 for method, path in self.requests
+                       if re.search(pattern, f'{method} {path}'))
+
+    def log_request(self, method: str, path: str):
+        with self._lock:
+            self.requests.append((method, path))
+
+    def check_rate_limit(self) -> Optional[Dict[str, str]]:
+        """Counts a request in the current window, like GitLab's fixed
+        window rate limits. Returns the `RateLimit-*` headers, plus
+        `Retry-After` if the request is rejected."""
+        if self.rate_limit is None:
+            return None
+        with self._lock:
+            now = time.time()
+            start = math.floor(now / self.rate_limit_period) \
+                * self.rate_limit_period
+            window_start, count = self._window
+            count = count + 1 if window_start == start else 1
+            self._window = (start, count)
+            reset = start + self.rate_limit_period
+            headers = {
+                'RateLimit-Limit': str(self.rate_limit),
+                'RateLimit-Observed': str(count),
+                'RateLimit-Remaining': str(max(self.rate_limit - count, 0)),
+                'RateLimit-Reset': str(math.ceil(reset)),
+            }
+            if count > self.rate_limit:
+                self.rate_limited_requests += 1
+                headers['Retry-After'] = str(math.ceil(reset - now))
+            return headers
+
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+
+def _json(data, status: int = 200, headers=None) -> Response:
+    headers = dict(headers or {})
+    headers['Content-Type'] = 'application/json'
+    return status, headers, json.dumps(data).encode()
+
+
+def _not_found() -> Response:
+    return _json({'message': '404 Not Found'}, status=404)
+
+
+def _paginated(items: list, query: Dict[str, str], url: str) -> Response:
+    page = int(query.get('page', 1))
+    per_page = int(query.get('per_page', 20))
+    total_pages = max(1, -(-len(items) // per_page))
+    headers = {
+        'X-Page': str(page),
+        'X-Per-Page': str(per_page),
+        'X-Total': str(len(items)),
+        'X-Total-Pages': str(total_pages),
+        'X-Next-Page': str(page + 1) if page < total_pages else '',
+    }
+    if page < total_pages:
+        next_query = dict(query, page=str(page + 1), per_page=str(per_page))
+        next_url = '{}?{}'.format(url, '&'.join(
+            f'{key}={quote(value, safe="")}'
+            for key, value in next_query.items()))
+        headers['Link'] = f'<{next_url}>; rel="next"'
+    return _json(items[(page - 1) * per_page:page * per_page],
+                 headers=headers)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # the headers and the body are written separately: without TCP_NODELAY
+    # each keep-alive response would wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, *_):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.fake._lock:
+            self.fake.connections += 1
+
+    @property
+    def fake(self) -> FakeGitlab:
+        return self.server.fake
+
+    def do_GET(self):
+        self._respond('GET')
+
+    def do_HEAD(self):
+        self._respond('HEAD')
+
+    def do_POST(self):
+        self._respond('POST')
+
+    def _respond(self, method: str):
+        split = urlsplit(self.path)
+        self.fake.log_request(method, split.path)
+        query = {key: values[-1]
+                 for key, values in parse_qs(split.query).items()}
+        rate_limit_headers = self.fake.check_rate_limit()
+        if rate_limit_headers and 'Retry-After' in rate_limit_headers:
+            status, headers, body = _json(
+                {'message': 'Retry later'}, status=429,
+                headers=rate_limit_headers)
+        else:
+            status, headers, body = self._route(method, split.path, query)
+            headers.update(rate_limit_headers or {})
+        if method == 'GET' and status == 200:
+            headers['ETag'] = 'W/"{}"'.format(hashlib.md5(body).hexdigest())
+            if self.headers.get('If-None-Match') == headers['ETag']:
+                with self.fake._lock:
+                    self.fake.not_modified_responses += 1
+                status, body = 304, b''
+                headers.pop('Content-Type', None)
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+        if method != 'HEAD':
+            with self.fake._lock:
+                self.fake.bytes_sent += len(body)
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if method != 'HEAD':
+            self.wfile.write(body)
+
+    def _route(self, method: str, path: str,
+               query: Dict[str, str]) -> Response:
+        if method == 'POST' and path == '/api/graphql':
+            length = int(self.headers.get('Content-Length', 0))
+            return self._graphql(json.loads(self.rfile.read(length)))
+        match = re.fullmatch(r'/api/v4/groups/([^/]+)(/projects)?', path)
+        if match:
+            return self._group(unquote(match.group(1)), bool(match.group(2)),
+                               query, f'{self.fake.url}{path}')
+        match = re.fullmatch(r'/api/v4/projects/([^/]+)(/.*)?', path)
+        if not match:
+            return _not_found()
+        project = self.fake.find_project(unquote(match.group(1)))
+        if project is None:
+            return _not_found()
+        sub_path = match.group(2) or ''
+        url = f'{self.fake.url}{path}'
+        if sub_path == '':
+            return _json(project.as_json())
+        if sub_path.startswith('/repository/') \
+                and not project.repository_enabled:
+            return _json({'message': '403 Forbidden'}, status=403)
+
+        match = re.fullmatch(r'/repository/files/([^/]+)(/raw)?', sub_path)
+        if match:
+            return self._file(project, unquote(match.group(1)),
+                              query.get('ref'), bool(match.group(2)))
+
+        match = re.fullmatch(r'/repository/commits/([^/]+)(/diff)?',
+                             sub_path)
+        if match:
+            commit = project.resolve(unquote(match.group(1)))
+            if commit is None:
+                return _not_found()
+            if match.group(2):
+                return _paginated(commit_diff(commit.parent, commit),
+                                  query, url)
+            return _json(commit.as_json(project))
+
+        if sub_path == '/repository/compare':
+            old = project.resolve(query.get('from'))
+            new = project.resolve(query.get('to'))
+            if old is None or new is None:
+                return _not_found()
+            return _json({
+                'commit': new.as_json(project),
+                'diffs': commit_diff(old, new),
+                'compare_timeout': False,
+                'compare_same_ref': old is new,
+            })
+
+        if sub_path == '/repository/tree':
+            commit = project.resolve(query.get('ref'))
+            entries = commit and tree_entries(
+                commit, query.get('path', ''),
+                query.get('recursive', '').lower() == 'true')
+            if entries is None:
+                return _json({'message': '404 Tree Not Found'}, status=404)
+            return _paginated(entries, query, url)
+        return _not_found()
+
+    def _group(self, id_or_path: str, projects: bool,
+               query: Dict[str, str], url: str) -> Response:
+        full_path = self.fake.find_group(id_or_path)
+        if full_path is None:
+            return _not_found()
+        if projects:
+            return _paginated(
+                [project.as_json() for project in self.fake.group_projects(
+                    full_path,
+                    query.get('include_subgroups', '').lower() == 'true')],
+                query, url)
+        return _json({
+            'id': self.fake.groups[full_path],
+            'name': full_path.split('/')[-1],
+            'path': full_path.split('/')[-1],
+            'full_path': full_path,
+            'web_url': f'{self.fake.url}/groups/{full_path}',
+        })
+
+    def _graphql(self, body: dict) -> Response:
+        """Only supports the `projects(fullPaths: ...)` query."""
+        variables = body.get('variables') or {}
+        full_paths = [path.lower() for path in variables['fullPaths']]
+        projects = [project for project in self.fake.projects.values()
+                    if project.path_with_namespace.lower() in full_paths]
+        start = int(variables.get('after') or 0)
+        page = projects[start:start + 100]
+        has_next_page = start + 100 < len(projects)
+        return _json({'data': {'projects': {
+            'pageInfo': {'hasNextPage': has_next_page,
+                         'endCursor': str(start + 100)},
+            'nodes': [{
+                'id': f'gid://gitlab/Project/{project.id}',
+                'fullPath': project.path_with_namespace,
+                'name': project.as_json()['name'],
+                'path': project.as_json()['path'],
+                'webUrl': project.web_url,
+                'sshUrlToRepo': project.as_json()['ssh_url_to_repo'],
+                'httpUrlToRepo': project.as_json()['http_url_to_repo'],
+                'repository': {'rootRef': project.default_branch},
+            } for project in page]}}})
+
+    def _file(self, project: FakeProject, file_path: str,
+              ref: Optional[str], raw: bool) -> Response:
+        commit = project.resolve(ref)
+        if commit is None or file_path not in commit.files:
+            return _not_found()
+        value = commit.files[file_path]
+        content = b'' if isinstance(value, Gitlink) else value.encode()
+        last_commit = project.last_commit(commit, file_path)
+        headers = {
+            'X-Gitlab-File-Path': file_path,
+            'X-Gitlab-Ref': ref or project.default_branch,
+            'X-Gitlab-Size': str(len(content)),
+            'X-Gitlab-Commit-Id': commit.sha,
+            'X-Gitlab-Last-Commit-Id': last_commit.sha,
+        }
+        if raw:
+            headers['Content-Type'] = 'text/plain'
+            return 200, headers, content
+        return _json({
+            'file_name': file_path.split('/')[-1],
+            'file_path': file_path,
+            'size': len(content),
+            'encoding': 'base64',
+            'content': base64.b64encode(content).decode(),
+            'ref': ref or project.default_branch,
+            'commit_id': commit.sha,
+            'last_commit_id': last_commit.sha,
+        }, headers=headers)
+
+
+def add_parent_project(fake: FakeGitlab,
+                       n_submodules: int,
+                       path_with_namespace: str = 'test-projects/parent',
+                       with_missing: bool = True,
+                       with_external: bool = True) -> Dict[str, str]:
+    """Adds a parent project with `n_submodules` submodules linking to
+    dummy projects (shared between parents) through relative urls, plus
+    optionally a submodule pointing to a missing repo and one hosted outside
+    GitLab.
+
+    Returns the expected commit sha of each GitLab submodule by path."""
+    gitmodules = ''
+    files: Dict[str, Optional[FileValue]] = {}
+    expected_commits = {}
+    for i in range(1, n_submodules + 1):
+        dummy = fake.find_project(f'dummy-projects/{i}')
+        if dummy is None:
+            dummy = fake.add_project(f'dummy-projects/{i}')
+            dummy.commit({'README.md': f'dummy {i}'})
+        sha = dummy.branches[dummy.default_branch]
+        gitmodules += (f'[submodule "libs/{i}"]\n'
+                       f'\tpath = libs/{i}\n'
+                       f'\turl = ../../dummy-projects/{i}.git\n')
+        files[f'libs/{i}'] = Gitlink(sha)
+        expected_commits[f'libs/{i}'] = sha
+    if with_missing:
+        gitmodules += ('[submodule "missing"]\n'
+                       '\tpath = missing\n'
+                       '\turl = ../../missing-repos/5.git\n')
+        files['missing'] = Gitlink('0' * 40)
+    if with_external:
+        gitmodules += ('[submodule "external"]\n'
+                       '\tpath = external\n'
+                       '\turl = https://github.com/opencv/opencv.git\n')
+        files['external'] = Gitlink('1' * 40)
+    files['.gitmodules'] = gitmodules
+    fake.add_project(path_with_namespace).commit(files)
+    return expected_commits
+
+
+def commit_submodules(project: FakeProject,
+                      submodules: Dict[str, FakeProject],
+                      message: str = 'update submodules') -> str:
+    """Commits a `.gitmodules` file with relative urls and the gitlinks of
+    `submodules` (path -> project pinned at the head of its default
+    branch)."""
+    gitmodules = ''
+    files: Dict[str, Optional[FileValue]] = {}
+    for path, submodule in submodules.items():
+        url = relpath(submodule.path_with_namespace,
+                      project.path_with_namespace)
+        gitmodules += (f'[submodule "{path}"]\n'
+                       f'\tpath = {path}\n'
+                       f'\turl = {url}.git\n')
+        files[path] = Gitlink(submodule.branches[submodule.default_branch])
+    files['.gitmodules'] = gitmodules
+    return project.commit(files, message=message)
+
+
+class FakeGitlabMixin:
+    """Starts a `FakeGitlab` for each test, as `self.fake`, with `self.gl`
+    a client of it."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.fake = FakeGitlab().__enter__()
+        self.addCleanup(self.fake.__exit__)
+        self.gl = self.fake.client()
+
+    def add_parent_project(self,
+                           n_submodules: int,
+                           **kwargs) -> Dict[str, str]:
+        """`add_parent_project`, and sets `self.project` to the parent
+        project fetched with `self.gl`, and `self.expected_commits` to the
+        returned commits."""
+        self.expected_commits = add_parent_project(self.fake, n_submodules,
+                                                   **kwargs)
+        self.project = self.gl.projects.get(
+            kwargs.get('path_with_namespace', 'test-projects/parent'))
+        return self.expected_commits
+
+
+class FakeGitlabTestCase(FakeGitlabMixin, unittest.TestCase):
+    pass
+
+
+class AsyncFakeGitlabTestCase(FakeGitlabMixin,
+                              unittest.IsolatedAsyncioTestCase):
+    pass
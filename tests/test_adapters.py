@@ -0,0 +1,76 @@
+import itertools
+
+from fake_gitlab import FakeGitlabTestCase, add_parent_project
+
+from gitlab_submodule.adapters import get_wrappers
+from gitlab_submodule.conditional_requests import (ConditionalRequestAdapter,
+                                                   install_validator_cache)
+from gitlab_submodule.rate_limit import (RateLimitedAdapter, RateLimiter,
+                                         install_rate_limiter)
+from gitlab_submodule.request_budget import (RequestBudget,
+                                             RequestBudgetAdapter,
+                                             RequestBudgetExceeded,
+                                             install_request_budget)
+from gitlab_submodule.transport import TransportManager
+
+
+class TestMountAdapter(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        add_parent_project(self.fake, 2, with_missing=False,
+                           with_external=False)
+
+    def _get_transport(self, gl):
+        wrappers = get_wrappers(gl)
+        return wrappers[-1].adapter if wrappers \
+            else gl.session.get_adapter(self.fake.url + '/')
+
+    def test_fixed_order(self):
+        installers = [
+            lambda gl: install_request_budget(gl, RequestBudget(100)),
+            lambda gl: install_validator_cache(gl),
+            lambda gl: install_rate_limiter(gl, RateLimiter()),
+        ]
+        for order in itertools.permutations(installers):
+            gl = self.fake.client()
+            for install in order:
+                install(gl)
+            self.assertEqual(
+                [RequestBudgetAdapter, ConditionalRequestAdapter],
+                [type(wrapper) for wrapper in get_wrappers(gl)])
+            self.assertIsInstance(self._get_transport(gl),
+                                  RateLimitedAdapter)
+            gl.projects.get('test-projects/parent')
+
+    def test_transport_manager_keeps_wrappers(self):
+        gl = self.fake.client()
+        cache = install_validator_cache(gl)
+        transport = TransportManager(rate_limit=True)
+        transport.mount(gl)
+        self.assertIs(transport.get_adapter(self.fake.url),
+                      self._get_transport(gl))
+        for _ in range(2):
+            gl.projects.get('test-projects/parent')
+        self.assertEqual(1, cache.hits)
+        limiter = transport.get_limiter(self.fake.url)
+        self.assertEqual(2, limiter.requests)
+
+    def test_reinstall_replaces_wrapper(self):
+        gl = self.fake.client()
+        install_request_budget(gl, RequestBudget(0))
+        budget = install_request_budget(gl, RequestBudget(1))
+        self.assertEqual(1, len(get_wrappers(gl)))
+        gl.projects.get('test-projects/parent')
+        self.assertEqual(1, budget.spent)
+
+    def test_refused_request_isnt_rate_limited(self):
+        gl = self.fake.client()
+        limiter = install_rate_limiter(gl)
+        install_request_budget(gl, RequestBudget(0))
+        self.fake.reset_requests()
+        with self.assertLogs('gitlab_submodule.request_budget', 'WARNING'):
+            with self.assertRaises(RequestBudgetExceeded):
+                gl.projects.get('test-projects/parent')
+        self.assertEqual(0, limiter.requests)
+        self.assertEqual(0, self.fake.count_requests())
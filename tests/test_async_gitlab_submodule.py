@@ -0,0 +1,97 @@
+import time
+
+from fake_gitlab import AsyncFakeGitlabTestCase
+from gitlab.v4.objects import ProjectCommit
+
+from gitlab_submodule.async_gitlab_submodule import (
+    async_get_submodule_commit, async_iterate_project_submodules,
+    async_iterate_subprojects, async_submodule_to_subproject)
+from gitlab_submodule.cache import ProjectCache, SubmoduleCache
+from gitlab_submodule.objects import LazyCommit
+
+
+class TestAsyncGitlabSubmodule(AsyncFakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.add_parent_project(6)
+
+    async def test_async_iterate_project_submodules(self):
+        paths = [submodule.path async for submodule
+                 in async_iterate_project_submodules(self.project)]
+        self.assertEqual(
+            list(self.expected_commits) + ['missing', 'external'], paths)
+
+    async def test_async_submodule_to_subproject(self):
+        async for submodule in async_iterate_project_submodules(
+                self.project):
+            subproject = await async_submodule_to_subproject(
+                submodule, self.gl)
+            self.assertEqual('dummy-projects/1',
+                             subproject.project.path_with_namespace)
+            commit = await async_get_submodule_commit(
+                submodule, subproject.project)
+            self.assertIsInstance(commit, ProjectCommit)
+            self.assertEqual(self.expected_commits['libs/1'], commit.id)
+            break
+
+    async def test_async_iterate_subprojects(self):
+        subprojects = [
+            subproject async for subproject in async_iterate_subprojects(
+                self.project, self.gl, max_concurrency=3)]
+        self.assertEqual(
+            list(self.expected_commits) + ['external'],
+            [subproject.submodule.path for subproject in subprojects])
+        for subproject in subprojects[:-1]:
+            self.assertEqual(self.expected_commits[subproject.submodule.path],
+                             subproject.commit.id)
+
+    async def test_async_iterate_subprojects_on_plan(self):
+        plans = []
+        async for _ in async_iterate_subprojects(
+                self.project, self.gl, strategy='tree',
+                on_plan=plans.append):
+            pass
+        self.assertEqual(['tree'], [plan.strategy for plan in plans])
+
+    async def test_async_iterate_subprojects_as_completed(self):
+        subprojects = [
+            subproject async for subproject in async_iterate_subprojects(
+                self.project, self.gl, only_gitlab_subprojects=True,
+                ordered=False)]
+        self.assertEqual(
+            set(self.expected_commits.items()),
+            {(subproject.submodule.path, subproject.commit.id)
+             for subproject in subprojects})
+
+    async def test_async_iterate_subprojects_without_gitmodules(self):
+        self.fake.add_project('no-submodules').commit({'README.md': ''})
+        project = self.gl.projects.get('no-submodules')
+        self.assertEqual([], [subproject async for subproject
+                              in async_iterate_subprojects(project, self.gl)])
+
+    async def test_async_iterate_subprojects_with_caches(self):
+        cache = SubmoduleCache()
+        project_cache = ProjectCache()
+        for _ in range(2):
+            self.fake.reset_requests()
+            subprojects = [
+                subproject async for subproject in async_iterate_subprojects(
+                    self.project, self.gl, only_gitlab_subprojects=True,
+                    cache=cache, project_cache=project_cache,
+                    lazy_commits=True)]
+            self.assertEqual(6, len(subprojects))
+            for subproject in subprojects:
+                self.assertIsInstance(subproject.commit, LazyCommit)
+        # only the ref of the parent the second time
+        self.assertEqual(1, self.fake.count_requests())
+
+    async def test_async_iterate_subprojects_closed_early(self):
+        self.fake.latency = 0.5
+        subprojects = async_iterate_subprojects(
+            self.project, self.gl, max_concurrency=2, ordered=False)
+        await subprojects.__anext__()
+        start = time.monotonic()
+        await subprojects.aclose()
+        # doesn't wait for the requests in flight
+        self.assertLess(time.monotonic() - start, self.fake.latency)
@@ -0,0 +1,216 @@
+import logging
+import os
+import tempfile
+import time
+import unittest
+from contextlib import nullcontext
+
+from fake_gitlab import FakeGitlab, FakeGitlabTestCase, add_parent_project
+
+from gitlab_submodule.cache import (NOT_GITLAB, ProjectCache, SubmoduleCache,
+                                    ValidatorCache, is_commit_sha)
+from gitlab_submodule.gitlab_submodule import list_subprojects
+from gitlab_submodule.project_manager_utils import get_lazy_project
+from gitlab_submodule.read_gitmodules import list_project_submodules
+from gitlab_submodule.submodule_to_project import submodule_to_project
+
+
+class TestSubmoduleCache(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.add_parent_project(4)
+        self.sha = self.fake.find_project('test-projects/parent').branches[
+            'main']
+
+    def test_is_commit_sha(self):
+        self.assertTrue(is_commit_sha(self.sha))
+        self.assertTrue(is_commit_sha('a' * 64))
+        self.assertFalse(is_commit_sha('main'))
+        self.assertFalse(is_commit_sha(self.sha[:8]))
+        self.assertFalse(is_commit_sha(None))
+
+    def test_cache_only_stores_commit_shas(self):
+        cache = SubmoduleCache()
+        entries = [{'name': 'a', 'path': 'a', 'url': '../a.git'}]
+        cache.set_gitmodules(self.project, 'main', entries)
+        cache.set_commit_id(self.project, 'main', 'a', 'b' * 40)
+        self.assertIsNone(cache.get_gitmodules(self.project, 'main'))
+        self.assertIsNone(cache.get_commit_id(self.project, 'main', 'a'))
+
+        cache.set_gitmodules(self.project, self.sha, entries)
+        cache.set_commit_id(self.project, self.sha, 'a/', 'b' * 40)
+        self.assertEqual(entries,
+                         cache.get_gitmodules(self.project, self.sha))
+        self.assertEqual('b' * 40,
+                         cache.get_commit_id(self.project, self.sha, 'a'))
+        self.assertIsNone(cache.get_commit_id(self.project, self.sha, 'b'))
+
+    def test_cache_with_lazy_project(self):
+        cache = SubmoduleCache()
+        project = get_lazy_project(self.gl, 'test-projects/parent')
+        cache.set_commit_id(project, self.sha, 'a', 'b' * 40)
+        # fetching the project changes its id from its path
+        project.load()
+        self.assertEqual(self.project.id, project.get_id())
+        for same_project in (project, self.project):
+            self.assertEqual(
+                'b' * 40, cache.get_commit_id(same_project, self.sha, 'a'))
+
+    def test_cache_persists_on_disk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.sqlite')
+            cache = SubmoduleCache(path)
+            cache.set_commit_id(self.project, self.sha, 'a', 'b' * 40)
+            cache.close()
+            cache = SubmoduleCache(path)
+            self.assertEqual(
+                'b' * 40, cache.get_commit_id(self.project, self.sha, 'a'))
+            cache.close()
+
+    def test_list_subprojects_with_cache(self):
+        cache = SubmoduleCache()
+        for strategy in ('tree', 'diff'):
+            first = list_subprojects(self.project, self.gl, ref=self.sha,
+                                     strategy=strategy, cache=cache)
+            self.fake.reset_requests()
+            second = list_subprojects(self.project, self.gl, ref=self.sha,
+                                      strategy=strategy, cache=cache,
+                                      max_workers=2)
+            self.assertEqual(
+                [(subproject.submodule.path, subproject.commit.id)
+                 for subproject in first],
+                [(subproject.submodule.path, subproject.commit.id)
+                 for subproject in second])
+            self.assertEqual(0, self.fake.count_requests(
+                f'/projects/{self.project.id}/repository/'))
+
+
+class TestProjectCache(unittest.TestCase):
+
+    def test_lru(self):
+        cache = ProjectCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+        self.assertEqual(2, len(cache))
+        self.assertEqual((3, 1), (cache.hits, cache.misses))
+
+    def test_ttl(self):
+        cache = ProjectCache(ttl=0.05)
+        cache.set('a', 1)
+        cache.set_not_found('b')
+        self.assertEqual(1, cache.get('a'))
+        self.assertTrue(cache.is_not_found('b'))
+        time.sleep(0.06)
+        self.assertEqual('default', cache.get('a', 'default'))
+        self.assertFalse(cache.is_not_found('b'))
+        self.assertEqual(0, len(cache))
+
+    def test_negative_results(self):
+        cache = ProjectCache(maxsize=1)
+        cache.set('a', 1)
+        cache.set_not_found('b')
+        cache.set_match('url', NOT_GITLAB)
+        # kept apart from the projects, and not counted in the stats
+        self.assertEqual(1, cache.peek('a'))
+        self.assertTrue(cache.is_not_found('b'))
+        self.assertIs(NOT_GITLAB, cache.get_match('url'))
+        self.assertIsNone(cache.peek('b'))
+        self.assertEqual((1, 0, 0), (len(cache), cache.hits, cache.misses))
+
+    def test_submodule_to_project_with_cache(self):
+        with FakeGitlab() as fake:
+            gl = fake.client()
+            add_parent_project(fake, 2)
+            project = gl.projects.get('test-projects/parent')
+            submodules = list_project_submodules(project)
+            cache = ProjectCache()
+            for _ in range(2):
+                fake.reset_requests()
+                projects = [submodule_to_project(submodule, gl,
+                                                 project_cache=cache)
+                            for submodule in submodules[:2]]
+                with self.assertRaises(FileNotFoundError):
+                    submodule_to_project(submodules[2], gl,
+                                         project_cache=cache)
+                with self.assertLogs(level=logging.WARNING) \
+                        if not cache.hits else nullcontext():
+                    self.assertIsNone(submodule_to_project(
+                        submodules[3], gl, project_cache=cache))
+                self.assertEqual(['dummy-projects/1', 'dummy-projects/2'],
+                                 [p.path_with_namespace for p in projects])
+            self.assertEqual(0, fake.count_requests())
+            # the external url isn't counted, nor the missing repo once
+            # it's known to be missing
+            self.assertEqual((2, 3), (cache.hits, cache.misses))
+            self.assertEqual(2, len(cache))
+
+    def test_cached_lookups_expire(self):
+        with FakeGitlab() as fake:
+            gl = fake.client()
+            add_parent_project(fake, 1, with_external=False)
+            project = gl.projects.get('test-projects/parent')
+            submodules = list_project_submodules(project)
+            cache = ProjectCache(ttl=0.25)
+            fake.reset_requests()
+            with self.assertRaises(FileNotFoundError):
+                submodule_to_project(submodules[1], gl, project_cache=cache)
+            fake.add_project('missing-repos/5')
+            for _ in range(6):
+                submodule_to_project(submodules[0], gl, project_cache=cache)
+                try:
+                    submodule_to_project(submodules[1], gl,
+                                         project_cache=cache)
+                except FileNotFoundError:
+                    pass
+                time.sleep(0.1)
+            # the lookups every 0.1s don't keep the entries from expiring
+            self.assertEqual(2, fake.count_requests(
+                '^GET /api/v4/projects/dummy-projects%2F1$'))
+            self.assertIsNotNone(submodule_to_project(
+                submodules[1], gl, project_cache=cache))
+
+    def test_list_subprojects_with_project_cache(self):
+        with FakeGitlab() as fake:
+            gl = fake.client()
+            add_parent_project(fake, 3, path_with_namespace='group/a')
+            add_parent_project(fake, 3, path_with_namespace='group/b')
+            cache = ProjectCache()
+            for path in ('group/a', 'group/b'):
+                list_subprojects(gl.projects.get(path), gl,
+                                 project_cache=cache)
+            for path in ('dummy-projects%2F1', 'missing-repos%2F5'):
+                self.assertEqual(1, fake.count_requests(
+                    f'^GET /api/v4/projects/{path}$'))
+
+
+class TestValidatorCache(unittest.TestCase):
+
+    def test_lru(self):
+        cache = ValidatorCache(maxsize=2)
+        cache.set('a', 'W/"a"', {}, b'a')
+        cache.set('b', 'W/"b"', {}, b'b')
+        self.assertEqual(('W/"a"', {}, b'a'), cache.get('a'))
+        cache.set('c', 'W/"c"', {}, b'c')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(2, len(cache))
+
+    def test_metrics(self):
+        cache = ValidatorCache()
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', 'W/"a"', {}, b'abc')
+        # refreshing an entry isn't a miss
+        cache.set('a', 'W/"a2"', {}, b'abc')
+        cache.get('a')
+        cache.record_hit(b'abc')
+        cache.record_hit(b'abc')
+        self.assertEqual((2, 1, 6),
+                         (cache.hits, cache.misses, cache.bytes_saved))
+        cache.clear()
+        self.assertEqual((0, 0, 0, 0), (len(cache), cache.hits,
+                                        cache.misses, cache.bytes_saved))
@@ -0,0 +1,29 @@
+import time
+import unittest
+
+from gitlab_submodule.concurrency_utils import map_concurrently
+
+
+def slow_square(value: int) -> int:
+    time.sleep(0.01 * (5 - value))
+    if value < 0:
+        raise ValueError(value)
+    return value ** 2
+
+
+class TestConcurrencyUtils(unittest.TestCase):
+
+    def test_map_concurrently_ordered(self):
+        self.assertEqual(
+            [0, 1, 4, 9, 16],
+            list(map_concurrently(slow_square, range(5), max_workers=5)))
+
+    def test_map_concurrently_unordered(self):
+        results = list(map_concurrently(slow_square, range(5),
+                                        max_workers=5, ordered=False))
+        self.assertEqual([0, 1, 4, 9, 16], sorted(results))
+        self.assertEqual(16, results[0])
+
+    def test_map_concurrently_raises(self):
+        with self.assertRaises(ValueError):
+            list(map_concurrently(slow_square, [1, -1, 2], max_workers=2))
@@ -0,0 +1,67 @@
+from fake_gitlab import FakeGitlabTestCase, add_parent_project
+
+from gitlab_submodule.cache import ValidatorCache
+from gitlab_submodule.conditional_requests import install_validator_cache
+from gitlab_submodule.gitlab_submodule import list_subprojects
+from gitlab_submodule.read_gitmodules import list_project_submodules
+from gitlab_submodule.transport import TransportManager
+
+
+class TestConditionalRequests(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.expected_commits = add_parent_project(
+            self.fake, 3, with_missing=False, with_external=False)
+        self.parent = self.fake.find_project('test-projects/parent')
+        self.cache = install_validator_cache(self.gl)
+
+    def _scan(self):
+        project = self.gl.projects.get('test-projects/parent')
+        subprojects = list_subprojects(project, self.gl, pin_ref=False,
+                                       strategy='tree')
+        return {subproject.submodule.path: subproject.commit.id
+                for subproject in subprojects}
+
+    def test_repeated_scan(self):
+        self.assertEqual(self.expected_commits, self._scan())
+        self.assertEqual(0, self.fake.not_modified_responses)
+        self.fake.reset_requests()
+        self.assertEqual(self.expected_commits, self._scan())
+        # parent + submodule projects, .gitmodules and tree
+        self.assertEqual(6, self.fake.not_modified_responses)
+        self.assertEqual(6, self.cache.hits)
+        self.assertGreater(self.cache.bytes_saved, 0)
+        # the commits aren't revalidated
+        self.assertEqual(6, self.cache.misses)
+
+    def test_changed_file_is_downloaded(self):
+        project = self.gl.projects.get('test-projects/parent')
+        self.assertEqual(3, len(list_project_submodules(project, 'main')))
+        gitmodules = self.parent.resolve('main').files['.gitmodules']
+        self.parent.commit({
+            '.gitmodules': gitmodules.split('[submodule "libs/3"]')[0]})
+        self.assertEqual(2, len(list_project_submodules(project, 'main')))
+        self.assertEqual(0, self.fake.not_modified_responses)
+        self.assertEqual(2, len(list_project_submodules(project, 'main')))
+        self.assertEqual(1, self.fake.not_modified_responses)
+
+    def test_replayed_response(self):
+        project = self.gl.projects.get('test-projects/parent')
+        replayed = self.gl.projects.get('test-projects/parent')
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(project.attributes, replayed.attributes)
+
+    def test_shared_cache_with_transport(self):
+        transport = TransportManager(max_connections=2)
+        self.addCleanup(transport.close)
+        other_gl = self.fake.client()
+        transport.mount(other_gl)
+        cache = ValidatorCache()
+        install_validator_cache(other_gl, cache)
+        other_gl.projects.get('test-projects/parent')
+        other_gl.projects.get('test-projects/parent')
+        self.assertEqual(1, cache.hits)
+        self.assertIs(transport.get_adapter(other_gl.url),
+                      other_gl.session.get_adapter(
+                          other_gl.url + '/api/v4').adapter)
@@ -1,11 +1,18 @@
 import unittest
+from unittest.mock import Mock, patch
 
+from fake_gitlab import FakeGitlabTestCase, Gitlink, commit_submodules
 from gitlab import Gitlab
+from gitlab.v4.objects import ProjectCommit
 
-from gitlab_submodule.gitlab_submodule import (iterate_submodules,
+from gitlab_submodule import gitlab_submodule
+from gitlab_submodule.gitlab_submodule import (hydrate_commits,
+                                               iterate_submodules,
+                                               list_nested_subprojects,
                                                list_subprojects,
                                                submodule_to_subproject)
-from gitlab_submodule.objects import Subproject
+from gitlab_submodule.objects import LazyCommit, LazyProject, Subproject
+from gitlab_submodule.project_manager_utils import get_lazy_project
 
 
 class TestGitlabSubmodule(unittest.TestCase):
@@ -133,3 +140,226 @@ class TestGitlabSubmodule(unittest.TestCase):
             print('- {}: {}'.format(
                 subproject.submodule.path,
                 'ok' if up_to_date else '/!\\ must update'))
+
+
+class TestGitlabSubmoduleConcurrent(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.add_parent_project(8)
+
+    def test_list_subprojects_concurrently_keeps_gitmodules_order(self):
+        sequential = list_subprojects(self.project, self.gl)
+        concurrent = list_subprojects(self.project, self.gl, max_workers=4)
+        self.assertEqual(
+            [subproject.submodule.path for subproject in sequential],
+            [subproject.submodule.path for subproject in concurrent])
+        self.assertEqual(9, len(concurrent))
+        self.assertIsNone(concurrent[-1].project)
+        self.assertEqual('1' * 40, concurrent[-1].commit.id)
+        for subproject in concurrent[:-1]:
+            self.assertEqual(self.expected_commits[subproject.submodule.path],
+                             subproject.commit.id)
+
+    def test_list_subprojects_concurrently_as_completed(self):
+        subprojects = list_subprojects(self.project, self.gl,
+                                       only_gitlab_subprojects=True,
+                                       max_workers=4, ordered=False)
+        self.assertEqual(
+            set(self.expected_commits.items()),
+            {(subproject.submodule.path, subproject.commit.id)
+             for subproject in subprojects})
+
+    def test_list_subprojects_concurrently_propagates_errors(self):
+        self.gl.projects.get = Mock(side_effect=ValueError('boom'))
+        with self.assertRaises(ValueError):
+            list_subprojects(self.project, self.gl, max_workers=4)
+
+    def test_list_subprojects_strategies(self):
+        self.fake.reset_requests()
+        with_tree = list_subprojects(self.project, self.gl)
+        tree_requests = self.fake.count_requests()
+        self.fake.reset_requests()
+        with_diff = list_subprojects(self.project, self.gl, strategy='diff')
+        diff_requests = self.fake.count_requests()
+        self.assertEqual(
+            [(subproject.submodule.path, subproject.commit.id)
+             for subproject in with_diff],
+            [(subproject.submodule.path, subproject.commit.id)
+             for subproject in with_tree])
+        self.assertLess(tree_requests, diff_requests)
+
+    def test_list_subprojects_on_plan(self):
+        plans = []
+        self.fake.reset_requests()
+        list_subprojects(self.project, self.gl, strategy='tree',
+                         lazy_commits=True, on_plan=plans.append)
+        self.assertEqual(['tree'], [plan.strategy for plan in plans])
+        # libs/ and the root directory
+        self.assertEqual(2, plans[0].actual_requests)
+        self.assertEqual(2, self.fake.count_requests('/repository/tree'))
+        plans.clear()
+        list_subprojects(self.project, self.gl, strategy='diff',
+                         on_plan=plans.append)
+        self.assertEqual([], plans)
+
+    def test_list_subprojects_with_graphql(self):
+        self.fake.reset_requests()
+        subprojects = list_subprojects(self.project, self.gl,
+                                       use_graphql=True)
+        self.assertEqual(1, self.fake.count_requests('^POST /api/graphql$'))
+        # only the missing repo falls back to the REST API
+        self.assertEqual(
+            1, self.fake.count_requests('^GET /api/v4/projects/[^/]+$'))
+        self.assertEqual(
+            set(self.expected_commits.items()),
+            {(subproject.submodule.path, subproject.commit.id)
+             for subproject in subprojects if subproject.project})
+
+    def test_list_subprojects_with_lazy_commits(self):
+        self.fake.reset_requests()
+        subprojects = list_subprojects(self.project, self.gl,
+                                       only_gitlab_subprojects=True,
+                                       lazy_commits=True)
+        self.assertEqual(
+            0, self.fake.count_requests('/repository/commits/[0-9a-f]{40}$'))
+        self.assertTrue(all(isinstance(subproject.commit, LazyCommit)
+                            for subproject in subprojects))
+        self.assertEqual(
+            set(self.expected_commits.items()),
+            {(subproject.submodule.path, subproject.commit_id)
+             for subproject in subprojects})
+
+        # attributes other than id trigger a request
+        self.assertEqual('commit', subprojects[0].commit.title)
+        self.assertEqual('commit', subprojects[0].commit_title)
+        self.assertEqual(
+            1, self.fake.count_requests('/repository/commits/[0-9a-f]{40}$'))
+
+        hydrate_commits(subprojects, max_workers=4)
+        self.assertEqual(
+            len(subprojects),
+            self.fake.count_requests('/repository/commits/[0-9a-f]{40}$'))
+        for subproject in subprojects:
+            self.assertTrue(subproject.commit.hydrated)
+            self.assertEqual(
+                subproject.project.commits.get(subproject.commit.id),
+                subproject.commit)
+
+    def test_list_subprojects_with_lazy_projects(self):
+        self.fake.reset_requests()
+        parent = get_lazy_project(self.gl, 'test-projects/parent')
+        subprojects = list_subprojects(parent, self.gl, ref='main',
+                                       use_graphql=True, lazy_commits=True)
+        # only the missing repo is requested with the REST API
+        self.assertEqual(
+            1, self.fake.count_requests('^GET /api/v4/projects/[^/]+$'))
+        self.assertEqual(
+            set(self.expected_commits.items()),
+            {(subproject.submodule.path, subproject.commit.id)
+             for subproject in subprojects if subproject.project})
+        subproject = subprojects[0]
+        self.assertIsInstance(subproject.project, LazyProject)
+        key = gitlab_submodule._subproject_key(subproject)
+        self.assertEqual('dummy-projects/1', subproject.project_web_url[
+            -len('dummy-projects/1'):])
+        self.assertEqual(
+            1, self.fake.count_requests('^GET /api/v4/projects/[^/]+$'))
+        self.assertEqual('1 description', subproject.project_description)
+        self.assertEqual(
+            2, self.fake.count_requests('^GET /api/v4/projects/[^/]+$'))
+        # the key of nested scans doesn't change once the project is fetched
+        self.assertEqual(key, gitlab_submodule._subproject_key(subproject))
+
+    def test_list_subprojects_pins_ref(self):
+        parent = self.fake.find_project('test-projects/parent')
+        head = parent.branches['main']
+        get_commit_ids = gitlab_submodule.get_submodule_commit_ids
+
+        def push_then_get_commit_ids(*args, **kwargs):
+            # the branch moves while the scan is running
+            parent.commit({'libs/1': Gitlink('2' * 40)}, branch='main')
+            return get_commit_ids(*args, **kwargs)
+
+        with patch.object(gitlab_submodule, 'get_submodule_commit_ids',
+                          side_effect=push_then_get_commit_ids):
+            subprojects = list_subprojects(self.project, self.gl,
+                                           only_gitlab_subprojects=True)
+        self.assertEqual(
+            set(self.expected_commits.items()),
+            {(subproject.submodule.path, subproject.commit.id)
+             for subproject in subprojects})
+        for subproject in subprojects:
+            self.assertEqual('main', subproject.submodule.parent_ref)
+            self.assertEqual(head, subproject.submodule.parent_commit_id)
+
+        subprojects = list_subprojects(self.project, self.gl,
+                                       only_gitlab_subprojects=True,
+                                       lazy_commits=True, pin_ref=False)
+        self.assertEqual('2' * 40, subprojects[0].commit.id)
+        self.assertIsNone(subprojects[0].submodule.parent_commit_id)
+
+    def test_list_subprojects_of_empty_project_or_missing_ref(self):
+        self.fake.add_project('test-projects/empty')
+        empty = self.gl.projects.get('test-projects/empty')
+        for pin_ref in (True, False):
+            self.assertEqual(
+                [], list_subprojects(empty, self.gl, pin_ref=pin_ref))
+            self.assertEqual(
+                [], list_subprojects(self.project, self.gl, ref='missing',
+                                     pin_ref=pin_ref))
+
+
+class TestGitlabSubmoduleNested(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        # root -> a -> c -> d
+        #      -> b -> c -> d
+        #      -> external
+        d = self.fake.add_project('nested/d')
+        d.commit({'README.md': 'd'})
+        c = self.fake.add_project('nested/c')
+        commit_submodules(c, {'deps/d': d})
+        a = self.fake.add_project('nested/a')
+        commit_submodules(a, {'c': c})
+        b = self.fake.add_project('nested/b')
+        commit_submodules(b, {'vendor/c': c})
+        root = self.fake.add_project('nested/root')
+        commit_submodules(root, {'a': a, 'b': b})
+        self.project = self.gl.projects.get('nested/root')
+        self.fake.reset_requests()
+
+    def _tree(self, subprojects):
+        return [(subproject.depth,
+                 tuple(parent.project.path_with_namespace
+                       for parent in subproject.parents),
+                 subproject.project.path_with_namespace)
+                for subproject in subprojects]
+
+    def test_list_nested_subprojects(self):
+        subprojects = list_nested_subprojects(self.project, self.gl)
+        self.assertEqual([
+            (1, (), 'nested/a'),
+            (1, (), 'nested/b'),
+            (2, ('nested/a',), 'nested/c'),
+            (2, ('nested/b',), 'nested/c'),
+            (3, ('nested/a', 'nested/c'), 'nested/d'),
+            (3, ('nested/b', 'nested/c'), 'nested/d'),
+        ], self._tree(subprojects))
+        # nested/c and nested/d are only expanded once
+        self.assertEqual(5, self.fake.count_requests('/.gitmodules/raw$'))
+        self.assertIsInstance(subprojects[-1].commit, ProjectCommit)
+
+    def test_list_nested_subprojects_concurrently(self):
+        sequential = list_nested_subprojects(self.project, self.gl)
+        concurrent = list_nested_subprojects(self.project, self.gl,
+                                             max_workers=4)
+        self.assertEqual(self._tree(sequential), self._tree(concurrent))
+
+    def test_list_nested_subprojects_max_depth(self):
+        subprojects = list_nested_subprojects(self.project, self.gl,
+                                              max_depth=2, lazy_commits=True)
+        self.assertEqual([1, 1, 2, 2],
+                         [subproject.depth for subproject in subprojects])
+        self.assertEqual(3, self.fake.count_requests('/.gitmodules/raw$'))
@@ -0,0 +1,108 @@
+import unittest
+
+from gitlab_submodule.gitmodules_parser import parse_gitmodules
+
+GITMODULES = '''\
+[submodule "libs/1"]
+\tpath = libs/1
+\turl = ../../dummy-projects/1.git
+[submodule "external"]
+\tpath = external
+\turl = https://github.com/opencv/opencv.git
+\tbranch = 4.x
+\tshallow = true
+'''
+
+
+def _entry(name, path, url, **kwargs):
+    entry = {'name': name, 'path': path, 'url': url,
+             'branch': None, 'ignore': None, 'update': None,
+             'recurse': False, 'shallow': False}
+    entry.update(kwargs)
+    return entry
+
+
+class TestGitmodulesParser(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(
+            [_entry('libs/1', 'libs/1', '../../dummy-projects/1.git'),
+             _entry('external', 'external',
+                    'https://github.com/opencv/opencv.git',
+                    branch='4.x', shallow=True)],
+            list(parse_gitmodules(GITMODULES)))
+
+    def test_parse_lines(self):
+        self.assertEqual(list(parse_gitmodules(GITMODULES)),
+                         list(parse_gitmodules(
+                             GITMODULES.splitlines(keepends=True))))
+
+    def test_yields_each_section_when_it_ends(self):
+        lines = iter(GITMODULES.splitlines())
+        entries = parse_gitmodules(lines)
+        self.assertEqual('libs/1', next(entries)['name'])
+        # only the header of the next section was read
+        self.assertEqual(4, len(list(lines)))
+
+    def test_quoting_and_escapes(self):
+        content = (
+            '[submodule "my \\"lib\\" \\\\ name"]\n'
+            '  path = "libs/with  spaces"  # comment\n'
+            '  url = ../a\\\\b.git ; comment\n'
+            '  branch = "feature;#1"\n'
+            '  update = a \\\n'
+            '    b\n')
+        self.assertEqual(
+            [_entry('my "lib" \\ name', 'libs/with  spaces', '../a\\b.git',
+                    branch='feature;#1', update='a     b')],
+            list(parse_gitmodules(content)))
+
+    def test_git_config_syntax(self):
+        content = (
+            '# comment\n'
+            '; comment\n'
+            '[core]\n'
+            '\tbare = false\n'
+            '[Submodule "a"] PATH = a\r\n'
+            '\tURL = ../a.git\r\n'
+            '\trecurse\n'
+            '\tpath = b\n'
+            '[submodule "a"]\n'
+            '\tshallow = off\n')
+        self.assertEqual(
+            [_entry('a', 'b', '../a.git', recurse=True)],
+            list(parse_gitmodules(content)))
+
+    def test_legacy_section_headers(self):
+        content = (
+            '[submodule.Lib-1]\n'
+            '\tpath = libs/1\n'
+            '\turl = ../1.git\n'
+            '[submodule "lib-1"]\n'
+            '\tbranch = main\n'
+            '[submodule.v2.0]\n'
+            '\tpath = libs/2\n'
+            '\turl = ../2.git\n'
+            '[core.x]\n'
+            '\tpath = ignored\n')
+        self.assertEqual(
+            [_entry('lib-1', 'libs/1', '../1.git', branch='main'),
+             _entry('v2.0', 'libs/2', '../2.git')],
+            list(parse_gitmodules(content)))
+        with self.assertRaises(RuntimeError):
+            list(parse_gitmodules('[submodule.libs/1]\n\tpath = a\n'))
+
+    def test_errors(self):
+        for content in ('[submodule "a"]\n\tpath = a\n',
+                        '[submodule "a"\n',
+                        '[submodule "a"]\n\tpath = a\n\turl = "a\n',
+                        '[submodule "a"]\n\tpath = a\\x\n\turl = a\n',
+                        '[submodule "a"]\n\tpath = a\n\turl = a\n'
+                        '[submodule "b"]\n\tpath = b\n\turl = b\n'
+                        '[submodule "a"]\n'):
+            with self.subTest(content=content):
+                with self.assertRaises(RuntimeError):
+                    list(parse_gitmodules(content))
+        with self.assertRaises(ValueError):
+            list(parse_gitmodules(
+                '[submodule "a"]\n\tpath = a\n\turl = a\n\tshallow = 2\n'))
@@ -0,0 +1,95 @@
+from unittest.mock import patch
+
+from fake_gitlab import (FakeGitlabTestCase, add_parent_project,
+                         commit_submodules)
+
+from gitlab_submodule import group_subprojects
+from gitlab_submodule.group_subprojects import list_group_subprojects
+
+
+class TestGroupSubprojects(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.fake.add_group('acme')
+        self.expected = {
+            ('acme/parent', path): sha
+            for path, sha in add_parent_project(
+                self.fake, 3, path_with_namespace='acme/parent',
+                with_missing=False).items()}
+        tools = self.fake.add_project('acme/sub/tools')
+        commit_submodules(tools, {
+            'third_party/1': self.fake.find_project('dummy-projects/1')})
+        self.expected[('acme/sub/tools', 'third_party/1')] = \
+            self.expected[('acme/parent', 'libs/1')]
+        for i in range(5):
+            self.fake.add_project(f'acme/plain-{i}').commit(
+                {'README.md': 'no submodules'})
+        self.fake.add_project('acme/empty')
+        disabled = self.fake.add_project('acme/repository-disabled')
+        disabled.commit({'README.md': 'not readable'})
+        disabled.repository_enabled = False
+        self.group = self.gl.groups.get('acme')
+        self.fake.reset_requests()
+
+    def test_list_group_subprojects(self):
+        subprojects = list_group_subprojects(
+            self.group, self.gl, only_gitlab_subprojects=True, max_workers=4)
+        self.assertEqual(
+            self.expected,
+            {(subproject.submodule.parent_project.path_with_namespace,
+              subproject.submodule.path): subproject.commit.id
+             for subproject in subprojects})
+        # one HEAD request per non empty project, no other request for the
+        # projects without .gitmodules or whose repository is disabled
+        self.assertEqual(
+            8, self.fake.count_requests('^HEAD .*/files/.gitmodules$'))
+        self.assertEqual(
+            2, self.fake.count_requests('^GET .*/files/.gitmodules/raw$'))
+        self.assertEqual(
+            0, self.fake.count_requests('/repository/commits/main$'))
+        self.assertEqual(0, self.fake.count_requests('/projects/[^/]+/tree'))
+        for subproject in subprojects:
+            self.assertIsNotNone(subproject.submodule.parent_commit_id)
+
+    def test_list_group_subprojects_without_subgroups(self):
+        subprojects = list_group_subprojects(
+            self.group, self.gl, include_subgroups=False, max_workers=2)
+        self.assertEqual(
+            {'acme/parent'},
+            {subproject.submodule.parent_project.path_with_namespace
+             for subproject in subprojects})
+        self.assertEqual(4, len(subprojects))
+
+    def test_list_group_subprojects_with_iterate_subprojects_parameters(
+            self):
+        subprojects = list_group_subprojects(
+            self.group, self.gl, only_gitlab_subprojects=True, ref='main',
+            ordered=False, pin_ref=False)
+        self.assertEqual(4, len(subprojects))
+        for subproject in subprojects:
+            self.assertEqual('main', subproject.submodule.parent_ref)
+            self.assertIsNone(subproject.submodule.parent_commit_id)
+        with self.assertRaises(TypeError):
+            list_group_subprojects(self.group, self.gl, unknown=True)
+
+    def test_list_group_subprojects_on_plan(self):
+        plans = []
+        list_group_subprojects(self.group, self.gl, on_plan=plans.append)
+        self.assertEqual(
+            ['acme/parent', 'acme/sub/tools'],
+            sorted(plan.project.path_with_namespace for plan in plans))
+        for plan in plans:
+            self.assertIsNotNone(plan.actual_requests)
+
+    def test_list_group_subprojects_bounds_workers(self):
+        with patch.object(group_subprojects, 'ThreadPoolExecutor',
+                          wraps=group_subprojects.ThreadPoolExecutor) as pool:
+            list_group_subprojects(self.group, self.gl, max_workers=3)
+        pool.assert_called_once_with(max_workers=3)
+
+    def test_list_group_subprojects_propagates_errors(self):
+        with patch.object(group_subprojects, 'get_submodule_commit_ids',
+                          side_effect=ValueError('boom')):
+            with self.assertRaises(ValueError):
+                list_group_subprojects(self.group, self.gl, max_workers=2)
@@ -0,0 +1,90 @@
+from fake_gitlab import FakeGitlabTestCase, add_parent_project
+
+from gitlab_submodule.gitlab_submodule import list_subprojects
+from gitlab_submodule.instrumentation import (COMMIT_DIFF_STAGE,
+                                              COMMIT_FETCH_STAGE,
+                                              COMMIT_IDS_STAGE,
+                                              GITMODULES_STAGE, OTHER_STAGE,
+                                              PROJECT_LOOKUP_STAGE, REF_STAGE,
+                                              StageStats, add_call_hook,
+                                              current_stage, get_endpoint,
+                                              stage)
+
+
+class TestInstrumentation(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        add_parent_project(self.fake, 4)
+        self.stats = StageStats()
+        self.addCleanup(add_call_hook(self.gl, self.stats))
+
+    def test_stages_of_a_scan(self):
+        project = self.gl.projects.get('test-projects/parent')
+        list_subprojects(project, self.gl, strategy='tree', max_workers=4)
+        report = self.stats.report()
+        self.assertEqual(
+            {OTHER_STAGE, REF_STAGE, GITMODULES_STAGE, COMMIT_IDS_STAGE,
+             PROJECT_LOOKUP_STAGE, COMMIT_FETCH_STAGE},
+            set(report))
+        # 4 dummy projects + the missing one
+        self.assertEqual(5, report[PROJECT_LOOKUP_STAGE]['calls'])
+        self.assertEqual(1, report[PROJECT_LOOKUP_STAGE]['errors'])
+        self.assertEqual(4, report[COMMIT_FETCH_STAGE]['calls'])
+        # the tree listings are paginated
+        self.assertEqual(report[COMMIT_IDS_STAGE]['calls'],
+                         report[COMMIT_IDS_STAGE]['pages'])
+        self.assertEqual(self.fake.count_requests(),
+                         sum(stats['calls'] for stats in report.values()))
+        self.assertEqual(self.fake.bytes_sent,
+                         sum(stats['bytes'] for stats in report.values()))
+        for stats in report.values():
+            self.assertLessEqual(stats['p50'], stats['p90'])
+            self.assertLessEqual(stats['p90'], stats['p99'])
+            self.assertGreater(stats['latency'], 0)
+        self.assertIn(PROJECT_LOOKUP_STAGE, str(self.stats))
+
+    def test_events(self):
+        project = self.gl.projects.get('test-projects/parent')
+        list_subprojects(project, self.gl, strategy='diff',
+                         only_gitlab_subprojects=True, lazy_commits=True)
+        events = self.stats.events(COMMIT_DIFF_STAGE)
+        self.assertEqual(
+            {('HEAD', '/projects/:id/repository/files/:file_path'),
+             ('GET', '/projects/:id/repository/commits/:sha'),
+             ('GET', '/projects/:id/repository/commits/:sha/diff')},
+            {(event.method, event.endpoint) for event in events})
+        self.assertTrue(all(event.status == 200 for event in events))
+        raw = [event for event in self.stats.events(GITMODULES_STAGE)
+               if event.endpoint.endswith('/raw')]
+        self.assertEqual(1, len(raw))
+        parent = self.fake.find_project('test-projects/parent')
+        self.assertEqual(
+            len(parent.resolve('main').files['.gitmodules'].encode()),
+            raw[0].bytes)
+
+    def test_remove_hook(self):
+        stats = StageStats()
+        remove_hook = add_call_hook(self.gl, stats)
+        self.gl.projects.get('test-projects/parent')
+        remove_hook()
+        self.gl.projects.get('test-projects/parent')
+        self.assertEqual(1, len(stats.events()))
+        stats.reset()
+        self.assertEqual({}, stats.report())
+
+    def test_nested_stages(self):
+        self.assertIsNone(current_stage())
+        with stage('outer'):
+            with stage('inner'):
+                self.assertEqual('inner', current_stage())
+            self.assertEqual('outer', current_stage())
+        self.assertIsNone(current_stage())
+
+    def test_get_endpoint(self):
+        self.assertEqual(
+            '/projects/:id/repository/files/:file_path/raw',
+            get_endpoint('https://gitlab.com/api/v4/projects/a%2Fb/'
+                         'repository/files/.gitmodules/raw?ref=main'))
+        self.assertEqual('/groups/:id/projects', get_endpoint(
+            'https://gitlab.com/api/v4/groups/12/projects'))
@@ -1,6 +1,13 @@
+import pickle
 import unittest
+from unittest.mock import Mock
 
-from gitlab_submodule.objects import Submodule, Subproject
+from fake_gitlab import FakeGitlab
+from gitlab.v4.objects import Project
+
+from gitlab_submodule.objects import (LazyCommit, NestedSubproject, Submodule,
+                                      Subproject)
+from gitlab_submodule.project_manager_utils import get_lazy_project
 
 
 class DictMock(dict):
@@ -42,7 +49,7 @@ class TestObjects(unittest.TestCase):
             update='rebase'
         )
         submodule_dict = dict(submodule)
-        self.assertEqual(len(submodule_dict.keys()), 10)
+        self.assertEqual(len(submodule_dict.keys()), 11)
         self.assertEqual(submodule_dict['parent_ref'], 'main')
         self.assertEqual(submodule_dict['name'], 'test_submodule')
         self.assertEqual(submodule_dict['update'], 'rebase')
@@ -62,6 +69,7 @@ class TestObjects(unittest.TestCase):
             "<class 'Submodule'> => {"
             "'branch': None, 'ignore': None, "
             "'name': 'test_submodule', "
+            "'parent_commit_id': None, "
             "'parent_project': <class 'DictMock'> => {'id': 123456789}, "
             "'parent_ref': 'main', "
             "'path': 'include/test_submodule', "
@@ -84,7 +92,7 @@ class TestObjects(unittest.TestCase):
         self.assertEqual(
             "Submodule ({'id': 123456789}, 'main', 'test_submodule',"
             " 'include/test_submodule', 'git@gitlab.com:test/submodule',"
-            " 'development', None, None, False, False)",
+            " 'development', None, None, False, False, None)",
             repr(submodule)
         )
 
@@ -185,6 +193,7 @@ class TestObjects(unittest.TestCase):
             "    'submodule': <class 'Submodule'> => {"
             "'branch': 'development', 'ignore': None, "
             "'name': 'test_submodule', "
+            "'parent_commit_id': None, "
             "'parent_project': <class 'DictMock'> => {'id': '123456789'}, "
             "'parent_ref': 'main', "
             "'path': 'include/test_submodule', "
@@ -231,7 +240,7 @@ class TestObjects(unittest.TestCase):
         self.assertEqual(
             "    Submodule ({'id': '123456789'}, 'main', 'test_submodule',"
             " 'include/test_submodule', 'git@gitlab.com:test/submodule',"
-            " 'development', None, None, False, False),",
+            " 'development', None, None, False, False, None),",
             str_lines[1]
         )
         self.assertEqual(
@@ -244,3 +253,90 @@ class TestObjects(unittest.TestCase):
             str_lines[3]
         )
         self.assertEqual(')', str_lines[4])
+
+    def test_Subproject_slots(self):
+        submodule = Submodule(
+            parent_project=DictMock(),
+            parent_ref='main',
+            name='test_submodule',
+            url='git@gitlab.com:test/submodule',
+            path='include/test_submodule',
+            parent_commit_id='0123456789'
+        )
+        mock_project = DictMock()
+        mock_project.web_url = 'https://gitlab.com/test/submodule'
+        mock_project.topics = ['topic']
+        subproject = NestedSubproject(submodule, mock_project, None, 2)
+        for obj in (submodule, subproject):
+            # the known attributes are slots, the others still settable
+            self.assertEqual({}, vars(obj))
+            obj.extra = 1
+            self.assertEqual({'extra': 1}, vars(obj))
+
+        # aliases defined as properties, and the other ones
+        self.assertIsInstance(Subproject.project_web_url, property)
+        self.assertEqual('https://gitlab.com/test/submodule',
+                         subproject.project_web_url)
+        self.assertEqual(['topic'], subproject.project_topics)
+        self.assertEqual('0123456789', subproject.submodule_parent_pinned_ref)
+        subproject.project_topics = []
+        self.assertEqual([], mock_project.topics)
+        with self.assertRaises(AttributeError):
+            subproject.commit_id
+        with self.assertRaises(AttributeError):
+            subproject.unknown
+
+        copy = pickle.loads(pickle.dumps(subproject))
+        self.assertEqual(2, copy.depth)
+        self.assertEqual(1, copy.extra)
+        self.assertEqual('include/test_submodule', copy.submodule_path)
+        self.assertEqual(dict(submodule), dict(copy.submodule))
+
+    def test_LazyCommit(self):
+        mock_commit = DictMock()
+        mock_commit.id = '123456789'
+        mock_commit.title = 'title'
+        mock_project = Mock()
+        mock_project.commits.get.return_value = mock_commit
+
+        commit = LazyCommit(mock_project, '123456789')
+        self.assertEqual('123456789', commit.id)
+        self.assertFalse(commit.hydrated)
+        self.assertEqual(
+            "<class 'LazyCommit'> => {'id': '123456789'}", str(commit))
+        self.assertEqual("LazyCommit ('123456789')", repr(commit))
+        mock_project.commits.get.assert_not_called()
+
+        self.assertEqual('title', commit.title)
+        self.assertTrue(commit.hydrated)
+        self.assertEqual('title', commit.title)
+        mock_project.commits.get.assert_called_once_with('123456789')
+        self.assertEqual(mock_commit, commit)
+        with self.assertRaises(AttributeError):
+            commit._missing
+
+
+class TestLazyProject(unittest.TestCase):
+
+    def test_LazyProject(self):
+        with FakeGitlab() as fake:
+            fake.add_project('group/project').commit({'README.md': ''})
+            gl = fake.client()
+            project = get_lazy_project(gl, 'group/project')
+            self.assertIsInstance(project, Project)
+            self.assertEqual('group/project', project.path_with_namespace)
+            sha = fake.find_project('group/project').branches['main']
+            self.assertEqual(sha, project.commits.get('main').id)
+            self.assertEqual(0, fake.count_requests('^GET /api/v4/projects/'
+                                                    '[^/]+$'))
+            self.assertFalse(project.loaded)
+
+            self.assertEqual('project description', project.description)
+            self.assertTrue(project.loaded)
+            self.assertEqual(1, project.id)
+            self.assertEqual(1, fake.count_requests('^GET /api/v4/projects/'
+                                                    '[^/]+$'))
+            with self.assertRaises(AttributeError):
+                project.missing_attribute
+            self.assertEqual(1, fake.count_requests('^GET /api/v4/projects/'
+                                                    '[^/]+$'))
@@ -0,0 +1,182 @@
+import json
+import os
+
+from fake_gitlab import (FakeGitlabTestCase, FakeProject, Gitlink,
+                         add_parent_project)
+
+from gitlab_submodule.objects import LazyCommit
+from gitlab_submodule.push_events import (NULL_SHA, PushEventProcessor,
+                                          get_pushed_paths)
+from gitlab_submodule.request_budget import (RequestBudget,
+                                             RequestBudgetExceeded,
+                                             install_request_budget)
+
+PAYLOAD_PATH = os.path.join(
+    os.path.dirname(__file__), 'payloads', 'push_event.json')
+
+
+def push_payload(project: FakeProject,
+                 before: str,
+                 after: str,
+                 branch: str = 'main') -> dict:
+    """The recorded push payload, replayed for a push of `project` on the
+    fake server."""
+    with open(PAYLOAD_PATH) as f:
+        payload = json.loads(
+            f.read().replace('http://example.com', project.server.url))
+    payload.update(before=before, after=after, checkout_sha=after,
+                   ref=f'refs/heads/{branch}', project_id=project.id)
+    payload['project'].update(id=project.id)
+    commits = []
+    commit = project.commits.get(after)
+    while commit is not None and commit.sha != before:
+        parent_files = commit.parent.files if commit.parent else {}
+        changed = commit.changed_paths()
+        commits.insert(0, dict(
+            payload['commits'][0],
+            id=commit.sha,
+            message=commit.message,
+            title=commit.message,
+            added=[path for path in changed if path not in parent_files],
+            modified=[path for path in changed
+                      if path in parent_files and path in commit.files],
+            removed=[path for path in changed if path not in commit.files]))
+        commit = commit.parent
+    payload['commits'] = commits
+    payload['total_commits_count'] = len(commits)
+    return payload
+
+
+class TestPushEvents(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.expected_commits = add_parent_project(
+            self.fake, 3, with_missing=False, with_external=False)
+        self.parent = self.fake.find_project('test-projects/parent')
+        self.first_sha = self.parent.branches['main']
+        self.processor = PushEventProcessor(self.gl, lazy_commits=True)
+        self.processor.process(
+            push_payload(self.parent, NULL_SHA, self.first_sha))
+        self.fake.reset_requests()
+
+    def _commits(self, snapshot):
+        return {subproject.submodule.path: subproject.commit.id
+                for subproject in snapshot.subprojects}
+
+    def test_first_push_scans_all_submodules(self):
+        snapshot = self.processor.store.get(
+            f'{self.gl.url}/test-projects/parent', 'main')
+        self.assertEqual(self.first_sha, snapshot.commit_id)
+        self.assertEqual(self.expected_commits, self._commits(snapshot))
+
+    def test_unaffected_push(self):
+        self.parent.commit({'README.md': 'v2'})
+        after = self.parent.commit({'docs/index.md': 'docs'})
+        snapshot = self.processor.process(
+            push_payload(self.parent, self.first_sha, after))
+        self.assertEqual(0, self.fake.count_requests())
+        self.assertEqual(after, snapshot.commit_id)
+        self.assertEqual(self.expected_commits, self._commits(snapshot))
+        for subproject in snapshot.subprojects:
+            self.assertEqual('main', subproject.submodule.parent_ref)
+            self.assertEqual(after, subproject.submodule.parent_commit_id)
+
+    def test_submodule_updated(self):
+        dummy = self.fake.find_project('dummy-projects/2')
+        new_sha = dummy.commit({'README.md': 'dummy 2 v2'})
+        after = self.parent.commit({'libs/2': Gitlink(new_sha)})
+        snapshot = self.processor.process(
+            push_payload(self.parent, self.first_sha, after))
+        self.assertEqual(dict(self.expected_commits, **{'libs/2': new_sha}),
+                         self._commits(snapshot))
+        self.assertIsInstance(snapshot.subprojects[1].commit, LazyCommit)
+        self.assertEqual('main', snapshot.subprojects[1].submodule.parent_ref)
+        self.assertEqual(
+            after, snapshot.subprojects[1].submodule.parent_commit_id)
+        # only the compare, which holds the new sha of the submodule
+        self.assertEqual(1, self.fake.count_requests())
+        self.assertEqual(1, self.fake.count_requests('/repository/compare'))
+
+    def test_gitmodules_changed(self):
+        gitmodules = self.parent.resolve('main').files['.gitmodules']
+        after = self.parent.commit({
+            '.gitmodules': gitmodules.split('[submodule "libs/3"]')[0],
+            'libs/3': None})
+        snapshot = self.processor.process(
+            push_payload(self.parent, self.first_sha, after))
+        self.assertEqual({'libs/1', 'libs/2'}, set(self._commits(snapshot)))
+        self.assertEqual(1, self.fake.count_requests('/.gitmodules/raw$'))
+
+    def test_truncated_commit_list(self):
+        after = self.parent.commit({'README.md': 'v2'})
+        payload = push_payload(self.parent, self.first_sha, after)
+        payload['total_commits_count'] = 21
+        self.assertIsNone(get_pushed_paths(payload))
+        snapshot = self.processor.process(payload)
+        self.assertEqual(self.expected_commits, self._commits(snapshot))
+        self.assertEqual(1, self.fake.count_requests('/repository/compare'))
+
+    def test_forced_push(self):
+        after = self.parent.commit({'README.md': 'v2'})
+        self.processor.process(
+            push_payload(self.parent, self.first_sha, after))
+        self.fake.reset_requests()
+        # back to the first commit: GitLab lists no commit
+        payload = dict(push_payload(self.parent, after, self.first_sha),
+                       commits=[], total_commits_count=0)
+        self.assertIsNone(get_pushed_paths(payload))
+        snapshot = self.processor.process(payload)
+        self.assertEqual(self.first_sha, snapshot.commit_id)
+        self.assertEqual(1, self.fake.count_requests('/repository/compare'))
+        # commits that don't lead to the pushed one
+        payload = push_payload(self.parent, self.first_sha, after)
+        payload['after'] = self.parent.commit({'docs/index.md': 'docs'})
+        self.assertIsNone(get_pushed_paths(payload))
+
+    def test_missed_push(self):
+        dummy = self.fake.find_project('dummy-projects/1')
+        new_sha = dummy.commit({'README.md': 'dummy 1 v2'})
+        missed = self.parent.commit({'libs/1': Gitlink(new_sha)})
+        after = self.parent.commit({'README.md': 'v2'})
+        # the stored snapshot is older than `before`: compared from there
+        snapshot = self.processor.process(
+            push_payload(self.parent, missed, after))
+        self.assertEqual(dict(self.expected_commits, **{'libs/1': new_sha}),
+                         self._commits(snapshot))
+        self.assertEqual(1, self.fake.count_requests())
+
+    def test_ignored_events(self):
+        payload = push_payload(self.parent, self.first_sha, self.first_sha)
+        self.assertIsNone(self.processor.process(
+            dict(payload, ref='refs/tags/v1.0')))
+        self.assertIsNone(self.processor.process(
+            dict(payload, object_kind='tag_push')))
+        self.assertEqual(0, self.fake.count_requests())
+
+    def test_branch_deleted(self):
+        self.assertIsNone(self.processor.process(
+            push_payload(self.parent, self.first_sha, NULL_SHA)))
+        self.assertEqual(0, len(self.processor.store))
+        self.assertEqual(0, self.fake.count_requests())
+
+    def test_unknown_host(self):
+        payload = push_payload(self.parent, self.first_sha, self.first_sha)
+        payload['project']['web_url'] = 'https://gitlab.example.org/a/b'
+        with self.assertRaises(ValueError):
+            self.processor.process(payload)
+
+    def test_budget_exceeded(self):
+        key = f'{self.gl.url}/test-projects/parent'
+        previous = self.processor.store.get(key, 'main')
+        dummy = self.fake.find_project('dummy-projects/2')
+        new_sha = dummy.commit({'README.md': 'dummy 2 v2'})
+        gitmodules = self.parent.resolve('main').files['.gitmodules']
+        after = self.parent.commit({'libs/2': Gitlink(new_sha),
+                                    '.gitmodules': gitmodules + '\n'})
+        install_request_budget(self.gl, RequestBudget(1))
+        with self.assertRaises(RequestBudgetExceeded):
+            self.processor.process(
+                push_payload(self.parent, self.first_sha, after))
+        # the partial update isn't stored
+        self.assertIs(previous, self.processor.store.get(key, 'main'))
@@ -0,0 +1,97 @@
+import time
+import unittest
+
+from fake_gitlab import FakeGitlabTestCase
+
+from gitlab_submodule.gitlab_submodule import list_subprojects
+from gitlab_submodule.rate_limit import (RateLimiter, get_retry_after,
+                                         install_rate_limiter)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_unlimited_until_headers(self):
+        limiter = RateLimiter()
+        for _ in range(100):
+            limiter.acquire()
+        self.assertEqual(100, limiter.requests)
+        self.assertEqual(0, limiter.throttled_requests)
+
+    def test_static_rate(self):
+        limiter = RateLimiter(rate=50, burst=1)
+        started = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        # the first request uses the burst, the 5 others wait 20ms each
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+        self.assertEqual(5, limiter.throttled_requests)
+        self.assertGreater(limiter.throttled_seconds, 0.08)
+
+    def test_update_spreads_remaining_requests(self):
+        limiter = RateLimiter()
+        limiter.update({'RateLimit-Remaining': '20',
+                        'RateLimit-Reset': str(time.time() + 10)})
+        self.assertAlmostEqual(2, limiter.rate, places=1)
+        # capped by the configured rate
+        limiter = RateLimiter(rate=1)
+        limiter.update({'RateLimit-Remaining': '20',
+                        'RateLimit-Reset': str(time.time() + 10)})
+        self.assertEqual(1, limiter.rate)
+
+    def test_update_blocks_until_reset(self):
+        limiter = RateLimiter()
+        limiter.update({'RateLimit-Remaining': '0',
+                        'RateLimit-Reset': str(time.time() + 0.2)})
+        started = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+        self.assertEqual(1, limiter.throttled_requests)
+
+    def test_ignores_missing_headers(self):
+        limiter = RateLimiter()
+        limiter.update({'RateLimit-Remaining': 'abc'})
+        self.assertIsNone(limiter.rate)
+
+    def test_get_retry_after(self):
+        self.assertEqual(3, get_retry_after({'Retry-After': '3'}))
+        self.assertEqual(1, get_retry_after({}))
+        self.assertEqual(0, get_retry_after(
+            {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}))
+
+
+class TestRateLimitedClient(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.add_parent_project(8, with_missing=False,
+                                with_external=False)
+        self.fake.rate_limit = 6
+        self.fake.rate_limit_period = 1
+        self.fake.reset_requests()
+
+    def test_paces_concurrent_scan(self):
+        limiter = install_rate_limiter(self.gl)
+        # responses seen by python-gitlab, which would sleep on a 429
+        statuses = []
+        self.gl.session.hooks['response'].append(
+            lambda response, *_, **__: statuses.append(response.status_code))
+        subprojects = list_subprojects(self.project, self.gl, max_workers=4,
+                                       strategy='recursive_tree')
+        self.assertEqual(
+            self.expected_commits,
+            {subproject.submodule.path: subproject.commit.id
+             for subproject in subprojects})
+        self.assertGreater(limiter.throttled_seconds, 0)
+        self.assertNotIn(429, statuses)
+        # including the retries of rejected requests
+        self.assertEqual(limiter.requests, self.fake.count_requests())
+
+    def test_shared_limiter(self):
+        limiter = RateLimiter()
+        other_gl = self.fake.client()
+        self.assertIs(limiter, install_rate_limiter(self.gl, limiter))
+        self.assertIs(limiter, install_rate_limiter(other_gl.projects,
+                                                    limiter))
+        self.gl.projects.get('test-projects/parent')
+        other_gl.projects.get('test-projects/parent')
+        self.assertEqual(2, limiter.requests)
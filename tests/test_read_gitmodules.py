@@ -1,5 +1,6 @@
 import unittest
 
+from fake_gitlab import FakeGitlabTestCase, add_parent_project
 from gitlab import Gitlab
 
 from gitlab_submodule.read_gitmodules import list_project_submodules
@@ -45,3 +46,26 @@ class TestReadGitmodules(unittest.TestCase):
              'git://git.code.sf.net/p/scribus/code',
              'ssh://git@github.com:/opencv/opencv.git'},
             {submodule.url for submodule in submodules})
+
+
+class TestReadGitmodulesRaw(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        add_parent_project(self.fake, 2)
+        self.fake.add_project('test-projects/no-submodules').commit(
+            {'README.md': 'no submodules here'})
+        self.fake.reset_requests()
+
+    def test_gitmodules_read_from_raw_endpoint(self):
+        project = self.gl.projects.get('test-projects/parent')
+        submodules = list_project_submodules(project)
+        self.assertEqual(['libs/1', 'libs/2', 'missing', 'external'],
+                         [submodule.path for submodule in submodules])
+        self.assertEqual(1, self.fake.count_requests(
+            '^GET .*/repository/files/.gitmodules/raw$'))
+        self.assertEqual(2, self.fake.count_requests())
+
+    def test_no_gitmodules(self):
+        project = self.gl.projects.get('test-projects/no-submodules')
+        self.assertEqual([], list_project_submodules(project))
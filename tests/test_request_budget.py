@@ -0,0 +1,108 @@
+from fake_gitlab import AsyncFakeGitlabTestCase, FakeGitlabTestCase
+
+from gitlab_submodule.async_gitlab_submodule import async_iterate_subprojects
+from gitlab_submodule.gitlab_submodule import (iterate_nested_subprojects,
+                                               iterate_subprojects,
+                                               list_subprojects)
+from gitlab_submodule.project_manager_utils import get_project_key
+from gitlab_submodule.request_budget import (RequestBudget,
+                                             RequestBudgetExceeded,
+                                             async_until_budget_exceeded,
+                                             install_request_budget,
+                                             until_budget_exceeded)
+from gitlab_submodule.reverse_index import ReverseIndex
+
+
+class TestRequestBudget(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.add_parent_project(4, with_missing=False)
+        self.fake.reset_requests()
+
+    def test_spend(self):
+        budget = RequestBudget(2)
+        budget.spend()
+        budget.spend()
+        self.assertEqual(0, budget.remaining)
+        self.assertFalse(budget.exhausted)
+        with self.assertLogs('gitlab_submodule.request_budget', 'WARNING'):
+            with self.assertRaises(RequestBudgetExceeded):
+                budget.spend()
+        self.assertTrue(budget.exhausted)
+        self.assertEqual(2, budget.spent)
+
+    def test_raises_by_default(self):
+        budget = install_request_budget(self.gl, RequestBudget(8))
+        with self.assertRaises(RequestBudgetExceeded):
+            list_subprojects(self.project, self.gl, strategy='tree')
+        self.assertTrue(budget.exhausted)
+
+    def test_partial_results(self):
+        budget = install_request_budget(self.gl, RequestBudget(8))
+        # ref + .gitmodules + tree, then project + commit per submodule
+        subprojects = list(until_budget_exceeded(iterate_subprojects(
+            self.project, self.gl, strategy='tree')))
+        self.assertEqual(['libs/1', 'libs/2'],
+                         [subproject.submodule.path
+                          for subproject in subprojects])
+        self.assertTrue(budget.exhausted)
+        self.assertEqual(8, self.fake.count_requests())
+
+    def test_partial_results_concurrently(self):
+        budget = install_request_budget(self.gl, RequestBudget(8))
+        subprojects = list(until_budget_exceeded(iterate_subprojects(
+            self.project, self.gl, strategy='tree', max_workers=4)))
+        self.assertLess(len(subprojects), 5)
+        self.assertTrue(budget.exhausted)
+        self.assertEqual(8, self.fake.count_requests())
+
+    def test_budget_spent_before_scan(self):
+        install_request_budget(self.gl, RequestBudget(0))
+        self.assertEqual([], list(until_budget_exceeded(
+            iterate_subprojects(self.project, self.gl))))
+        self.assertEqual([], list(until_budget_exceeded(
+            iterate_nested_subprojects(self.project, self.gl))))
+        self.assertEqual(0, self.fake.count_requests())
+
+    def test_large_budget(self):
+        budget = install_request_budget(self.gl, RequestBudget(1000))
+        self.assertEqual(5, len(list_subprojects(self.project, self.gl)))
+        self.assertFalse(budget.exhausted)
+        self.assertEqual(self.fake.count_requests(), budget.spent)
+
+    def test_partial_scan_not_indexed(self):
+        index = ReverseIndex()
+        index.update_parent(self.project, self.gl)
+        pins = index.dependents(self.gl.projects.get('dummy-projects/1'))
+        self.assertEqual(1, len(pins))
+        install_request_budget(self.gl, RequestBudget(5))
+        with self.assertRaises(RequestBudgetExceeded):
+            index.update_parent(self.project, self.gl)
+        self.assertEqual(5, len(index))
+        self.assertEqual([get_project_key(self.project)],
+                         [parent for parent, _ in index.parents])
+
+
+class TestAsyncRequestBudget(AsyncFakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.add_parent_project(4, with_missing=False)
+        self.budget = install_request_budget(self.gl, RequestBudget(8))
+
+    async def test_raises_by_default(self):
+        with self.assertRaises(RequestBudgetExceeded):
+            async for _ in async_iterate_subprojects(
+                    self.project, self.gl, strategy='tree',
+                    max_concurrency=1):
+                pass
+
+    async def test_partial_results(self):
+        subprojects = [
+            subproject async for subproject in async_until_budget_exceeded(
+                async_iterate_subprojects(self.project, self.gl,
+                                          strategy='tree',
+                                          max_concurrency=1))]
+        self.assertLess(len(subprojects), 5)
+        self.assertTrue(self.budget.exhausted)
@@ -0,0 +1,106 @@
+from fake_gitlab import FakeGitlabTestCase, Gitlink
+
+from gitlab_submodule.resolution_plan import plan_submodule_commit_ids
+
+
+class TestResolutionPlan(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        files = {f'docs/page_{i}.md': str(i) for i in range(250)}
+        files['top'] = Gitlink('a' * 40)
+        self.expected_commits = {'top': 'a' * 40}
+        for i in range(12):
+            files[f'components/c{i}/README.md'] = str(i)
+            files[f'components/c{i}/sub'] = Gitlink(f'{i:040x}')
+            self.expected_commits[f'components/c{i}/sub'] = f'{i:040x}'
+        self.fake.add_project('test-projects/layout').commit(files)
+        self.project = self.gl.projects.get('test-projects/layout')
+        self.fake.reset_requests()
+
+    def test_single_directory_uses_tree(self):
+        plan = plan_submodule_commit_ids(self.project, ['top'])
+        self.assertEqual('tree', plan.strategy)
+        self.assertEqual({'diff': 3, 'tree': 1}, plan.estimates)
+        # the first page of the root listing, reused by `execute()`
+        self.assertEqual(1, plan.planning_requests)
+        self.assertEqual({'top': 'a' * 40}, plan.execute())
+        self.assertEqual(1, plan.actual_requests)
+        self.assertEqual(1, self.fake.count_requests())
+
+    def test_fan_out_uses_recursive_tree(self):
+        paths = [path for path in self.expected_commits if path != 'top']
+        plan = plan_submodule_commit_ids(self.project, paths)
+        self.assertEqual('recursive_tree', plan.strategy)
+        # the directories weren't probed, as they take at least 12 requests
+        self.assertEqual(
+            {'diff': 36, 'recursive_tree': 1, 'tree': 12}, plan.estimates)
+        commit_ids = plan.execute()
+        self.assertEqual(
+            {path: self.expected_commits[path] for path in paths},
+            commit_ids)
+        self.assertEqual(plan.estimated_requests, plan.actual_requests)
+        self.assertEqual(1, self.fake.count_requests())
+        self.assertIn("'recursive_tree', estimated=1, actual=1", repr(plan))
+
+    def test_large_recursive_tree_uses_tree(self):
+        # the recursive listing of the root has ~290 entries (3 pages)
+        paths = ['top', 'components/c0/sub', 'components/c1/sub']
+        plan = plan_submodule_commit_ids(self.project, paths)
+        self.assertEqual('tree', plan.strategy)
+        self.assertEqual(
+            {'diff': 9, 'recursive_tree': 3, 'tree': 3}, plan.estimates)
+        self.assertEqual(
+            {path: self.expected_commits[path] for path in paths},
+            plan.execute())
+        # the first page of the recursive listing was fetched for nothing
+        self.assertEqual(4, plan.estimated_requests)
+        self.assertEqual(4, plan.actual_requests)
+        self.assertEqual(4, self.fake.count_requests())
+
+    def test_tree_pages(self):
+        files = {f'file_{i}.md': str(i) for i in range(450)}
+        files.update({'a': Gitlink('a' * 40), 'b': Gitlink('b' * 40),
+                      'z': Gitlink('c' * 40)})
+        self.fake.add_project('test-projects/flat').commit(files)
+        project = self.gl.projects.get('test-projects/flat')
+        plan = plan_submodule_commit_ids(project, ['a', 'z'])
+        self.assertEqual('tree', plan.strategy)
+        self.assertEqual({'diff': 6, 'tree': 5}, plan.estimates)
+        self.assertEqual({'a': 'a' * 40, 'z': 'c' * 40}, plan.execute())
+        self.assertEqual(5, plan.actual_requests)
+
+        # the listing stops once all the paths are found
+        plan = plan_submodule_commit_ids(project, ['a', 'b'])
+        self.assertEqual({'a': 'a' * 40, 'b': 'b' * 40}, plan.execute())
+        self.assertEqual(5, plan.estimated_requests)
+        self.assertEqual(1, plan.actual_requests)
+
+        # cheaper to read the diff of a single path
+        plan = plan_submodule_commit_ids(project, ['z'])
+        self.assertEqual('diff', plan.strategy)
+        self.assertEqual(4, plan.estimated_requests)
+
+    def test_forced_strategy(self):
+        plan = plan_submodule_commit_ids(
+            self.project, list(self.expected_commits),
+            strategy='recursive_tree')
+        self.assertEqual({'diff': 39, 'recursive_tree': 3}, plan.estimates)
+        self.assertEqual(self.expected_commits, plan.execute())
+        self.assertEqual(3, plan.actual_requests)
+
+        plan = plan_submodule_commit_ids(
+            self.project, list(self.expected_commits), strategy='tree')
+        # all the directories are probed
+        self.assertEqual(13, plan.planning_requests)
+        self.assertEqual(13, plan.estimates['tree'])
+        self.assertEqual(self.expected_commits, plan.execute())
+        self.assertEqual(13, plan.actual_requests)
+
+        plan = plan_submodule_commit_ids(
+            self.project, list(self.expected_commits), strategy='diff')
+        self.assertEqual({}, plan.execute())
+        self.assertEqual(0, plan.actual_requests)
+
+        with self.assertRaises(ValueError):
+            plan_submodule_commit_ids(self.project, [], strategy='unknown')
@@ -0,0 +1,95 @@
+import os
+import tempfile
+
+from fake_gitlab import (FakeGitlabTestCase, add_parent_project,
+                         commit_submodules)
+
+from gitlab_submodule.reverse_index import Dependent, ReverseIndex
+
+
+class TestReverseIndex(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.commits = add_parent_project(self.fake, 2)
+        self.tools = self.fake.add_project('test-projects/tools')
+        commit_submodules(self.tools, {
+            'vendor/lib': self.fake.find_project('dummy-projects/2')})
+        self.projects = [self.gl.projects.get('test-projects/parent'),
+                         self.gl.projects.get('test-projects/tools')]
+        self.dummy_2 = self.gl.projects.get('dummy-projects/2')
+        self.index = ReverseIndex()
+        self.index.build(self.projects, self.gl, max_workers=2)
+        self.host = self.fake.url
+
+    def test_dependents(self):
+        self.fake.reset_requests()
+        self.assertEqual(
+            sorted([
+                Dependent(f'{self.host}/test-projects/parent', 'main',
+                          'libs/2', self.commits['libs/2']),
+                Dependent(f'{self.host}/test-projects/tools', 'main',
+                          'vendor/lib', self.commits['libs/2']),
+            ], key=repr),
+            sorted(self.index.dependents(self.dummy_2), key=repr))
+        self.assertEqual(
+            self.index.dependents(self.dummy_2),
+            self.index.dependents(f'{self.host}/Dummy-Projects/2'))
+        self.assertEqual(
+            [Dependent(f'{self.host}/test-projects/parent', 'main',
+                       'external', '1' * 40)],
+            self.index.dependents('https://github.com/opencv/opencv.git'))
+        self.assertEqual([], self.index.dependents('unknown'))
+        self.assertEqual(0, self.fake.count_requests())
+
+    def test_update_parent(self):
+        dummy_3 = self.fake.add_project('dummy-projects/3')
+        dummy_3.commit({'README.md': 'dummy 3'})
+        commit_submodules(self.tools, {'vendor/lib': dummy_3})
+        self.fake.reset_requests()
+        self.index.update_parent(self.projects[1], self.gl)
+        # only the tools project was scanned
+        self.assertEqual(
+            0, self.fake.count_requests('test-projects%2Fparent'))
+        self.assertEqual(
+            [f'{self.host}/test-projects/parent'],
+            [dependent.parent
+             for dependent in self.index.dependents(self.dummy_2)])
+        self.assertEqual(
+            [f'{self.host}/test-projects/tools'],
+            [dependent.parent for dependent in self.index.dependents(
+                f'{self.host}/dummy-projects/3')])
+        self.assertEqual(
+            self.tools.branches['main'],
+            self.index.parents[(f'{self.host}/test-projects/tools', 'main')])
+
+        self.index.remove_parent(f'{self.host}/test-projects/tools', 'main')
+        self.assertEqual(
+            [], self.index.dependents(f'{self.host}/dummy-projects/3'))
+        self.assertEqual(1, len(self.index.parents))
+
+    def test_build_with_empty_project(self):
+        self.fake.add_project('test-projects/empty')
+        empty = self.gl.projects.get('test-projects/empty')
+        self.assertIsNone(empty.default_branch)
+        index = ReverseIndex()
+        index.build(self.projects + [empty], self.gl, max_workers=2)
+        self.assertEqual(2, len(index.parents))
+        self.assertEqual(2, len(index.dependents(self.dummy_2)))
+        # a deleted branch is removed from the index
+        self.index.update_parent(self.projects[1], self.gl, ref='deleted')
+        self.assertEqual(2, len(self.index.parents))
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index.json')
+            self.index.save(path)
+            loaded = ReverseIndex.load(path)
+        self.assertEqual(self.index.parents, loaded.parents)
+        self.assertEqual(len(self.index), len(loaded))
+        self.assertEqual(
+            sorted(self.index.dependents(self.dummy_2), key=repr),
+            sorted(loaded.dependents(self.dummy_2), key=repr))
+        # incremental updates still work after loading
+        loaded.remove_parent(f'{self.host}/test-projects/parent', 'main')
+        self.assertEqual(1, len(loaded.dependents(self.dummy_2)))
@@ -0,0 +1,85 @@
+from fake_gitlab import FakeGitlabTestCase, Gitlink, add_parent_project
+
+from gitlab_submodule.cache import ProjectCache, SubmoduleCache
+from gitlab_submodule.gitlab_submodule import list_subprojects
+from gitlab_submodule.scan_estimate import estimate_subprojects
+
+
+class TestScanEstimate(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.add_parent_project(4, with_missing=False)
+
+    def assert_estimate_is_exact(self, **kwargs):
+        self.fake.reset_requests()
+        estimate = estimate_subprojects(self.project, self.gl, **kwargs)
+        self.assertEqual(self.fake.count_requests(), estimate.spent_requests)
+        self.fake.reset_requests()
+        subprojects = list_subprojects(self.project, self.gl, **kwargs)
+        self.assertEqual(5, len(subprojects))
+        self.assertEqual(self.fake.count_requests(), estimate.requests)
+        return estimate
+
+    def test_strategies(self):
+        for strategy in ('diff', 'tree', 'recursive_tree', 'auto'):
+            with self.subTest(strategy=strategy):
+                self.assert_estimate_is_exact(strategy=strategy)
+
+    def test_per_submodule(self):
+        estimate = self.assert_estimate_is_exact(strategy='diff')
+        self.assertEqual('diff', estimate.strategy)
+        # HEAD + last commit + diff, then project + commit
+        self.assertEqual(5, estimate.submodule_requests['libs/1'])
+        # not hosted on GitLab: no project nor full commit
+        self.assertEqual(3, estimate.submodule_requests['external'])
+        # ref + .gitmodules
+        self.assertEqual(2, estimate.shared_requests)
+
+    def test_lazy_commits_and_graphql(self):
+        estimate = self.assert_estimate_is_exact(
+            strategy='tree', lazy_commits=True, use_graphql=True)
+        self.assertEqual(0, sum(estimate.submodule_requests.values()))
+
+    def test_caches(self):
+        cache = SubmoduleCache()
+        project_cache = ProjectCache()
+        list_subprojects(self.project, self.gl, strategy='tree',
+                         cache=cache, project_cache=project_cache)
+        stats = (project_cache.hits, project_cache.misses)
+        estimate = estimate_subprojects(
+            self.project, self.gl, strategy='tree', cache=cache,
+            project_cache=project_cache)
+        # the estimate doesn't count as cache lookups
+        self.assertEqual(stats, (project_cache.hits, project_cache.misses))
+        estimate = self.assert_estimate_is_exact(
+            strategy='tree', cache=cache, project_cache=project_cache)
+        # only the ref and the full commits
+        self.assertEqual(1, estimate.shared_requests)
+        self.assertEqual(1, estimate.submodule_requests['libs/1'])
+
+    def test_missing_repo(self):
+        add_parent_project(self.fake, 2, 'test-projects/other')
+        project = self.gl.projects.get('test-projects/other')
+        estimate = estimate_subprojects(project, self.gl, strategy='tree')
+        self.fake.reset_requests()
+        list_subprojects(project, self.gl, strategy='tree')
+        # the missing repo is only found out during the scan
+        self.assertEqual(self.fake.count_requests() + 1, estimate.requests)
+
+    def test_paginated_diff(self):
+        # libs/1 is updated along with 45 files listed before it in the diff
+        files = {f'docs/page_{i}.md': str(i) for i in range(45)}
+        files['libs/1'] = Gitlink('2' * 40)
+        self.fake.find_project('test-projects/parent').commit(files)
+        estimate = estimate_subprojects(self.project, self.gl,
+                                        strategy='diff', lazy_commits=True)
+        self.fake.reset_requests()
+        list_subprojects(self.project, self.gl, strategy='diff',
+                         lazy_commits=True)
+        # only the first of the 3 pages of the diff is counted
+        self.assertEqual(estimate.requests + 2, self.fake.count_requests())
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            estimate_subprojects(self.project, self.gl, strategy='unknown')
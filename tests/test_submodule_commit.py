@@ -2,12 +2,14 @@ import logging
 import unittest
 from unittest.mock import Mock
 
+from fake_gitlab import FakeGitlabTestCase, Gitlink, add_parent_project
 from gitlab import Gitlab
 from gitlab.v4.objects import ProjectCommit
 
 from gitlab_submodule.read_gitmodules import list_project_submodules
 from gitlab_submodule.submodule_commit import (_get_submodule_commit_id,
-                                               get_submodule_commit)
+                                               get_submodule_commit,
+                                               get_submodule_commit_ids)
 from gitlab_submodule.submodule_to_project import submodule_to_project
 
 
@@ -111,3 +113,62 @@ class TestSubmoduleCommit(unittest.TestCase):
             self.assertIn('the submodule has a too large diff (1000 files).',
                           log.output[0])
         self.assertIsNone(submodule_commit)
+
+
+class TestSubmoduleCommitIdsFromTree(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.expected_commits = add_parent_project(
+            self.fake, 3, with_missing=False, with_external=False)
+        parent = self.fake.find_project('test-projects/parent')
+        # large commit pinning two more submodules in another directory
+        files = {f'generated/file_{i}.txt': str(i) for i in range(150)}
+        files['vendor/a/x'] = Gitlink('a' * 40)
+        files['top'] = Gitlink('b' * 40)
+        parent.commit(files)
+        self.expected_commits.update({'vendor/a/x': 'a' * 40,
+                                      'top': 'b' * 40})
+        self.project = self.gl.projects.get('test-projects/parent')
+        self.fake.reset_requests()
+
+    def test_get_submodule_commit_ids_lists_each_directory_once(self):
+        plans = []
+        commit_ids = get_submodule_commit_ids(
+            self.project, list(self.expected_commits) + ['not/a/submodule'],
+            strategy='tree', on_plan=plans.append)
+        self.assertEqual(self.expected_commits, commit_ids)
+        self.assertEqual(4, self.fake.count_requests())
+        self.assertEqual(4, self.fake.count_requests('/repository/tree$'))
+        self.assertEqual('tree', plans[0].strategy)
+        self.assertEqual(4, plans[0].actual_requests)
+
+    def test_get_submodule_commit_ids_diff_strategy(self):
+        self.assertEqual({}, get_submodule_commit_ids(
+            self.project, self.expected_commits, strategy='diff'))
+        self.assertEqual(0, self.fake.count_requests())
+        with self.assertRaises(ValueError):
+            get_submodule_commit_ids(self.project, [], strategy='unknown')
+
+    def test_get_submodule_commit_with_known_commit_id(self):
+        submodule = list_project_submodules(self.project)[0]
+        self.fake.reset_requests()
+        commit = get_submodule_commit(submodule, commit_id='c' * 40)
+        self.assertEqual('c' * 40, commit.id)
+        self.assertEqual(0, self.fake.count_requests())
+
+    def test_tree_resolves_submodules_beyond_diff_limits(self):
+        # the commit that added vendor/a/x has a 152 files diff
+        self.assertEqual('a' * 40, _get_submodule_commit_id(
+            self.project, 'vendor/a/x'))
+        self.assertEqual('a' * 40, get_submodule_commit_ids(
+            self.project, ['vendor/a/x'])['vendor/a/x'])
+
+    def test_get_submodule_commit_id_only_reads_headers(self):
+        self.assertEqual(self.expected_commits['libs/1'],
+                         _get_submodule_commit_id(self.project, 'libs/1'))
+        self.assertEqual(
+            1, self.fake.count_requests('^HEAD .*/repository/files/libs%2F1$'))
+        self.assertEqual(0, self.fake.count_requests('^GET .*/files/'))
+        with self.assertRaises(FileNotFoundError):
+            _get_submodule_commit_id(self.project, 'not/a/submodule')
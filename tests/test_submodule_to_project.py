@@ -1,13 +1,20 @@
 from unittest import TestCase
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
+from fake_gitlab import FakeGitlabTestCase, add_parent_project
 from gitlab import Gitlab
-from gitlab.v4.objects import ProjectManager
+from gitlab.exceptions import GitlabHttpError
+from gitlab.v4.objects import Project, ProjectManager
 
 from gitlab_submodule import Submodule
+from gitlab_submodule import submodule_to_project as module
+from gitlab_submodule.gitlab_submodule import list_subprojects
+from gitlab_submodule.read_gitmodules import list_project_submodules
 from gitlab_submodule.submodule_to_project import host_url_to_domain
 from gitlab_submodule.submodule_to_project import (
-    match_submodule_to_client_and_format_project_path)
+    HostResolver, get_projects_by_path,
+    match_submodule_to_client_and_format_project_path, submodule_to_project,
+    submodules_to_projects)
 
 
 def test_host_url_to_domain():
@@ -57,3 +64,117 @@ class TestSubmoduleToProject(TestCase):
             )
         self.assertEqual(path_with_namespace, 'namespace/repo')
         self.assertEqual(client, self_hosted_client)
+
+
+class TestSubmodulesToProjectsWithGraphQL(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        add_parent_project(self.fake, 7)
+        project = self.gl.projects.get('test-projects/parent')
+        self.submodules = list_project_submodules(project)
+        self.fake.reset_requests()
+
+    def test_get_projects_by_path(self):
+        projects = get_projects_by_path(self.submodules, self.gl,
+                                        batch_size=5)
+        self.assertEqual(2, self.fake.count_requests())
+        self.assertEqual(2, self.fake.count_requests('^POST /api/graphql$'))
+        self.assertEqual(7, len(projects))
+        project = projects[(self.fake.url, 'dummy-projects/3')]
+        self.assertIsInstance(project, Project)
+        self.assertEqual('dummy-projects/3', project.path_with_namespace)
+        self.assertEqual('main', project.default_branch)
+        self.assertEqual(self.gl.projects.get('dummy-projects/3'), project)
+
+    def test_submodule_to_project_with_prefetched_projects(self):
+        projects = get_projects_by_path(self.submodules, self.gl)
+        self.fake.reset_requests()
+        for submodule in self.submodules[:7]:
+            path = f'dummy-projects/{submodule.name[len("libs/"):]}'
+            self.assertIs(projects[(self.fake.url, path)],
+                          submodule_to_project(submodule, self.gl, projects))
+        self.assertEqual(0, self.fake.count_requests())
+        # missing repo: falls back to REST
+        with self.assertRaises(FileNotFoundError):
+            submodule_to_project(self.submodules[7], self.gl, projects)
+        self.assertEqual(1, self.fake.count_requests('^GET /api/v4/'))
+        self.assertIsNone(
+            submodule_to_project(self.submodules[8], self.gl, projects))
+
+    def test_submodules_to_projects_falls_back_to_rest(self):
+        self.gl.http_post = MagicMock(side_effect=GitlabHttpError('boom'))
+        with self.assertRaises(FileNotFoundError):
+            submodules_to_projects(self.submodules, self.gl)
+        projects = submodules_to_projects(self.submodules[:7], self.gl)
+        self.assertEqual(
+            [f'dummy-projects/{i}' for i in range(1, 8)],
+            [project.path_with_namespace for project in projects])
+        self.assertEqual(7 + 8, self.fake.count_requests('^GET /api/v4/'))
+
+
+class TestHostResolver(TestCase):
+
+    def setUp(self) -> None:
+        self.gitlab_com = Gitlab()
+        self.with_root = Gitlab('https://example.org/gitlab')
+        self.resolver = HostResolver([self.gitlab_com, self.with_root])
+
+    def assert_resolves(self, url, gl, path_with_namespace):
+        self.assertEqual((gl.projects, path_with_namespace),
+                         self.resolver.resolve(url))
+
+    def test_fast_path(self):
+        with patch.object(module, 'parse', wraps=module.parse) as parse:
+            self.assert_resolves('git@gitlab.com:group/sub/repo.git',
+                                 self.gitlab_com, 'group/sub/repo')
+            self.assert_resolves('https://gitlab.com/group/repo',
+                                 self.gitlab_com, 'group/repo')
+            self.assert_resolves('https://example.org/gitlab/group/repo.git',
+                                 self.with_root, 'group/repo')
+            self.assertIsNone(
+                self.resolver.resolve('https://github.com/group/repo.git'))
+            # the ssh urls don't contain the relative url root
+            self.assertIsNone(
+                self.resolver.resolve('git@example.org:group/repo.git'))
+        parse.assert_not_called()
+
+    def test_fallback_to_giturlparse(self):
+        with patch.object(module, 'parse', wraps=module.parse) as parse:
+            self.assert_resolves(
+                'ssh://git@gitlab.com:/CalcProgrammer1/OpenRGB.git',
+                self.gitlab_com, 'CalcProgrammer1/OpenRGB')
+            self.assert_resolves('https://user@gitlab.com/group/repo.git/',
+                                 self.gitlab_com, 'group/repo')
+            self.assertIsNone(
+                self.resolver.resolve('git://git.code.sf.net/p/scribus/code'))
+        self.assertEqual(3, parse.call_count)
+
+    def test_memoized(self):
+        url = 'ssh://git@gitlab.com:/group/repo.git'
+        with patch.object(module, 'parse', wraps=module.parse) as parse:
+            for _ in range(3):
+                self.assert_resolves(url, self.gitlab_com, 'group/repo')
+        parse.assert_called_once()
+
+    def test_several_domains_match(self):
+        resolver = HostResolver([Gitlab('https://example.org'),
+                                 self.with_root])
+        with self.assertRaises(ValueError):
+            resolver.resolve('https://example.org/gitlab/group/repo.git')
+
+
+class TestHostResolverPerScan(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        add_parent_project(self.fake, 3)
+
+    def test_one_resolver_per_scan(self):
+        project = self.gl.projects.get('test-projects/parent')
+        with patch.object(module, 'map_domain_to_clients',
+                          wraps=module.map_domain_to_clients) as mapping:
+            subprojects = list_subprojects(project, [self.gl, Gitlab()],
+                                           use_graphql=True)
+        self.assertEqual(4, len(subprojects))
+        mapping.assert_called_once()
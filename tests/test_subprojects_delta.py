@@ -0,0 +1,79 @@
+from fake_gitlab import FakeGitlabTestCase, Gitlink
+
+from gitlab_submodule.gitlab_submodule import list_subprojects
+from gitlab_submodule.objects import LazyCommit
+from gitlab_submodule.subprojects_delta import update_subprojects
+
+
+class TestUpdateSubprojects(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.add_parent_project(4)
+        self.parent = self.fake.find_project('test-projects/parent')
+        self.previous = list_subprojects(self.project, self.gl)
+        self.fake.reset_requests()
+
+    def _commits(self, subprojects):
+        return {subproject.submodule.path: subproject.commit.id
+                for subproject in subprojects}
+
+    def test_same_commit(self):
+        subprojects = update_subprojects(self.project, self.gl, self.previous)
+        self.assertEqual(len(self.previous), len(subprojects))
+        for subproject, previous in zip(subprojects, self.previous):
+            self.assertIs(previous, subproject)
+        self.assertEqual(1, self.fake.count_requests())
+
+    def test_no_submodule_changed(self):
+        new_commit_id = self.parent.commit({'README.md': 'updated'})
+        subprojects = update_subprojects(self.project, self.gl, self.previous)
+        # resolve the branch + compare
+        self.assertEqual(2, self.fake.count_requests())
+        self.assertEqual(1, self.fake.count_requests('/repository/compare$'))
+        self.assertEqual(self._commits(self.previous),
+                         self._commits(subprojects))
+        for subproject, previous in zip(subprojects, self.previous):
+            self.assertIs(previous.project, subproject.project)
+            self.assertEqual('main', subproject.submodule.parent_ref)
+            self.assertEqual(new_commit_id,
+                             subproject.submodule.parent_commit_id)
+
+    def test_submodule_updated(self):
+        dummy = self.fake.find_project('dummy-projects/2')
+        new_sha = dummy.commit({'README.md': 'dummy 2 v2'})
+        self.parent.commit({'libs/2': Gitlink(new_sha)})
+        subprojects = update_subprojects(self.project, self.gl, self.previous,
+                                         lazy_commits=True)
+        self.assertEqual(dict(self._commits(self.previous), **{
+            'libs/2': new_sha}), self._commits(subprojects))
+        self.assertIsInstance(subprojects[1].commit, LazyCommit)
+        # the new sha was read from the compare diff
+        self.assertEqual(2, self.fake.count_requests())
+
+    def test_gitmodules_changed(self):
+        dummy = self.fake.add_project('dummy-projects/new')
+        new_sha = dummy.commit({'README.md': 'new'})
+        gitmodules = self.parent.resolve('main').files['.gitmodules']
+        self.parent.commit({
+            '.gitmodules': gitmodules + (
+                '[submodule "libs/new"]\n'
+                '\tpath = libs/new\n'
+                '\turl = ../../dummy-projects/new.git\n'),
+            'libs/new': Gitlink(new_sha)})
+        subprojects = update_subprojects(self.project, self.gl, self.previous,
+                                         only_gitlab_subprojects=True)
+        expected = dict(self.expected_commits, **{'libs/new': new_sha})
+        self.assertEqual(expected, self._commits(subprojects))
+        self.assertEqual(
+            1, self.fake.count_requests('/.gitmodules/raw$'))
+        # only the projects of the new submodule and of the submodule that
+        # couldn't be resolved before are requested
+        self.assertEqual(
+            2, self.fake.count_requests('^GET /api/v4/projects/[^/]+$'))
+
+    def test_without_previous_commit(self):
+        subprojects = update_subprojects(self.project, self.gl, [])
+        self.assertEqual(self._commits(self.previous),
+                         self._commits(subprojects))
+        self.assertEqual(0, self.fake.count_requests('/repository/compare'))
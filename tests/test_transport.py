@@ -0,0 +1,63 @@
+from fake_gitlab import FakeGitlabTestCase
+
+from gitlab_submodule.gitlab_submodule import list_subprojects
+from gitlab_submodule.rate_limit import RateLimitedAdapter
+from gitlab_submodule.transport import TransportManager
+
+
+class TestTransportManager(FakeGitlabTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.add_parent_project(20, with_missing=False,
+                                with_external=False)
+        self.gl.session.close()
+        self.fake.connections = 0
+        self.fake.reset_requests()
+
+    def _scan(self, max_workers: int):
+        subprojects = list_subprojects(self.project, self.gl,
+                                       max_workers=max_workers)
+        self.assertEqual(
+            self.expected_commits,
+            {subproject.submodule.path: subproject.commit.id
+             for subproject in subprojects})
+
+    def test_pool_bounds_connections(self):
+        transport = TransportManager(max_connections=3)
+        self.addCleanup(transport.close)
+        transport.mount(self.gl)
+        self._scan(max_workers=8)
+        self.assertLessEqual(self.fake.connections, 3)
+
+    def test_pool_sized_to_workers(self):
+        transport = TransportManager(max_connections=16)
+        self.addCleanup(transport.close)
+        transport.mount(self.gl)
+        self._scan(max_workers=16)
+        # the connections are kept alive and reused between requests
+        self.assertLessEqual(self.fake.connections, 16)
+        self.assertLess(self.fake.connections, self.fake.count_requests())
+
+    def test_one_pool_per_host(self):
+        transport = TransportManager(max_connections=4)
+        self.addCleanup(transport.close)
+        other_gl = self.fake.client()
+        transport.mount([self.gl, other_gl.projects])
+        self.assertEqual([self.gl.url], transport.hosts)
+        adapter = self.gl.session.get_adapter(self.gl.url + '/api/v4')
+        self.assertIs(adapter, other_gl.session.get_adapter(
+            other_gl.url + '/api/v4'))
+        self.assertIs(adapter, transport.get_adapter(self.gl.url))
+        self.assertEqual(4, adapter._pool_maxsize)
+        self.assertIsNone(transport.get_limiter(self.gl.url))
+
+    def test_rate_limit(self):
+        transport = TransportManager(max_connections=4, rate_limit=True)
+        self.addCleanup(transport.close)
+        transport.mount(self.gl)
+        self.assertIsInstance(transport.get_adapter(self.gl.url),
+                              RateLimitedAdapter)
+        self._scan(max_workers=4)
+        self.assertEqual(self.fake.count_requests(),
+                         transport.get_limiter(self.gl.url).requests)